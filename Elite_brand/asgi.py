@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Production (async chat endpoints stream without holding a worker):
+    gunicorn Elite_brand.asgi:application -k uvicorn_worker.UvicornWorker
 """
 
 import os
@@ -0,0 +1,59 @@
+"""
+Configuración de DATABASES a partir del entorno.
+
+PostgreSQL (Render, DATABASE_URL=postgres://...):
+- Con psycopg 3 + psycopg-pool instalados se usa el pool nativo de Django 5.x
+  (OPTIONS['pool']). Cada proceso worker tiene su propio pool: el máximo de conexiones
+  abiertas es workers x DB_POOL_MAX_SIZE y debe quedar por debajo de max_connections
+  del plan de Postgres.
+    DB_POOL=0            desactiva el pool (vuelve a conexiones persistentes)
+    DB_POOL_MIN_SIZE     conexiones que el pool mantiene abiertas (default 2)
+    DB_POOL_MAX_SIZE     tope por proceso (default 10)
+    DB_POOL_TIMEOUT      segundos esperando una conexión libre antes de fallar (default 10)
+    DB_POOL_MAX_IDLE     segundos que una conexión sobrante puede quedar ociosa (default 300)
+  Con CONN_HEALTH_CHECKS, Django le pasa al pool check_connection: cada conexión se
+  verifica al prestarla, y una que Postgres o el proxy cerraron durante un periodo
+  ocioso se descarta en vez de fallar en el primer request.
+- Sin pool (sin psycopg-pool instalado, o DB_POOL=0): conexiones persistentes por hilo durante
+  DB_CONN_MAX_AGE segundos (default 600) con CONN_HEALTH_CHECKS, que también
+  descarta las conexiones caídas antes de usarlas.
+
+SQLite (local, sin DATABASE_URL): no hay pool; cada hilo abre su conexión al archivo
+y la mantiene DB_CONN_MAX_AGE segundos. Las transacciones arrancan en modo IMMEDIATE
+para que los workers esperen el lock de escritura en vez de fallar con
+"database is locked", y la BD de tests vive en archivo para poder probar escrituras
+concurrentes.
+"""
+import importlib.util
+import os
+
+import dj_database_url
+
+
+def pool_disponible():
+    return importlib.util.find_spec('psycopg') is not None and importlib.util.find_spec('psycopg_pool') is not None
+
+
+def base_de_datos(base_dir, entorno=os.environ):
+    """Diccionario para DATABASES['default']."""
+    config = dj_database_url.parse(
+        entorno.get('DATABASE_URL') or 'sqlite:///' + str(base_dir / 'db.sqlite3'),
+        conn_max_age=int(entorno.get('DB_CONN_MAX_AGE', 600)),
+        conn_health_checks=True,
+    )
+
+    if config['ENGINE'] == 'django.db.backends.postgresql':
+        if entorno.get('DB_POOL', '1') != '0' and pool_disponible():
+            config['CONN_MAX_AGE'] = 0  # Django no admite conexiones persistentes junto al pool
+            config.setdefault('OPTIONS', {})['pool'] = {
+                'min_size': int(entorno.get('DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(entorno.get('DB_POOL_MAX_SIZE', 10)),
+                'timeout': float(entorno.get('DB_POOL_TIMEOUT', 10)),
+                'max_idle': float(entorno.get('DB_POOL_MAX_IDLE', 300)),
+            }
+
+    elif config['ENGINE'] == 'django.db.backends.sqlite3':
+        config.setdefault('OPTIONS', {}).update({'transaction_mode': 'IMMEDIATE', 'timeout': 20})
+        config['TEST'] = {'NAME': str(base_dir / 'test_db.sqlite3')}
+
+    return config
@@ -4,7 +4,7 @@ Django settings for Elite_brand project.
 
 from pathlib import Path
 import os
-import dj_database_url
+from Elite_brand.database import base_de_datos
 from dotenv import load_dotenv  # Importante: Carga las variables del archivo .env en local
 
 # Cargar variables de entorno desde .env (si existe)
@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'Inventario.middleware.InstrumentacionMiddleware',  # primero: mide el request completo
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # <--- Crucial para Render
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -80,14 +81,21 @@ TEMPLATES = [
 WSGI_APPLICATION = 'Elite_brand.wsgi.application'
 
 # Database
-# Configuración inteligente: Render (PostgreSQL) vs Local (SQLite)
+# Configuración inteligente: Render (PostgreSQL, con pool de conexiones) vs Local (SQLite).
+# Variables de entorno y fallback documentados en Elite_brand/database.py
 DATABASES = {
-    'default': dj_database_url.config(
-        default='sqlite:///' + str(BASE_DIR / 'db.sqlite3'),
-        conn_max_age=600
-    )
+    'default': base_de_datos(BASE_DIR)
 }
 
+# Caché compartida entre workers (KPIs del dashboard, contexto de Elite AI).
+# Con REDIS_URL se usa Redis (requiere el paquete `redis`); si no, una tabla de la
+# propia BD, que crea la migración 0005 de Inventario (equivale a `createcachetable`).
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'elite_cache'}}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     { 'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator', },
@@ -120,4 +128,44 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # API KEYS
 # Se leen estrictamente de las variables de entorno para seguridad
 DEEPSEEK_API_KEY = os.environ.get('DEEPSEEK_API_KEY')
-DEEPSEEK_BASE_URL = 'https://api.deepseek.com'
\ No newline at end of file
+DEEPSEEK_BASE_URL = os.environ.get('DEEPSEEK_BASE_URL', 'https://api.deepseek.com')
+ELITE_AI_CACHE_SIZE = int(os.environ.get('ELITE_AI_CACHE_SIZE', 256))  # respuestas de Elite AI en memoria (LRU por worker)
+GOOGLE_CALENDAR_API_ENDPOINT = os.environ.get('GOOGLE_CALENDAR_API_ENDPOINT')
+
+# Cola de tareas en segundo plano (Inventario/tareas.py, `manage.py run_worker`)
+TAREAS_BACKOFF_BASE = int(os.environ.get('TAREAS_BACKOFF_BASE', 5))  # segundos; se duplica en cada reintento
+TAREAS_BACKOFF_MAX = int(os.environ.get('TAREAS_BACKOFF_MAX', 600))
+TAREAS_LEASE = int(os.environ.get('TAREAS_LEASE', 300))  # segundos antes de retomar la tarea de un worker caído
+
+# Instrumentación por request (Inventario/middleware.py): header Server-Timing y log JSON
+INSTRUMENTACION_MEMORIA = os.environ.get('INSTRUMENTACION_MEMORIA') == '1'  # tracemalloc: pico de memoria (más lento)
+
+# Máximo de consultas SQL de un GET por url_name. Se valida en los tests con datos sembrados y en
+# producción se registra un warning 'query_budget_exceeded' si una vista lo supera. Las consultas a
+# la tabla de caché (DatabaseCache) se registran aparte y no cuentan, igual que con Redis.
+PRESUPUESTOS_CONSULTAS = {
+    'dashboard': 8,  # caché fría: sesión + usuario + 4 agregados de KPIs + bajo stock + últimos movimientos
+    'reporte_financiero': 6,
+    'reporte_bodegas': 3,
+    'reporte_movimientos': 4,
+    'producto_list': 6,
+    'proveedor_list': 4,  # sesión + usuario + COUNT del paginador + SELECT de la página
+    'destino_list': 4,  # igual que proveedor_list; con la tabla vacía la página no se consulta (3)
+    'movimiento_create': 2,
+    'shopping_list': 4,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'Inventario.instrumentacion': {
+            'handlers': ['console'],
+            'level': os.environ.get('INSTRUMENTACION_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Proveedor, Destino, Producto, Movimiento, Inventario
+from .models import Proveedor, Destino, Producto, Movimiento, Inventario, Tarea, CorteStock, AsientoStock
 
 @admin.register(Proveedor)
 class ProveedorAdmin(admin.ModelAdmin):
@@ -22,14 +22,55 @@ class ProductoAdmin(admin.ModelAdmin):
 
 @admin.register(Inventario)
 class InventarioAdmin(admin.ModelAdmin):
-    # Esta tabla te dejará ver stock por ubicación específica
+    # Esta tabla te dejará ver stock por ubicación específica.
+    # Solo lectura: cantidad es un caché del libro de stock (se corrige con movimientos de
+    # ajuste; una edición aquí la desharía verify_ledger --repair)
     list_display = ('producto', 'ubicacion', 'cantidad')
     list_filter = ('ubicacion', 'producto__categoria')
     search_fields = ('producto__nombre', 'ubicacion__nombre')
 
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(Movimiento)
 class MovimientoAdmin(admin.ModelAdmin):
     list_display = ('referencia', 'fecha', 'tipo', 'producto', 'cantidad', 'origen', 'destino', 'usuario')
     list_filter = ('tipo', 'fecha', 'origen', 'destino')
     search_fields = ('referencia', 'producto__nombre')
-    date_hierarchy = 'fecha'
\ No newline at end of file
+    date_hierarchy = 'fecha'
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    # Cola de tareas en segundo plano (las ejecuta `manage.py run_worker`)
+    list_display = ('id', 'tipo', 'estado', 'intentos', 'disponible_en', 'usuario', 'creada')
+    list_filter = ('estado', 'tipo')
+    readonly_fields = ('resultado', 'error', 'creada', 'actualizada')
+
+@admin.register(CorteStock)
+class CorteStockAdmin(admin.ModelAdmin):
+    # Cortes diarios de stock (`manage.py take_snapshot`); las líneas no se editan a mano
+    list_display = ('fecha', 'lineas_total', 'ultimo_movimiento_id', 'creado')
+    date_hierarchy = 'fecha'
+
+@admin.register(AsientoStock)
+class AsientoStockAdmin(admin.ModelAdmin):
+    # Libro de stock: solo lectura, los asientos se insertan al postear movimientos
+    list_display = ('fecha', 'producto', 'ubicacion', 'cantidad', 'movimiento')
+    list_filter = ('ubicacion',)
+    search_fields = ('producto__nombre', 'movimiento__referencia')
+    date_hierarchy = 'fecha'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
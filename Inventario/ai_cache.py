@@ -0,0 +1,72 @@
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from django.conf import settings
+
+# ==============================================================================
+# CACHÉ DE RESPUESTAS DE ELITE AI
+# ==============================================================================
+# Las preguntas repetidas ("what's low on stock", "gastos del mes") se responden
+# desde memoria mientras el inventario no cambie: la clave combina la pregunta
+# normalizada con la huella de los datos que se le dieron al modelo (versión del
+# inventario + día + secciones), así cualquier movimiento posteado la invalida.
+# LRU en memoria por proceso, con tamaño máximo y contadores de aciertos.
+
+
+def normalizar_pregunta(texto):
+    """Minúsculas, sin acentos ni puntuación y con espacios simples: 'Gastos del mes?' == 'gastos  del MES'."""
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(re.sub(r'[^\w\s]', ' ', texto).split())
+
+
+class CacheRespuestas:
+    def __init__(self, max_entradas):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()  # clave -> (respuesta, segundos que tardó el modelo)
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.segundos_ahorrados = 0.0
+
+    def obtener(self, clave):
+        """Respuesta cacheada o None; un acierto la mueve al final (más reciente)."""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            self.segundos_ahorrados += entrada[1]
+            return entrada[0]
+
+    def guardar(self, clave, respuesta, segundos):
+        with self._lock:
+            self._entradas[clave] = (respuesta, segundos)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)  # desaloja la menos usada
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.aciertos = self.fallos = 0
+            self.segundos_ahorrados = 0.0
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'hits': self.aciertos,
+                'misses': self.fallos,
+                'hit_rate': round(self.aciertos / consultas, 4) if consultas else 0.0,
+                'entries': len(self._entradas),
+                'max_entries': self.max_entradas,
+                'saved_seconds': round(self.segundos_ahorrados, 3),
+            }
+
+
+respuestas_ia = CacheRespuestas(getattr(settings, 'ELITE_AI_CACHE_SIZE', 256))
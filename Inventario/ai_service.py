@@ -0,0 +1,268 @@
+import asyncio
+import hashlib
+import json
+import weakref
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Sum
+from django.utils import timezone
+from django.utils.functional import cached_property
+from openai import AsyncOpenAI, OpenAI
+
+from .ai_cache import normalizar_pregunta
+from .models import Movimiento, Producto
+from .reports import DINERO, gasto_total, unidades_con_mas_gasto
+from .services import version_inventario
+
+# ==============================================================================
+# ELITE BRAIN: ARTIFICIAL INTELLIGENCE MODULE (ENGLISH VERSION)
+# ==============================================================================
+# The OpenAI SDK takes ~0.6 s to import: this module is only loaded by the chat
+# endpoints and the ai_report background job, never at worker boot.
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> (config, AsyncOpenAI)
+AI_CONTEXT_TTL = 60  # seconds; posting a movement also invalidates (inventory version in the key)
+HISTORY_IN_PROMPT = 2  # last chat messages copied into the system prompt
+
+
+class EliteIntelligenceService:
+    """
+    Advanced Business Intelligence Service.
+    Language: ENGLISH (Output) / MULTI-LANGUAGE (Input).
+    Capabilities: Financial Analysis, Operational Audit, Report Generation.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.today = timezone.now().date()
+
+    @cached_property
+    def client(self):
+        return OpenAI(
+            api_key=settings.DEEPSEEK_API_KEY,
+            base_url=settings.DEEPSEEK_BASE_URL
+        )
+
+    @property
+    def async_client(self):
+        # Building a client costs ~40 ms of CPU (SSL context) and would stall the event loop
+        # on every chat: one shared client per loop, which also reuses its connections.
+        loop = asyncio.get_running_loop()
+        config = (settings.DEEPSEEK_API_KEY, settings.DEEPSEEK_BASE_URL)
+        cached = _async_clients.get(loop)
+        if cached is None or cached[0] != config:
+            cached = _async_clients[loop] = (config, AsyncOpenAI(api_key=config[0], base_url=config[1]))
+        return cached[1]
+
+    def _get_financial_metrics(self):
+        """Generates deep financial analysis."""
+        total_assets = Producto.objects.aggregate(
+            total=Sum(F('stock_total_global') * F('precio_venta'), output_field=DINERO)
+        )['total'] or 0
+
+        start_month = self.today - timedelta(days=30)
+        # Read from the daily rollup (ResumenDiario) instead of scanning every movement
+        expenses_30d = gasto_total(desde=start_month)
+        expenses_historical = gasto_total()
+        top_units_query = unidades_con_mas_gasto(5)
+
+        top_units = [
+            f"- {u['destino__nombre']} ({u['destino__tipo']}): ${u['total_expense']:,.2f}" 
+            for u in top_units_query
+        ]
+
+        return {
+            "total_assets": total_assets,
+            "expenses_30d": expenses_30d,
+            "expenses_historical": expenses_historical,
+            "top_units_list": top_units
+        }
+
+    def _get_inventory_health(self):
+        """Inventory Health Diagnostics."""
+        critical = Producto.objects.filter(stock_total_global__lte=0)
+        low_stock = Producto.objects.filter(stock_total_global__lte=F('stock_minimo'), stock_total_global__gt=0)
+        
+        top_value = Producto.objects.annotate(
+            val=F('stock_total_global') * F('precio_venta')
+        ).order_by('-val')[:5]
+
+        return {
+            "critical_count": critical.count(),
+            "critical_names": [p.nombre for p in critical[:5]],
+            "low_stock_count": low_stock.count(),
+            "top_value": [f"{p.nombre}: ${p.valor_total:,.2f}" for p in top_value]
+        }
+
+    def _get_operational_logs(self):
+        """Operational Audit Logs."""
+        movs_today = Movimiento.objects.filter(fecha=self.today).select_related('usuario', 'producto').order_by('-id')
+        details_today = []
+        for m in movs_today[:8]:
+            details_today.append(
+                f"[{m.fecha.strftime('%H:%M')}] {m.get_tipo_display()}: {m.cantidad}x {m.producto.nombre} "
+                f"(User: {m.usuario.username if m.usuario else 'System'})"
+            )
+        return {"total_today": movs_today.count(), "details": details_today}
+
+    SECTIONS = {
+        'finance': '_get_financial_metrics',
+        'inventory': '_get_inventory_health',
+        'ops': '_get_operational_logs',
+    }
+
+    def _get_section(self, intent):
+        """
+        Section data, computed only when requested and shared through the cache by
+        every worker. The key changes with the inventory version and the day.
+        """
+        key = f"elite_ai:{intent}:{version_inventario()}:{self.today.isoformat()}"
+        return cache.get_or_set(key, getattr(self, self.SECTIONS[intent]), timeout=AI_CONTEXT_TTL)
+
+    def _matched_intents(self, query):
+        """
+        Heuristic Intent Detection.
+        Understands both English and Spanish keywords.
+        """
+        query = query.lower()
+        intents = []
+        
+        # Keywords (Mixed English/Spanish to understand user input)
+        kw_finance = ['dinero', 'costo', 'gasto', 'valor', 'precio', 'money', 'cost', 'expense', 'price', 'budget', 'financi']
+        kw_inventory = ['stock', 'cantidad', 'falta', 'sobra', 'producto', 'inventory', 'warehouse', 'bodega', 'item']
+        kw_ops = ['quien', 'cuando', 'movimiento', 'who', 'when', 'movement', 'log', 'user', 'usuario']
+
+        if any(k in query for k in kw_finance): intents.append('finance')
+        if any(k in query for k in kw_inventory): intents.append('inventory')
+        if any(k in query for k in kw_ops): intents.append('ops')
+        return intents
+
+    def _detect_intent(self, query):
+        return self._matched_intents(query) or ['finance', 'inventory', 'ops']
+
+    def response_cache_key(self, user_query, chat_history=()):
+        """
+        Key for the response cache: normalized question + everything else the prompt carries
+        (user, the history lines build_context copies in, inventory version and day), so an
+        answer is only reused for an identical prompt. None for open questions with no
+        explicit intent ("why?", "and yesterday?"): their answer depends on the conversation.
+        """
+        intents = self._matched_intents(user_query)
+        if not intents:
+            return None
+        history = hashlib.sha256(
+            json.dumps(list(chat_history)[-HISTORY_IN_PROMPT:], sort_keys=True).encode()
+        ).hexdigest()[:16]
+        return (
+            f"{self.user.pk}|{history}|{normalizar_pregunta(user_query)}|{','.join(intents)}"
+            f"|{version_inventario()}|{self.today.isoformat()}"
+        )
+
+    def build_context(self, user_query, chat_history):
+        """
+        Builds the System Prompt in English.
+        """
+        intents = self._detect_intent(user_query)
+        context_parts = []
+
+        # System Header
+        context_parts.append(
+            f"CURRENT DATE: {self.today.strftime('%Y-%m-%d')}\n"
+            f"USER: {self.user.username}\n"
+            "ROLE: You are 'Elite AI', a Senior Financial & Logistics Analyst. "
+            "Your language is ENGLISH. You can read/understand Spanish input, but you must ALWAYS REPLY IN ENGLISH. "
+            "Be professional, concise, and data-driven.\n"
+        )
+
+        # 1. Financial Data Injection
+        if 'finance' in intents:
+            fin_data = self._get_section('finance')
+            context_parts.append(
+                "\n--- 💰 FINANCIAL REPORT ---\n"
+                f"* Total Assets Value (Inventory): ${fin_data['total_assets']:,.2f}\n"
+                f"* Historical Total Expenses: ${fin_data['expenses_historical']:,.2f}\n"
+                f"* Expenses (Last 30 Days): ${fin_data['expenses_30d']:,.2f}\n"
+                "* Top 5 Most Expensive Units (Cost Centers):\n" + "\n".join(fin_data['top_units_list'])
+            )
+
+        # 2. Inventory Data Injection
+        if 'inventory' in intents:
+            inv_data = self._get_section('inventory')
+            context_parts.append(
+                "\n--- 📦 INVENTORY HEALTH ---\n"
+                f"* Critical Items (Out of Stock): {inv_data['critical_count']} "
+                f"(e.g., {', '.join(inv_data['critical_names'])})\n"
+                f"* Low Stock Items: {inv_data['low_stock_count']}\n"
+                "* Top 5 High Value Items:\n" + "\n  ".join(inv_data['top_value'])
+            )
+
+        # 3. Operational Data Injection
+        if 'ops' in intents:
+            ops_data = self._get_section('ops')
+            context_parts.append(
+                "\n--- ⚙️ OPERATIONAL LOGS ---\n"
+                f"* Movements Today: {ops_data['total_today']}\n"
+                "* Recent Logs (Today):\n" + "\n".join(ops_data['details'])
+            )
+
+        # 4. EXCEL GENERATION MANUAL (ENGLISH)
+        context_parts.append(
+            "\n=== EXCEL REPORT GENERATION MANUAL ===\n"
+            "If the user asks to download, generate, or export an Excel file (even in Spanish), generate a Markdown link using this structure:\n"
+            "Base URL: `/reportes/financiero/?export=excel_financiero`\n"
+            "Parameters:\n"
+            "1. `type=salidas_detalladas` -> For general logs, detailed movements.\n"
+            "2. `type=unidades` -> For costs by Unit, Apartment, or Site.\n"
+            "3. `type=por_referencia` -> For costs grouped by Operation Reference.\n"
+            "4. `start_date=YYYY-MM-DD` & `end_date=YYYY-MM-DD` -> Optional filters.\n\n"
+            "RESPONSE EXAMPLES:\n"
+            "- User: 'Quiero un excel de gastos por unidad'\n"
+            "  You: 'Here is the report requested: [Download Unit Cost Report](/reportes/financiero/?export=excel_financiero&type=unidades)'\n"
+        )
+
+        # 5. Conversation Memory
+        if chat_history:
+            context_parts.append("\n--- 🧠 RECENT CHAT HISTORY ---")
+            for msg in chat_history[-HISTORY_IN_PROMPT:]:
+                role = "User" if msg['role'] == 'user' else "Elite AI"
+                context_parts.append(f"{role}: {msg['content']}")
+
+        return "\n".join(context_parts)
+
+    def _messages(self, system_context, user_question):
+        return [
+            {"role": "system", "content": system_context},
+            {"role": "user", "content": user_question},
+        ]
+
+    def complete(self, system_context, user_question):
+        """Full (non-streamed) answer; API errors propagate so a background job can retry."""
+        response = self.client.chat.completions.create(
+            model="deepseek-chat",
+            messages=self._messages(system_context, user_question),
+            temperature=0.3,
+            stream=False
+        )
+        return response.choices[0].message.content
+
+    def ask_deepseek(self, system_context, user_question):
+        try:
+            return self.complete(system_context, user_question)
+        except Exception as e:
+            return f"Critical AI Error: {str(e)}"
+
+    async def ask_deepseek_stream(self, system_context, user_question):
+        """Async generator: yields the answer token by token as DeepSeek produces it."""
+        stream = await self.async_client.chat.completions.create(
+            model="deepseek-chat",
+            messages=self._messages(system_context, user_question),
+            temperature=0.3,
+            stream=True
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class InventarioConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Inventario'
+
+    def ready(self):
+        from .middleware import instalar_contador
+        connection_created.connect(instalar_contador, dispatch_uid='inventario_contar_consultas')
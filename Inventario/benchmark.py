@@ -0,0 +1,366 @@
+import gc
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Destino, Inventario, Movimiento, Producto, Proveedor
+from .reports import (
+    CERO, FILTRO_BODEGA, calcular_kpis_dashboard, costos_por_unidad, gasto_total, items_de_sitio,
+    pagina_movimientos, salidas_financieras, unidades_con_mas_gasto, valor_bodegas,
+)
+from .services import registrar_movimientos_en_lote
+
+# ==============================================================================
+# DATOS SINTÉTICOS Y BENCHMARK DE ENDPOINTS
+# ==============================================================================
+# `manage.py seed_benchmark` genera un catálogo con distribuciones parecidas a las
+# reales (pocos productos concentran casi todos los movimientos, ~10% de los sitios
+# son bodegas, historial de un año) usando bulk inserts. `manage.py run_benchmark`
+# siembra varias escalas en una BD de tests desechable, mide los endpoints calientes
+# y escribe un JSON comparable entre commits.
+# Todo lo sembrado usa el prefijo BENCH para poder borrarlo sin tocar datos reales.
+# `run_benchmark --pesado` agrega la escala grande (ESCALA_PESADA) con las mediciones que
+# no caben en la suite de tests: exportación de 1M de movimientos bajo un techo de RSS y
+# reporte financiero agregado contra la implementación anterior (un loop por sitio) y
+# planes de las consultas que ejecutan las funciones de reportes sobre 1M de filas.
+
+PREFIJO = 'BENCH'
+CATEGORIAS = [c for c, _ in Producto.CATEGORIAS]
+PESOS_CATEGORIAS = [30, 15, 25, 20, 8, 2]  # Kitchen y Bedroom dominan en los aptos
+DIAS_HISTORIAL = 365
+LOTE_SIEMBRA = 50_000  # movimientos por llamada a registrar_movimientos_en_lote
+
+
+def limpiar():
+    """Borra todo lo sembrado (productos, sitios y proveedores BENCH; los movimientos caen con sus productos)."""
+    with transaction.atomic():
+        Producto.objects.filter(codigo__startswith=f'{PREFIJO}-').delete()
+        Destino.objects.filter(nombre__startswith=f'{PREFIJO} ').delete()
+        Proveedor.objects.filter(nombre__startswith=f'{PREFIJO} ').delete()
+
+
+def _filas_movimientos(rng, productos, bodegas, unidades, cantidad):
+    """
+    Historial válido en orden cronológico: compras a bodegas, transferencias a las unidades
+    y salidas/reemplazos desde ellas. Se simula el stock en memoria para que ninguna fila
+    quede rechazada por falta de existencias. Genera las filas de a una.
+    """
+    stock = {producto_id: {} for producto_id in productos}  # producto -> {sitio: cantidad}
+    es_bodega = set(bodegas)
+    # Popularidad tipo Pareto: el 20% de los productos se lleva la mayoría de los movimientos
+    pesos = [1 / (i + 1) ** 0.8 for i in range(len(productos))]
+    elegidos = rng.choices(productos, weights=pesos, k=cantidad)
+    hoy = timezone.now().date()
+    dias = sorted(rng.randrange(DIAS_HISTORIAL) for _ in range(cantidad))
+    for producto_id, dias_atras in zip(elegidos, reversed(dias)):
+        fila = {'producto_id': producto_id, 'fecha': hoy - timedelta(days=dias_atras), 'origen_id': None, 'destino_id': None}
+        existencias = stock[producto_id]
+        con_stock = [sitio for sitio, n in existencias.items() if n > 0]
+        tirada = rng.random()
+        if not con_stock or tirada < 0.35:
+            fila.update(tipo='IN', cantidad=rng.randint(5, 60), destino_id=rng.choice(bodegas))
+        else:
+            origen = rng.choice(con_stock)
+            if origen in es_bodega and tirada < 0.75:
+                fila.update(tipo='TRANSFER', origen_id=origen, destino_id=rng.choice(unidades))
+            elif tirada < 0.97:
+                fila.update(tipo=rng.choice(['OUT', 'OUT', 'OUT', 'REPLACEMENT']), origen_id=origen)
+            else:
+                fila.update(tipo='ADJ_NEG', origen_id=origen, razon_ajuste='Conteo físico')
+            fila['cantidad'] = rng.randint(1, min(existencias[origen], 10))
+
+        if fila['origen_id']:
+            existencias[fila['origen_id']] -= fila['cantidad']
+        if fila['destino_id']:
+            existencias[fila['destino_id']] = existencias.get(fila['destino_id'], 0) + fila['cantidad']
+        yield fila
+
+
+def sembrar(productos, sitios, movimientos, semilla=42):
+    """
+    Crea `productos` productos, `sitios` sitios y `movimientos` movimientos reproducibles
+    (misma semilla, mismos datos). Los movimientos pasan por registrar_movimientos_en_lote
+    en lotes de LOTE_SIEMBRA, así Inventario, stock_total_global y ResumenDiario quedan
+    consistentes sin tener el millón de filas en memoria. Retorna los conteos creados.
+    """
+    rng = random.Random(semilla)
+    proveedores = Proveedor.objects.bulk_create(
+        Proveedor(nombre=f"{PREFIJO} Proveedor {i:04d}", contacto=f"Contacto {i}")
+        for i in range(max(1, productos // 40))
+    )
+    n_bodegas = max(1, sitios // 10)
+    Destino.objects.bulk_create(
+        [Destino(nombre=f"{PREFIJO} Bodega {i:03d}", direccion=f"Zona industrial {i}", tipo='Bodega') for i in range(n_bodegas)]
+        + [Destino(nombre=f"{PREFIJO} Apto {i:04d}", direccion=f"Calle {i}", tipo='Apto') for i in range(max(1, sitios - n_bodegas))],
+        batch_size=500,
+    )
+    sitios_creados = Destino.objects.filter(nombre__startswith=f'{PREFIJO} ').values_list('id', 'tipo')
+
+    catalogo = []
+    for i in range(productos):
+        costo = Decimal(round(rng.lognormvariate(2.3, 0.9), 2)).quantize(Decimal('0.01'))
+        catalogo.append(Producto(
+            codigo=f"{PREFIJO}-{i:06d}",
+            nombre=f"{rng.choice(['Toalla', 'Sábana', 'Vaso', 'Plato', 'Lámpara', 'Cojín', 'Filtro', 'Bombillo'])} {i:06d}",
+            categoria=rng.choices(CATEGORIAS, weights=PESOS_CATEGORIAS)[0],
+            precio_costo=costo,
+            precio_venta=(costo * Decimal('1.6')).quantize(Decimal('0.01')),
+            proveedor=rng.choice(proveedores),
+            stock_minimo=rng.choice([2, 5, 5, 10, 20]),
+        ))
+    Producto.objects.bulk_create(catalogo, batch_size=500)
+    ids_productos = list(Producto.objects.filter(codigo__startswith=f'{PREFIJO}-').order_by('codigo').values_list('id', flat=True))
+
+    bodegas = [pk for pk, tipo in sitios_creados if tipo == 'Bodega']
+    unidades = [pk for pk, tipo in sitios_creados if tipo != 'Bodega']
+    filas = _filas_movimientos(rng, ids_productos, bodegas, unidades, movimientos)
+    creados = 0
+    while lote := list(itertools.islice(filas, LOTE_SIEMBRA)):
+        creados += registrar_movimientos_en_lote(lote)['creados']
+    return {
+        'proveedores': len(proveedores), 'sitios': len(bodegas) + len(unidades),
+        'productos': len(ids_productos), 'movimientos': creados,
+    }
+
+
+# --- BENCHMARK ---
+
+def _casos(producto, bodega):
+    """(nombre, método, url, datos) de cada endpoint medido."""
+    return [
+        ('dashboard', 'get', reverse('dashboard'), None),
+        ('producto_list', 'get', reverse('producto_list'), None),
+        ('producto_list_busqueda', 'get', reverse('producto_list'), {'q': 'toalla'}),
+        ('producto_list_export', 'get', reverse('producto_list'), {'export': 'excel'}),
+        ('reporte_movimientos', 'get', reverse('reporte_movimientos'), None),
+        ('reporte_bodegas', 'get', reverse('reporte_bodegas'), None),
+        ('reporte_financiero', 'get', reverse('reporte_financiero'), None),
+        ('movimiento_create', 'post', reverse('movimiento_create'), {
+            'producto': producto, 'tipo': 'IN', 'cantidad': 1,
+            'fecha': timezone.now().date().isoformat(), 'destino': bodega,
+        }),
+    ]
+
+
+def _cliente():
+    usuario, _ = User.objects.get_or_create(username=f'{PREFIJO.lower()}_runner')
+    cliente = Client()
+    cliente.force_login(usuario)
+    return cliente
+
+
+def medir_endpoints(repeticiones=5):
+    """
+    Pide cada endpoint `repeticiones` veces (más una de calentamiento) con la caché vacía
+    y retorna {nombre: {mediana_ms, p95_ms, min_ms, consultas}}. Las consultas salen de la
+    medición de InstrumentacionMiddleware.
+    """
+    cliente = _cliente()
+    producto = Producto.objects.filter(codigo__startswith=f'{PREFIJO}-').values_list('id', flat=True).first()
+    bodega = Destino.objects.filter(nombre__startswith=f'{PREFIJO} Bodega').values_list('id', flat=True).first()
+
+    resultados = {}
+    for nombre, metodo, url, datos in _casos(producto, bodega):
+        tiempos = []
+        consultas = None
+        for i in range(repeticiones + 1):
+            cache.clear()
+            inicio = time.perf_counter()
+            response = getattr(cliente, metodo)(url, datos)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            transcurrido = time.perf_counter() - inicio
+            if response.status_code >= 400:
+                raise RuntimeError(f"{nombre} respondió {response.status_code}")
+            if i:  # la primera es de calentamiento
+                tiempos.append(transcurrido * 1000)
+                consultas = response.wsgi_request.medicion.consultas
+        tiempos.sort()
+        resultados[nombre] = {
+            'mediana_ms': round(statistics.median(tiempos), 2),
+            'p95_ms': round(tiempos[min(len(tiempos) - 1, round(0.95 * (len(tiempos) - 1)))], 2),
+            'min_ms': round(tiempos[0], 2),
+            'consultas': consultas,
+        }
+    return resultados
+
+
+def comparar(anterior, actual):
+    """Filas (escala, endpoint, mediana anterior, mediana actual, cambio %) de dos resultados JSON."""
+    def por_escala(datos):
+        return {e['escala']: e['endpoints'] for e in datos['escalas']}
+
+    previas = por_escala(anterior)
+    filas = []
+    for escala, endpoints in por_escala(actual).items():
+        for nombre, medida in endpoints.items():
+            previa = previas.get(escala, {}).get(nombre)
+            if previa:
+                cambio = (medida['mediana_ms'] - previa['mediana_ms']) / previa['mediana_ms'] * 100 if previa['mediana_ms'] else 0
+                filas.append((escala, nombre, previa['mediana_ms'], medida['mediana_ms'], cambio))
+    return filas
+
+
+# --- CARGAS PESADAS ---
+ESCALA_PESADA = (2000, 500, 1_000_000)  # productos x sitios x movimientos
+TECHO_RSS_MB = 64  # crecimiento máximo del RSS al exportar todo el historial
+
+
+def _rss_bytes():
+    """RSS actual del proceso (Linux: /proc/self/statm); en otros sistemas, el pico histórico."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico if sys.platform == 'darwin' else pico * 1024
+
+
+def medir_exportacion(techo_mb=TECHO_RSS_MB):
+    """
+    Descarga el CSV de todo el historial (reporte_movimientos?export=excel) muestreando el
+    RSS cada 1000 filas. Retorna {filas, segundos, rss_inicial_mb, rss_pico_mb, crecimiento_mb,
+    techo_mb, dentro_del_techo}.
+    """
+    cliente = _cliente()
+    gc.collect()
+    inicial = pico = _rss_bytes()
+    inicio = time.perf_counter()
+    response = cliente.get(reverse('reporte_movimientos'), {'export': 'excel'})
+    filas = 0
+    for _ in response.streaming_content:  # una línea CSV por chunk
+        filas += 1
+        if filas % 1000 == 0:
+            pico = max(pico, _rss_bytes())
+    segundos = time.perf_counter() - inicio
+    pico = max(pico, _rss_bytes())
+
+    mb = 1024 * 1024
+    crecimiento = (pico - inicial) / mb
+    return {
+        'filas': filas - 1,  # sin el encabezado
+        'segundos': round(segundos, 2),
+        'rss_inicial_mb': round(inicial / mb, 1),
+        'rss_pico_mb': round(pico / mb, 1),
+        'crecimiento_mb': round(crecimiento, 1),
+        'techo_mb': techo_mb,
+        'dentro_del_techo': crecimiento <= techo_mb,
+    }
+
+
+def _financiero_anterior():
+    """
+    Bodegas y unidades del reporte financiero como se calculaban antes de reports.py:
+    un loop por Destino, con una consulta por sitio y el producto cargado fila por fila.
+    Se conserva solo como referencia del benchmark.
+    """
+    data_unidades = []
+    for u in Destino.objects.exclude(tipo__icontains='Bodega'):
+        movs_hacia_unidad = Movimiento.objects.filter(destino=u, tipo__in=['OUT', 'TRANSFER'])
+        costo_acumulado = sum(m.cantidad * m.producto.precio_venta for m in movs_hacia_unidad)
+        if costo_acumulado > 0:
+            data_unidades.append({'nombre': u.nombre, 'tipo': u.tipo, 'costo_total': costo_acumulado})
+
+    data_bodegas = []
+    for b in Destino.objects.filter(tipo__icontains='Bodega'):
+        items = Inventario.objects.filter(ubicacion=b)
+        valor = sum(i.cantidad * i.producto.precio_venta for i in items)
+        data_bodegas.append({'nombre': b.nombre, 'items': items.count(), 'valor': valor})
+    return data_bodegas, data_unidades
+
+
+def _financiero_actual():
+    return valor_bodegas(), costos_por_unidad()
+
+
+def _normalizar_financiero(bodegas, unidades):
+    """Mismo orden y centavos en ambas versiones, para comparar los totales."""
+    return (
+        sorted((b['nombre'], b['items'], Decimal(b['valor']).quantize(CERO)) for b in bodegas),
+        sorted((u['nombre'], u['tipo'], Decimal(u['costo_total']).quantize(CERO)) for u in unidades),
+    )
+
+
+def medir_financiero():
+    """
+    Corre una vez cada versión del cálculo de bodegas y unidades del reporte financiero.
+    Retorna {'anterior': {ms, consultas}, 'actual': {ms, consultas}, 'aceleracion', 'coinciden'}.
+    """
+    resultados = {}
+    salidas = {}
+    for nombre, calcular in (('anterior', _financiero_anterior), ('actual', _financiero_actual)):
+        consultas = 0
+
+        def contar(execute, sql, params, many, context):
+            nonlocal consultas
+            consultas += 1
+            return execute(sql, params, many, context)
+
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(contar):
+            salidas[nombre] = _normalizar_financiero(*calcular())
+        resultados[nombre] = {'ms': round((time.perf_counter() - inicio) * 1000, 2), 'consultas': consultas}
+    resultados['aceleracion'] = round(resultados['anterior']['ms'] / resultados['actual']['ms'], 1) if resultados['actual']['ms'] else None
+    resultados['coinciden'] = salidas['anterior'] == salidas['actual']
+    return resultados
+
+
+def _planes(hoy, bodega):
+    """(nombre, llamada a la función real del reporte, índice que debe usar alguna de sus consultas)."""
+    desde = hoy - timedelta(days=30)
+    historial = Movimiento.objects.select_related('producto', 'origen', 'destino', 'usuario')  # reporte_movimientos
+    return [
+        ('historial_ordenado', lambda: pagina_movimientos(historial), 'mov_fecha_id_desc_idx'),
+        ('historial_por_tipo', lambda: pagina_movimientos(historial.filter(tipo='REPLACEMENT')), 'mov_tipo_fecha_idx'),
+        ('salidas_financieras', lambda: list(salidas_financieras(desde, hoy)[:50]), 'mov_fecha_id_desc_idx'),
+        ('movimientos_hoy', calcular_kpis_dashboard, 'res_clave_idx'),
+        ('costos_por_unidad', lambda: costos_por_unidad(desde, hoy), 'res_tipo_fecha_idx'),
+        ('gasto_total', lambda: gasto_total(desde), 'res_tipo_fecha_idx'),
+        ('unidades_con_mas_gasto', lambda: list(unidades_con_mas_gasto()), 'res_tipo_fecha_idx'),
+        # dashboard y shopping_list filtran así los productos bajo el mínimo
+        ('alertas_de_stock', lambda: list(Producto.objects.filter(stock_total_global__lte=F('stock_minimo'))), 'prod_bajo_stock_idx'),
+        ('stock_de_bodega', lambda: list(items_de_sitio(bodega.id)), 'inv_ubicacion_con_stock_idx'),
+    ]
+
+
+def _explicar(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+        return "\n".join(str(fila[-1]) for fila in cursor.fetchall())  # SQLite: columna detail; PostgreSQL: una sola
+
+
+def revisar_planes():
+    """
+    EXPLAIN de las consultas que ejecutan las funciones de reportes sobre los datos sembrados
+    (después de ANALYZE). Retorna {nombre: {'indice', 'usa_indice', 'plan'}}.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    bodega = Destino.objects.filter(tipo__icontains=FILTRO_BODEGA).first()
+    resultados = {}
+    for nombre, llamada, indice in _planes(timezone.now().date(), bodega):
+        consultas = []
+
+        def capturar(execute, sql, params, many, context):
+            consultas.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capturar):
+            llamada()
+        plan = "\n".join(_explicar(sql, params) for sql, params in consultas)
+        resultados[nombre] = {'indice': indice, 'usa_indice': indice in plan, 'plan': plan}
+    return resultados
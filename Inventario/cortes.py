@@ -0,0 +1,146 @@
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+
+from .models import CorteStock, CorteStockLinea, Destino, Inventario, Movimiento, Producto
+
+# ==============================================================================
+# STOCK HISTÓRICO (CORTES + MOVIMIENTOS)
+# ==============================================================================
+# Inventario solo guarda el stock actual. Para saber qué había en un sitio al cierre
+# de un día se parte del punto conocido más cercano a esa fecha (un CorteStock o el
+# stock actual) y se aplican, hacia adelante o hacia atrás, solo los movimientos con
+# fecha entre ambos: el costo depende de la actividad en esa ventana, no del historial.
+# `manage.py take_snapshot` guarda un corte por día (programarlo de noche).
+
+# Mismas reglas que postear_movimiento: qué movimientos suman al destino y cuáles restan al origen
+ENTRADAS = Q(tipo__in=['IN', 'ADJ_POS'], destino__isnull=False) | Q(tipo='TRANSFER', origen__isnull=False, destino__isnull=False)
+SALIDAS = Q(tipo__in=['OUT', 'REPLACEMENT', 'ADJ_NEG'], origen__isnull=False) | Q(tipo='TRANSFER', origen__isnull=False, destino__isnull=False)
+
+
+def efecto_neto(desde, hasta=None, ubicacion_id=None, producto_id=None):
+    """
+    Cambio de stock por (producto_id, ubicacion_id) de los movimientos con
+    desde < fecha <= hasta (sin tope si hasta es None). Dos GROUP BY: entradas y salidas.
+    """
+    movimientos = Movimiento.objects.filter(fecha__gt=desde)
+    if hasta is not None:
+        movimientos = movimientos.filter(fecha__lte=hasta)
+    if producto_id:
+        movimientos = movimientos.filter(producto_id=producto_id)
+
+    deltas = defaultdict(int)
+    for condicion, campo, signo in ((ENTRADAS, 'destino_id', 1), (SALIDAS, 'origen_id', -1)):
+        filas = movimientos.filter(condicion)
+        if ubicacion_id:
+            filas = filas.filter(**{campo: ubicacion_id})
+        for producto, ubicacion, total in (
+            filas.values('producto_id', campo).annotate(total=Sum('cantidad')).values_list('producto_id', campo, 'total').order_by()
+        ):
+            deltas[(producto, ubicacion)] += signo * total
+    return deltas
+
+
+def corte_mas_cercano(fecha):
+    """(corte, días de distancia) del punto de partida más barato; corte None = stock actual."""
+    opciones = [(None, max((timezone.now().date() - fecha).days, 0))]
+    anterior = CorteStock.objects.filter(fecha__lte=fecha).order_by('-fecha').only('id', 'fecha').first()
+    if anterior:
+        opciones.append((anterior, (fecha - anterior.fecha).days))
+    siguiente = CorteStock.objects.filter(fecha__gt=fecha).order_by('fecha').only('id', 'fecha').first()
+    if siguiente:
+        opciones.append((siguiente, (siguiente.fecha - fecha).days))
+    return min(opciones, key=lambda opcion: opcion[1])
+
+
+def stock_en(fecha, ubicacion_id=None, producto_id=None):
+    """Stock al cierre de `fecha`: {(producto_id, ubicacion_id): cantidad}, sin las líneas en cero."""
+    corte, _ = corte_mas_cercano(fecha)
+    if corte is None:
+        lineas = Inventario.objects.all()
+    else:
+        lineas = CorteStockLinea.objects.filter(corte=corte)
+    if ubicacion_id:
+        lineas = lineas.filter(ubicacion_id=ubicacion_id)
+    if producto_id:
+        lineas = lineas.filter(producto_id=producto_id)
+    stock = defaultdict(int, {(p, u): c for p, u, c in lineas.values_list('producto_id', 'ubicacion_id', 'cantidad')})
+
+    if corte is None:
+        deltas, signo = efecto_neto(fecha, None, ubicacion_id, producto_id), -1  # deshacer lo posterior a `fecha`
+    elif corte.fecha <= fecha:
+        deltas, signo = efecto_neto(corte.fecha, fecha, ubicacion_id, producto_id), 1
+    else:
+        deltas, signo = efecto_neto(fecha, corte.fecha, ubicacion_id, producto_id), -1
+    for clave, delta in deltas.items():
+        stock[clave] += signo * delta
+    return {clave: cantidad for clave, cantidad in stock.items() if cantidad}
+
+
+def items_de_sitio_en(ubicacion_id, fecha):
+    """Como reports.items_de_sitio, pero con el stock del sitio al cierre de `fecha`."""
+    stock = stock_en(fecha, ubicacion_id=ubicacion_id)
+    productos = (
+        Producto.objects.filter(pk__in=[p for (p, _), cantidad in stock.items() if cantidad > 0])
+        .order_by('nombre')
+        .values('id', 'codigo', 'nombre', 'categoria', 'precio_venta')
+    )
+    return [
+        {
+            'producto__codigo': p['codigo'],
+            'producto__nombre': p['nombre'],
+            'producto__categoria': p['categoria'],
+            'cantidad': stock[(p['id'], ubicacion_id)],
+            'producto__precio_venta': p['precio_venta'],
+        }
+        for p in productos
+    ]
+
+
+def valoracion_en(fecha):
+    """
+    Unidades y valor por sitio al cierre de `fecha` (cierre de mes). El valor usa el
+    precio_venta actual, igual que el resto de los reportes.
+    """
+    stock = stock_en(fecha)
+    precios = dict(Producto.objects.filter(pk__in={p for p, _ in stock}).values_list('id', 'precio_venta'))
+    sitios = {}
+    for (producto_id, ubicacion_id), cantidad in stock.items():
+        sitio = sitios.setdefault(ubicacion_id, {'ubicacion_id': ubicacion_id, 'unidades': 0, 'valor': 0})
+        sitio['unidades'] += cantidad
+        sitio['valor'] += cantidad * precios[producto_id]
+    for pk, nombre in Destino.objects.filter(pk__in=sitios).values_list('id', 'nombre'):
+        sitios[pk]['nombre'] = nombre
+    return sorted(sitios.values(), key=lambda s: s['nombre'])
+
+
+def tomar_corte(fecha=None):
+    """Guarda (o reemplaza) el corte al cierre de `fecha` (por defecto ayer) y lo retorna."""
+    fecha = fecha or timezone.now().date() - timedelta(days=1)
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # Sin INSERTs de movimientos mientras se calcula: un movimiento con fecha pasada
+            # queda dentro del corte o llega después y ajustar_cortes lo suma (SQLite ya
+            # serializa las escrituras con transacciones IMMEDIATE)
+            with connection.cursor() as cursor:
+                cursor.execute(f"LOCK TABLE {connection.ops.quote_name(Movimiento._meta.db_table)} IN SHARE MODE")
+        CorteStock.objects.filter(fecha=fecha).delete()
+        stock = stock_en(fecha)
+        corte = CorteStock.objects.create(
+            fecha=fecha,
+            ultimo_movimiento_id=Movimiento.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0,
+            lineas_total=len(stock),
+        )
+        CorteStockLinea.objects.bulk_create(
+            (CorteStockLinea(corte=corte, producto_id=p, ubicacion_id=u, cantidad=c) for (p, u), c in stock.items()),
+            batch_size=1000,
+        )
+    return corte
+
+
+def stock_por_reproduccion(fecha, ubicacion_id=None, producto_id=None):
+    """Stock al cierre de `fecha` sumando todo el historial (referencia para verificar los cortes)."""
+    return {clave: c for clave, c in efecto_neto(date.min, fecha, ubicacion_id, producto_id).items() if c}
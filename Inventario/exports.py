@@ -0,0 +1,32 @@
+import csv
+
+from django.http import StreamingHttpResponse
+
+# ==============================================================================
+# EXPORTACIONES CSV EN STREAMING
+# ==============================================================================
+# Las filas se generan y se envían al vuelo: la memoria del worker se mantiene
+# plana sin importar cuántas filas tenga el reporte, y el navegador empieza a
+# recibir el archivo de inmediato (no hay timeout esperando el archivo completo).
+
+CHUNK_SIZE = 2000
+
+
+class _Eco:
+    """Pseudo-buffer: csv.writer 'escribe' aquí y nos devuelve la línea ya formateada."""
+
+    def write(self, value):
+        return value
+
+
+def filas_de(queryset, *campos, chunk_size=CHUNK_SIZE):
+    """Recorre el queryset por bloques como tuplas (values_list), sin instanciar modelos."""
+    return queryset.values_list(*campos).iterator(chunk_size=chunk_size)
+
+
+def respuesta_csv(nombre_archivo, filas):
+    """StreamingHttpResponse que escribe cada fila (lista/tupla) del iterable como una línea CSV."""
+    writer = csv.writer(_Eco())
+    response = StreamingHttpResponse((writer.writerow(fila) for fila in filas), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    return response
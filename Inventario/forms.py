@@ -1,6 +1,39 @@
 from django import forms
+from django.urls import reverse
 from .models import Producto, Movimiento, Proveedor, Destino
 
+
+class AutocompleteSelect(forms.Select):
+    """
+    Select2 con carga ajax: el HTML solo incluye la opción seleccionada (no todo el
+    catálogo) y el resto llega paginado desde la URL `url_name`. La validación sigue
+    siendo la del ModelChoiceField (queryset completo).
+    """
+
+    def __init__(self, url_name, attrs=None):
+        self.url_name = url_name
+        super().__init__(attrs)
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-ajax-url'] = reverse(self.url_name)
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        completas = self.choices
+        seleccionados = [v for v in value if str(v).isdigit()]
+        self.choices = [('', '')]
+        if seleccionados:
+            self.choices += [
+                (obj.pk, completas.field.label_from_instance(obj))
+                for obj in completas.queryset.filter(pk__in=seleccionados)
+            ]
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = completas
+
+
 class ProveedorForm(forms.ModelForm):
     class Meta:
         model = Proveedor
@@ -43,12 +76,12 @@ class MovimientoForm(forms.ModelForm):
         model = Movimiento
         fields = ['producto', 'tipo', 'cantidad', 'fecha', 'origen', 'destino', 'razon_ajuste']
         widgets = {
-            'producto': forms.Select(attrs={'class': 'form-select select2'}),
+            'producto': AutocompleteSelect('producto_autocomplete', attrs={'class': 'form-select select2'}),
             'tipo': forms.Select(attrs={'class': 'form-select select2', 'id': 'id_tipo'}),
             'cantidad': forms.NumberInput(attrs={'class': 'form-control'}),
             'fecha': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
-            'origen': forms.Select(attrs={'class': 'form-select select2', 'id': 'id_origen'}),
-            'destino': forms.Select(attrs={'class': 'form-select select2', 'id': 'id_destino'}),
+            'origen': AutocompleteSelect('destino_autocomplete', attrs={'class': 'form-select select2', 'id': 'id_origen'}),
+            'destino': AutocompleteSelect('destino_autocomplete', attrs={'class': 'form-select select2', 'id': 'id_destino'}),
             'razon_ajuste': forms.Textarea(attrs={'class': 'form-control', 'rows': 2}),
         }
 
@@ -0,0 +1,218 @@
+import os
+import datetime
+import threading
+from urllib.parse import urljoin
+
+import google_auth_httplib2
+import httplib2
+from google.auth.exceptions import RefreshError
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build
+from googleapiclient.http import BatchHttpRequest
+from django.conf import settings # <--- IMPORTANTE: Para encontrar la ruta correcta
+
+# Las librerías de Google tardan en importarse: este módulo solo se carga al crear
+# el primer evento (utils.create_google_calendar_event), nunca al arrancar un worker.
+
+# Si modificas los scopes, elimina el archivo token.json.
+SCOPES = ['https://www.googleapis.com/auth/calendar']
+BATCH_PATH = '/batch/calendar/v3'
+MAX_BATCH = 50  # Google Calendar acepta hasta 50 peticiones por batch
+
+
+def _evento(summary, description):
+    # Configuración del evento (1 hora de duración por defecto)
+    start_time = datetime.datetime.now()
+    end_time = start_time + datetime.timedelta(hours=1)
+
+    return {
+        'summary': summary,
+        'description': description,
+        'start': {
+            'dateTime': start_time.isoformat(),
+            'timeZone': 'America/Mexico_City', # Ajusta tu zona horaria si es necesario
+        },
+        'end': {
+            'dateTime': end_time.isoformat(),
+            'timeZone': 'America/Mexico_City',
+        },
+        'reminders': {
+            'useDefault': False,
+            'overrides': [
+                {'method': 'email', 'minutes': 24 * 60},
+                {'method': 'popup', 'minutes': 10},
+            ],
+        },
+    }
+
+
+class ClienteCalendario:
+    """
+    Cliente de Google Calendar compartido por todo el proceso.
+    - Las credenciales se leen de token.json una vez y se refrescan solo al vencer.
+    - El servicio (build + documento de discovery estático) se construye una vez por endpoint.
+    - httplib2 no es thread-safe: cada hilo ejecuta con su propio AuthorizedHttp,
+      que además reutiliza su conexión entre eventos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._creds = None
+        self._servicio = None  # (endpoint, servicio)
+
+    def _rutas(self):
+        # RUTA DINÁMICA: Busca los archivos en la raíz del proyecto (donde está manage.py)
+        return (
+            os.path.join(settings.BASE_DIR, 'token.json'),
+            os.path.join(settings.BASE_DIR, 'credentials.json'),
+        )
+
+    def _credenciales(self, interactivo):
+        creds = self._creds
+        if creds and creds.valid:
+            return creds
+
+        with self._lock:
+            if self._creds and self._creds.valid:  # otro hilo ya las cargó o refrescó
+                return self._creds
+            token_path, credentials_path = self._rutas()
+            creds = self._creds
+
+            # 1. Cargar Token si existe
+            if creds is None and os.path.exists(token_path):
+                creds = Credentials.from_authorized_user_file(token_path, SCOPES)
+
+            # 2. Si no hay credenciales válidas, loguearse
+            if not creds or not creds.valid:
+                if creds and creds.expired and creds.refresh_token:
+                    # Un error de red (u otro) se propaga sin tocar token.json: el próximo
+                    # intento (o el reintento de la tarea en el worker) vuelve a refrescar
+                    try:
+                        creds.refresh(Request())
+                    except RefreshError as e:
+                        print(f"Error refrescando token: {e}")
+                        # Refresh token revocado o vencido: solo un login nuevo lo resuelve. El worker
+                        # no puede abrir el navegador, así que conserva el token y la tarea se reintenta
+                        if not interactivo:
+                            raise
+                        if os.path.exists(token_path):
+                            os.remove(token_path)
+                        creds = None
+
+                if not creds:
+                    # Verificar si existe el archivo json original
+                    if not os.path.exists(credentials_path):
+                        print(f"ERROR CRÍTICO: No se encuentra el archivo en: {credentials_path}")
+                        return None
+
+                    if not interactivo:
+                        print("No hay token válido de Google Calendar: genera token.json ejecutando el flujo en local.")
+                        return None
+
+                    try:
+                        flow = InstalledAppFlow.from_client_secrets_file(credentials_path, SCOPES)
+                        # Abre el navegador para que el usuario acepte permisos
+                        creds = flow.run_local_server(port=0)
+                    except Exception as e:
+                        print(f"Error en el flujo de autenticación: {e}")
+                        return None
+
+                # Guardar el token para la próxima vez
+                with open(token_path, 'w') as token:
+                    token.write(creds.to_json())
+
+            self._creds = creds
+            return creds
+
+    def _endpoint(self):
+        # GOOGLE_CALENDAR_API_ENDPOINT permite apuntar a otro servidor (p. ej. un stub en los tests)
+        return getattr(settings, 'GOOGLE_CALENDAR_API_ENDPOINT', None)
+
+    def _service(self, creds):
+        endpoint = self._endpoint()
+        cached = self._servicio
+        if cached is None or cached[0] != endpoint:
+            with self._lock:
+                cached = self._servicio
+                if cached is None or cached[0] != endpoint:
+                    servicio = build(
+                        'calendar', 'v3', credentials=creds, static_discovery=True, cache_discovery=False,
+                        client_options={'api_endpoint': endpoint} if endpoint else None,
+                    )
+                    cached = self._servicio = (endpoint, servicio)
+        return cached[1]
+
+    def _http(self, creds):
+        """AuthorizedHttp del hilo actual (se recrea si cambiaron las credenciales)."""
+        actual = getattr(self._local, 'http', None)
+        if actual is None or actual.credentials is not creds:
+            actual = self._local.http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+        return actual
+
+    def _preparar(self, interactivo):
+        creds = self._credenciales(interactivo)
+        if creds is None:
+            return None, None
+        return self._service(creds), self._http(creds)
+
+    def crear_evento(self, summary, description, interactivo=True):
+        """Inserta un evento y retorna su link (None si falla)."""
+        try:
+            service, http = self._preparar(interactivo)
+            if service is None:
+                return None
+            event = service.events().insert(calendarId='primary', body=_evento(summary, description)).execute(http=http)
+            print(f"Evento creado: {event.get('htmlLink')}")
+            return event.get('htmlLink')
+
+        except Exception as e:
+            print(f"Ocurrió un error al conectar con Google Calendar: {e}")
+            return None
+
+    def crear_eventos(self, eventos, interactivo=True):
+        """
+        Inserta varios eventos [(summary, description), ...] con batch requests de hasta
+        MAX_BATCH eventos por petición HTTP. Retorna los links en el mismo orden (None los que fallaron).
+        """
+        links = [None] * len(eventos)
+        try:
+            service, http = self._preparar(interactivo)
+        except Exception as e:
+            print(f"Ocurrió un error al conectar con Google Calendar: {e}")
+            return links
+        if service is None:
+            return links
+
+        def guardar(request_id, response, exception):
+            if exception is not None:
+                print(f"Error creando evento {request_id}: {exception}")
+            else:
+                links[int(request_id)] = response.get('htmlLink')
+
+        endpoint = self._endpoint()
+        for inicio in range(0, len(eventos), MAX_BATCH):
+            if endpoint:
+                batch = BatchHttpRequest(callback=guardar, batch_uri=urljoin(endpoint, BATCH_PATH))
+            else:
+                batch = service.new_batch_http_request(callback=guardar)
+            for i, (summary, description) in enumerate(eventos[inicio:inicio + MAX_BATCH], start=inicio):
+                batch.add(service.events().insert(calendarId='primary', body=_evento(summary, description)), request_id=str(i))
+            try:
+                batch.execute(http=http)
+            except Exception as e:
+                print(f"Ocurrió un error al conectar con Google Calendar: {e}")
+        return links
+
+    def reiniciar(self):
+        """Olvida credenciales y servicio (p. ej. después de regenerar token.json)."""
+        with self._lock:
+            self._creds = None
+            self._servicio = None
+            self._local = threading.local()
+
+
+calendario = ClienteCalendario()
+
@@ -0,0 +1,60 @@
+import csv
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from Inventario.services import registrar_movimientos_en_lote, resolver_filas
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa movimientos desde un CSV en un solo lote. "
+        "Columnas: producto (código), tipo, cantidad, fecha (AAAA-MM-DD), origen, destino (nombre o id), razon_ajuste."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo CSV.")
+        parser.add_argument('--usuario', help="Username que quedará registrado en los movimientos.")
+        parser.add_argument('--delimitador', default=',', help="Separador de columnas (por defecto ',').")
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options['usuario']:
+            try:
+                usuario = get_user_model().objects.get(username=options['usuario'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"El usuario '{options['usuario']}' no existe.")
+
+        try:
+            with open(options['archivo'], newline='', encoding='utf-8-sig') as f:
+                filas_crudas = list(csv.DictReader(f, delimiter=options['delimitador']))
+        except OSError as e:
+            raise CommandError(f"No se pudo leer el archivo: {e}")
+
+        inicio = time.perf_counter()
+        # Contamos las consultas para tener el costo por movimiento a la vista en cada importación
+        consultas = 0
+
+        def contar(execute, sql, params, many, context):
+            nonlocal consultas
+            consultas += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(contar):
+            filas, errores = resolver_filas(filas_crudas)
+            resultado = registrar_movimientos_en_lote(filas, usuario=usuario)
+        duracion = time.perf_counter() - inicio
+
+        errores = sorted(errores + resultado['errores'], key=lambda e: e['fila'])
+        for e in errores:
+            # +1 por la fila de encabezados: así el número coincide con la línea del archivo
+            self.stdout.write(self.style.ERROR(f"Línea {e['fila'] + 1}: {e['error']}"))
+
+        creados = resultado['creados']
+        por_movimiento = consultas / creados if creados else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{creados} movimientos importados, {len(errores)} filas con error, "
+            f"{consultas} consultas ({por_movimiento:.4f} por movimiento) en {duracion:.2f}s."
+        ))
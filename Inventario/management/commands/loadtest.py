@@ -0,0 +1,108 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+
+
+def _conexiones_postgres():
+    """Conexiones de clientes abiertas contra la BD actual (pg_stat_activity)."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() AND backend_type = 'client backend'"
+        )
+        return cursor.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga en proceso: N hilos piden una URL a través del WSGIHandler (con el ciclo "
+        "de conexiones de un worker real) y reporta latencias p50/p95/p99 y conexiones a Postgres."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/productos/', help="Ruta a pedir (GET).")
+        parser.add_argument('--concurrencia', type=int, default=20, help="Hilos simultáneos.")
+        parser.add_argument('--peticiones', type=int, default=500, help="Total de peticiones.")
+        parser.add_argument('--usuario', help="Usuario con el que se autentica (default: el primero activo).")
+
+    def handle(self, *args, **options):
+        usuarios = User.objects.filter(is_active=True).order_by('id')
+        if options['usuario']:
+            usuarios = usuarios.filter(username=options['usuario'])
+        usuario = usuarios.first()
+        if usuario is None:
+            raise CommandError("No hay usuario activo para autenticar las peticiones (usa --usuario).")
+
+        cliente = Client()
+        cliente.force_login(usuario)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={cliente.cookies[settings.SESSION_COOKIE_NAME].value}"
+        ruta = urlsplit(options['url'])
+        handler = WSGIHandler()
+
+        def pedir(_):
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': ruta.path, 'QUERY_STRING': ruta.query,
+                'HTTP_COOKIE': cookie, 'SERVER_NAME': 'localhost', 'wsgi.input': BytesIO(),
+            }
+            setup_testing_defaults(environ)
+            estado = []
+            inicio = time.perf_counter()
+            respuesta = handler(environ, lambda status, headers, exc_info=None: estado.append(int(status[:3])))
+            try:
+                for _ in respuesta:
+                    pass
+            finally:
+                respuesta.close()  # request_finished: devuelve la conexión al pool / cierra las vencidas
+            return time.perf_counter() - inicio, estado[0]
+
+        es_postgres = connection.vendor == 'postgresql'
+        maximo = [0]
+        fin = threading.Event()
+
+        def monitorear():
+            while not fin.wait(0.05):
+                maximo[0] = max(maximo[0], _conexiones_postgres())
+            connection.close()
+
+        if es_postgres:
+            antes = _conexiones_postgres()
+            monitor = threading.Thread(target=monitorear)
+            monitor.start()
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrencia']) as hilos:
+            resultados = list(hilos.map(pedir, range(options['peticiones'])))
+        total = time.perf_counter() - inicio
+
+        latencias = sorted(r[0] * 1000 for r in resultados)
+        errores = sum(1 for r in resultados if r[1] >= 500)
+        percentiles = statistics.quantiles(latencias, n=100) if len(latencias) > 1 else latencias * 99
+
+        self.stdout.write(
+            f"{len(resultados)} peticiones a {options['url']} con {options['concurrencia']} hilos "
+            f"en {total:.2f} s ({len(resultados) / total:.1f} req/s), {errores} errores"
+        )
+        self.stdout.write(
+            f"latencia ms: p50={percentiles[49]:.1f} p95={percentiles[94]:.1f} "
+            f"p99={percentiles[98]:.1f} max={latencias[-1]:.1f}"
+        )
+        if es_postgres:
+            fin.set()
+            monitor.join()
+            pool = settings.DATABASES['default'].get('OPTIONS', {}).get('pool')
+            modo = f"pool max_size={pool['max_size']}" if isinstance(pool, dict) else f"CONN_MAX_AGE={settings.DATABASES['default']['CONN_MAX_AGE']}"
+            self.stdout.write(
+                f"conexiones Postgres ({modo}): antes={antes} máximo={maximo[0]} después={_conexiones_postgres()}"
+            )
+        else:
+            self.stdout.write(f"conexiones: {connection.vendor} no tiene pool (una conexión por hilo)")
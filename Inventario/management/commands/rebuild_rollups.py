@@ -0,0 +1,24 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Inventario.services import reconstruir_resumenes
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el resumen diario (ResumenDiario) desde Movimiento con una sola consulta agregada."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help="Solo reconstruye a partir de esta fecha (AAAA-MM-DD).")
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['desde']:
+            try:
+                desde = date.fromisoformat(options['desde'])
+            except ValueError:
+                raise CommandError(f"Fecha inválida '{options['desde']}' (usa AAAA-MM-DD).")
+
+        creados = reconstruir_resumenes(desde)
+        alcance = f"desde {desde}" if desde else "de todo el historial"
+        self.stdout.write(self.style.SUCCESS(f"{creados} filas de resumen reconstruidas {alcance}."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from Inventario.search import TABLA_FTS, reconstruir_indice_fts
+
+
+class Command(BaseCommand):
+    help = (
+        "Vuelve a crear el índice de búsqueda FTS5 de SQLite (tabla y triggers) desde Producto. "
+        "Necesario si un AlterField de Producto o Proveedor borró los triggers (Inventario.W001)."
+    )
+
+    def handle(self, *args, **options):
+        filas = reconstruir_indice_fts()
+        if filas is None:
+            self.stdout.write("El motor no es SQLite: los índices de búsqueda los mantiene la BD.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"{TABLA_FTS} reconstruida con {filas} productos."))
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+
+from Inventario.models import Producto
+from Inventario.services import invalidar_cache_inventario
+
+
+def _desfasados(productos):
+    """Productos cuyo stock_total_global no coincide con la suma de Inventario (anotada en stock_real)."""
+    return (
+        productos.annotate(stock_real=Coalesce(Sum('inventarios__cantidad'), 0))
+        .exclude(stock_total_global=F('stock_real'))
+        .only('id', 'codigo', 'stock_total_global')
+        .order_by('codigo')
+    )
+
+
+class Command(BaseCommand):
+    help = "Recalcula stock_total_global desde Inventario en una sola consulta agregada y reporta diferencias."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Corrige los totales que no coinciden.")
+
+    def handle(self, *args, **options):
+        # Una sola consulta: SUM por producto con GROUP BY; el .exclude() sobre la suma anotada
+        # filtra los que coinciden (Django lo traduce a HAVING), así solo llegan los que difieren
+        desfasados = list(_desfasados(Producto.objects.all()))
+
+        if not desfasados:
+            self.stdout.write(self.style.SUCCESS("Sin diferencias: todos los totales coinciden con Inventario."))
+            return
+
+        for p in desfasados:
+            self.stdout.write(
+                f"{p.codigo}: registrado={p.stock_total_global} real={p.stock_real} "
+                f"(diferencia {p.stock_real - p.stock_total_global:+d})"
+            )
+
+        if options['fix']:
+            # Como reparar_inventario: se bloquean los productos y se recalcula dentro de la
+            # transacción. Un movimiento posteado después de la lectura de arriba ya está en la
+            # suma (o espera el lock), así su incremento de stock_total_global no se pisa
+            with transaction.atomic():
+                ids = list(
+                    Producto.objects.select_for_update().filter(pk__in=[p.pk for p in desfasados])
+                    .order_by('pk').values_list('pk', flat=True)
+                )
+                corregidos = list(_desfasados(Producto.objects.filter(pk__in=ids)))
+                for p in corregidos:
+                    p.stock_total_global = p.stock_real
+                Producto.objects.bulk_update(corregidos, ['stock_total_global'], batch_size=500)
+                transaction.on_commit(invalidar_cache_inventario)
+            self.stdout.write(self.style.SUCCESS(f"{len(corregidos)} productos corregidos."))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(desfasados)} productos con diferencias. Usa --fix para corregir."))
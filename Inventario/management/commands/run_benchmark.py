@@ -0,0 +1,150 @@
+import json
+import platform
+import subprocess
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from Inventario.benchmark import (
+    ESCALA_PESADA, TECHO_RSS_MB, comparar, limpiar, medir_endpoints, medir_exportacion, medir_financiero,
+    revisar_planes, sembrar,
+)
+
+ESCALAS = '200x20x2000,2000x60x20000'
+
+
+def _escalas(texto):
+    try:
+        escalas = [tuple(int(n) for n in e.split('x')) for e in texto.split(',')]
+    except ValueError:
+        escalas = None
+    if not escalas or any(len(e) != 3 for e in escalas):
+        raise CommandError(f"Escalas inválidas '{texto}' (formato: productosxsitiosxmovimientos,...).")
+    return escalas
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide los endpoints más usados a varias escalas de datos sintéticos en una base de datos "
+        "de tests desechable y guarda los resultados en JSON para comparar entre commits. "
+        "Con --pesado agrega la escala de 1M de movimientos: exporta todo el historial bajo un techo de RSS "
+        "compara el reporte financiero contra la implementación anterior y revisa que las consultas de "
+        "reportes usen sus índices."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escalas', default=ESCALAS, help=f"productosxsitiosxmovimientos separados por coma (default {ESCALAS}).")
+        parser.add_argument('--repeticiones', type=int, default=5, help="Mediciones por endpoint (más una de calentamiento).")
+        parser.add_argument('--salida', default='benchmark.json', help="Archivo JSON de resultados.")
+        parser.add_argument('--comparar', help="JSON de una corrida anterior: muestra el cambio de cada mediana.")
+        parser.add_argument(
+            '--pesado', action='store_true',
+            help=f"Agrega la escala {'x'.join(map(str, ESCALA_PESADA))} (tarda varios minutos) con las mediciones pesadas.",
+        )
+        parser.add_argument('--techo-rss-mb', type=int, default=TECHO_RSS_MB, help=f"Crecimiento máximo del RSS al exportar (default {TECHO_RSS_MB}).")
+
+    def handle(self, *args, **options):
+        escalas = _escalas(options['escalas'])
+        if options['pesado']:
+            escalas.append(ESCALA_PESADA)
+        anterior = None
+        if options['comparar']:
+            try:
+                with open(options['comparar']) as f:
+                    anterior = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"No se pudo leer {options['comparar']}: {e}")
+
+        resultados = {
+            'commit': _commit(),
+            'fecha': timezone.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'base_de_datos': connection.vendor,
+            'repeticiones': options['repeticiones'],
+            'escalas': [],
+        }
+        # Nunca sobre la BD real: se crea la de tests (como manage.py test) y se destruye al final
+        nombre_original = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        fallas = []
+        try:
+            for productos, sitios, movimientos in escalas:
+                limpiar()
+                inicio = time.perf_counter()
+                creados = sembrar(productos, sitios, movimientos)
+                siembra = time.perf_counter() - inicio
+                escala = f"{productos}x{sitios}x{movimientos}"
+                self.stdout.write(f"Escala {escala}: sembrada en {siembra:.2f}s, midiendo...")
+                endpoints = medir_endpoints(options['repeticiones'])
+                medidas = {'escala': escala, 'creados': creados, 'siembra_s': round(siembra, 2), 'endpoints': endpoints}
+                resultados['escalas'].append(medidas)
+                for nombre, medida in endpoints.items():
+                    self.stdout.write(
+                        f"  {nombre:<24} mediana={medida['mediana_ms']:>9.2f} ms  p95={medida['p95_ms']:>9.2f} ms  "
+                        f"consultas={medida['consultas']}"
+                    )
+                if options['pesado'] and (productos, sitios, movimientos) == ESCALA_PESADA:
+                    fallas += self._mediciones_pesadas(medidas, options)
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+
+        with open(options['salida'], 'w') as f:
+            json.dump(resultados, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['salida']}."))
+
+        if anterior:
+            self.stdout.write(f"Comparación contra {options['comparar']} (commit {anterior.get('commit')}):")
+            for escala, nombre, previa, actual, cambio in comparar(anterior, resultados):
+                estilo = self.style.ERROR if cambio > 10 else self.style.SUCCESS if cambio < -10 else str
+                self.stdout.write(estilo(f"  {escala:<20} {nombre:<24} {previa:>9.2f} -> {actual:>9.2f} ms ({cambio:+.1f}%)"))
+
+        if fallas:
+            raise CommandError("Mediciones pesadas fuera de su límite: " + "; ".join(fallas))
+
+    def _mediciones_pesadas(self, medidas, options):
+        """Corre las mediciones de la escala pesada sobre `medidas` y retorna las que fallaron."""
+        fallas = []
+        exportacion = medidas['exportacion'] = medir_exportacion(options['techo_rss_mb'])
+        estilo = self.style.SUCCESS if exportacion['dentro_del_techo'] else self.style.ERROR
+        self.stdout.write(estilo(
+            f"  exportación de {exportacion['filas']} movimientos en {exportacion['segundos']:.1f}s: "
+            f"RSS {exportacion['rss_inicial_mb']} -> {exportacion['rss_pico_mb']} MB "
+            f"(+{exportacion['crecimiento_mb']} MB, techo {exportacion['techo_mb']} MB)"
+        ))
+        if not exportacion['dentro_del_techo']:
+            fallas.append(f"la exportación creció {exportacion['crecimiento_mb']} MB (techo {exportacion['techo_mb']} MB)")
+
+        self.stdout.write("  reporte financiero (bodegas y unidades), implementación anterior vs actual...")
+        financiero = medidas['financiero'] = medir_financiero()
+        anterior, actual = financiero['anterior'], financiero['actual']
+        self.stdout.write(
+            (self.style.SUCCESS if financiero['coinciden'] else self.style.ERROR)(
+                f"    anterior {anterior['ms']:.0f} ms / {anterior['consultas']} consultas -> "
+                f"actual {actual['ms']:.0f} ms / {actual['consultas']} consultas "
+                f"(x{financiero['aceleracion']}, totales {'iguales' if financiero['coinciden'] else 'DISTINTOS'})"
+            )
+        )
+        if not financiero['coinciden']:
+            fallas.append("el reporte financiero no coincide con la implementación anterior")
+
+        planes = medidas['planes'] = revisar_planes()
+        for nombre, plan in planes.items():
+            if plan['usa_indice']:
+                self.stdout.write(self.style.SUCCESS(f"  plan {nombre:<26} usa {plan['indice']}"))
+            else:
+                self.stdout.write(self.style.ERROR(f"  plan {nombre:<26} NO usa {plan['indice']}:\n{plan['plan']}"))
+                fallas.append(f"el plan de {nombre} no usa {plan['indice']}")
+        return fallas
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from Inventario.tareas import procesar, trabajar
+
+
+class Command(BaseCommand):
+    help = "Ejecuta las tareas en segundo plano (Google Calendar, reportes de IA) con reintentos y backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Procesa las tareas disponibles y termina.")
+        parser.add_argument('--intervalo', type=float, default=2.0, help="Segundos de espera con la cola vacía.")
+        parser.add_argument('--max-tareas', type=int, help="Termina después de ejecutar N tareas.")
+
+    def handle(self, *args, **options):
+        if options['once']:
+            ejecutadas = procesar(options['max_tareas'])
+        else:
+            self.stdout.write("Worker iniciado (Ctrl+C para detener).")
+            try:
+                ejecutadas = trabajar(options['intervalo'], options['max_tareas'])
+            except KeyboardInterrupt:
+                self.stdout.write("Worker detenido.")
+                return
+        self.stdout.write(self.style.SUCCESS(f"{ejecutadas} tareas ejecutadas."))
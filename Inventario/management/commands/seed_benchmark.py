@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Inventario.benchmark import PREFIJO, limpiar, sembrar
+from Inventario.models import Producto
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera datos sintéticos reproducibles (proveedores, sitios, productos y un año de movimientos) "
+        f"con bulk inserts. Todo queda con el prefijo {PREFIJO}."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000, help="Cantidad de productos.")
+        parser.add_argument('--sites', type=int, default=50, help="Cantidad de sitios (~10%% bodegas).")
+        parser.add_argument('--movements', type=int, default=10000, help="Cantidad de movimientos.")
+        parser.add_argument('--seed', type=int, default=42, help="Semilla: misma semilla, mismos datos.")
+        parser.add_argument('--reset', action='store_true', help=f"Borra antes los datos {PREFIJO} existentes.")
+
+    def handle(self, *args, **options):
+        if min(options['products'], options['sites']) < 1 or options['movements'] < 0:
+            raise CommandError("--products y --sites deben ser mayores que cero.")
+        if options['reset']:
+            limpiar()
+        elif Producto.objects.filter(codigo__startswith=f'{PREFIJO}-').exists():
+            raise CommandError(f"Ya hay datos {PREFIJO} en la base de datos. Usa --reset para reemplazarlos.")
+
+        inicio = time.perf_counter()
+        creados = sembrar(options['products'], options['sites'], options['movements'], options['seed'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{creados['productos']} productos, {creados['sitios']} sitios, {creados['proveedores']} proveedores "
+            f"y {creados['movimientos']} movimientos en {time.perf_counter() - inicio:.2f}s."
+        ))
@@ -0,0 +1,45 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Inventario.cortes import stock_por_reproduccion, tomar_corte
+
+
+class Command(BaseCommand):
+    help = (
+        "Guarda el corte de stock (producto x sitio) al cierre de un día; por defecto ayer. "
+        "Programarlo a diario para que el stock histórico se reconstruya desde un corte cercano."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help="Día del corte (AAAA-MM-DD). Si ya existe, se reemplaza.")
+        parser.add_argument('--verificar', action='store_true', help="Compara el corte contra todo el historial de movimientos.")
+
+    def handle(self, *args, **options):
+        fecha = None
+        if options['fecha']:
+            try:
+                fecha = date.fromisoformat(options['fecha'])
+            except ValueError:
+                raise CommandError(f"Fecha inválida '{options['fecha']}' (usa AAAA-MM-DD).")
+
+        inicio = time.perf_counter()
+        corte = tomar_corte(fecha)
+        self.stdout.write(self.style.SUCCESS(
+            f"Corte al {corte.fecha}: {corte.lineas_total} líneas (movimientos hasta el #{corte.ultimo_movimiento_id}) "
+            f"en {time.perf_counter() - inicio:.2f}s."
+        ))
+
+        if options['verificar']:
+            guardado = {(l.producto_id, l.ubicacion_id): l.cantidad for l in corte.lineas.all()}
+            esperado = stock_por_reproduccion(corte.fecha)
+            diferencias = sorted(k for k in guardado.keys() | esperado.keys() if guardado.get(k, 0) != esperado.get(k, 0))
+            if diferencias:
+                for producto_id, ubicacion_id in diferencias:
+                    clave = (producto_id, ubicacion_id)
+                    self.stdout.write(
+                        f"producto {producto_id} en sitio {ubicacion_id}: corte={guardado.get(clave, 0)} historial={esperado.get(clave, 0)}"
+                    )
+                raise CommandError(f"{len(diferencias)} líneas no coinciden con el historial (revisa reconcile_stock).")
+            self.stdout.write(self.style.SUCCESS("El corte coincide con el historial de movimientos."))
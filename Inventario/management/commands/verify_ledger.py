@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from Inventario.services import diferencias_libro, reparar_inventario
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara Inventario con el saldo del libro de stock (un GROUP BY) y reporta las diferencias. "
+        "El libro es la fuente de verdad: nunca se modifica."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repair', action='store_true',
+            help="Reescribe Inventario (y stock_total_global) con el saldo del libro; no agrega asientos.",
+        )
+
+    def handle(self, *args, **options):
+        diferencias = diferencias_libro()
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS("Sin diferencias: Inventario coincide con el libro de stock."))
+            return
+
+        for producto_id, ubicacion_id, inventario, libro in diferencias:
+            self.stdout.write(
+                f"producto {producto_id} en sitio {ubicacion_id}: inventario={inventario} libro={libro} "
+                f"(diferencia {libro - inventario:+d})"
+            )
+
+        if options['repair']:
+            negativos = reparar_inventario(diferencias)
+            for producto_id, ubicacion_id, _, libro in negativos:
+                self.stdout.write(self.style.ERROR(
+                    f"producto {producto_id} en sitio {ubicacion_id}: saldo negativo en el libro ({libro}), no se puede reparar."
+                ))
+            self.stdout.write(self.style.SUCCESS(f"{len(diferencias) - len(negativos)} líneas de Inventario reparadas."))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(diferencias)} líneas con diferencias. Usa --repair para corregir."))
@@ -0,0 +1,198 @@
+import contextvars
+import json
+import logging
+import time
+import tracemalloc
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+# ==============================================================================
+# INSTRUMENTACIÓN POR REQUEST
+# ==============================================================================
+# Por cada request: cantidad de consultas SQL, tiempo en SQL, tiempo total y (opcional)
+# pico de memoria de Python. Se emite como log JSON (logger Inventario.instrumentacion)
+# y como header Server-Timing (visible en la pestaña Network del navegador).
+# PRESUPUESTOS_CONSULTAS = {url_name: máximo de consultas en un GET}: si una vista lo
+# excede se registra un warning; la suite de tests recorre el mismo diccionario y falla.
+#
+# Las consultas se cuentan con un execute_wrapper que se instala en cada conexión al
+# abrirse (ver apps.py) y que acumula en la medición del contextvar actual: así cuentan
+# también las consultas que una vista async hace en hilos vía sync_to_async.
+#
+# Las respuestas en streaming (exportaciones CSV, chat SSE) hacen su trabajo mientras se
+# envía el cuerpo, después de que la vista retorna: su contenido se envuelve para seguir
+# midiendo en cada chunk, y el registro (log y presupuesto) se hace al terminar de
+# enviarlo. Sus headers ya salieron antes, así que no llevan Server-Timing, y el presupuesto
+# no se les aplica: una exportación comparte url_name con la página pero no su costo.
+#
+# Con DatabaseCache (sin REDIS_URL) las lecturas y escrituras de la tabla de caché se
+# cuentan aparte (cache_queries): los presupuestos miden el trabajo de la vista, igual
+# que en producción con Redis. BEGIN/SAVEPOINT/RELEASE suman tiempo pero no cuentan
+# como consultas: no leen datos y dependen de si la vista ya corre dentro de otra
+# transacción (en los tests, siempre).
+
+logger = logging.getLogger('Inventario.instrumentacion')
+_medicion = contextvars.ContextVar('medicion', default=None)
+
+
+class Medicion:
+    __slots__ = ('consultas', 'consultas_cache', 'segundos_sql', 'inicio', 'segundos_total', 'pico_bytes')
+
+    def __init__(self):
+        self.consultas = 0
+        self.consultas_cache = 0
+        self.segundos_sql = 0.0
+        self.inicio = time.perf_counter()
+        self.segundos_total = 0.0
+        self.pico_bytes = None
+
+
+CONTROL_TRANSACCION = ('BEGIN', 'SAVEPOINT', 'RELEASE', 'COMMIT', 'ROLLBACK')
+
+
+def _tabla_cache():
+    config = settings.CACHES.get('default', {})
+    return config.get('LOCATION') if config.get('BACKEND', '').endswith('.DatabaseCache') else None
+
+
+def contar_consultas(execute, sql, params, many, context):
+    """execute_wrapper: suma la consulta a la medición del request en curso (si hay una)."""
+    medicion = _medicion.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        tabla = _tabla_cache()
+        if tabla and tabla in sql:
+            medicion.consultas_cache += 1
+        elif not sql.lstrip().upper().startswith(CONTROL_TRANSACCION):
+            medicion.consultas += 1
+        medicion.segundos_sql += time.perf_counter() - inicio
+
+
+def instalar_contador(sender, connection, **kwargs):
+    """Receptor de connection_created: cada conexión nueva cuenta sus consultas."""
+    if contar_consultas not in connection.execute_wrappers:
+        connection.execute_wrappers.append(contar_consultas)
+
+
+class InstrumentacionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+        # tracemalloc hace más lento todo el proceso: solo con INSTRUMENTACION_MEMORIA = True
+        self.memoria = getattr(settings, 'INSTRUMENTACION_MEMORIA', False)
+        if self.memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        medicion, token = self._iniciar(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        return self._terminar(request, response, medicion)
+
+    async def __acall__(self, request):
+        medicion, token = self._iniciar(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        return self._terminar(request, response, medicion)
+
+    def _iniciar(self, request):
+        medicion = request.medicion = Medicion()
+        if self.memoria:
+            # El pico es global al proceso: con requests simultáneos en hilos es aproximado
+            tracemalloc.reset_peak()
+        return medicion, _medicion.set(medicion)
+
+    def _terminar(self, request, response, medicion):
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self._medir_async(response.streaming_content, request, response, medicion)
+            else:
+                response.streaming_content = self._medir(response.streaming_content, request, response, medicion)
+            return response
+        self._registrar(request, response, medicion)
+        response['Server-Timing'] = ', '.join(self._server_timing(medicion))
+        return response
+
+    def _medir(self, contenido, request, response, medicion):
+        """Genera los chunks midiendo cada paso; registra al agotarse (o al cerrarse la conexión)."""
+        iterador = iter(contenido)
+        try:
+            while True:
+                token = _medicion.set(medicion)
+                try:
+                    chunk = next(iterador)
+                except StopIteration:
+                    return
+                finally:
+                    _medicion.reset(token)
+                yield chunk
+        finally:
+            self._registrar(request, response, medicion)
+
+    async def _medir_async(self, contenido, request, response, medicion):
+        iterador = aiter(contenido)
+        try:
+            while True:
+                token = _medicion.set(medicion)
+                try:
+                    chunk = await anext(iterador)
+                except StopAsyncIteration:
+                    return
+                finally:
+                    _medicion.reset(token)
+                yield chunk
+        finally:
+            self._registrar(request, response, medicion)
+
+    @staticmethod
+    def _server_timing(medicion):
+        timing = [
+            f'db;dur={medicion.segundos_sql * 1000:.1f};desc="{medicion.consultas} queries"',
+            f'total;dur={medicion.segundos_total * 1000:.1f}',
+        ]
+        if medicion.pico_bytes is not None:
+            timing.append(f'mem;desc="peak {medicion.pico_bytes // 1024} KB"')
+        return timing
+
+    def _registrar(self, request, response, medicion):
+        medicion.segundos_total = time.perf_counter() - medicion.inicio
+        if self.memoria:
+            medicion.pico_bytes = tracemalloc.get_traced_memory()[1]
+
+        url_name = request.resolver_match.url_name if request.resolver_match else None
+        registro = {
+            'event': 'request',
+            'method': request.method,
+            'path': request.path,
+            'url_name': url_name,
+            'status': response.status_code,
+            'streaming': response.streaming,
+            'queries': medicion.consultas,
+            'cache_queries': medicion.consultas_cache,
+            'sql_ms': round(medicion.segundos_sql * 1000, 1),
+            'total_ms': round(medicion.segundos_total * 1000, 1),
+            'peak_kb': medicion.pico_bytes // 1024 if medicion.pico_bytes is not None else None,
+        }
+        presupuesto = None
+        if request.method == 'GET' and not response.streaming:
+            presupuesto = getattr(settings, 'PRESUPUESTOS_CONSULTAS', {}).get(url_name)
+        if presupuesto is not None and medicion.consultas > presupuesto:
+            logger.warning(json.dumps({**registro, 'event': 'query_budget_exceeded', 'budget': presupuesto}))
+        else:
+            logger.info(json.dumps(registro))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventario', '0002_alter_movimiento_options_alter_movimiento_tipo_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventario',
+            index=models.Index(condition=models.Q(('cantidad__gt', 0)), fields=['ubicacion'], name='inv_ubicacion_con_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['-fecha', '-id'], name='mov_fecha_id_desc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['tipo', 'fecha'], name='mov_tipo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['destino', 'tipo', 'fecha'], name='mov_destino_tipo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['origen', 'tipo', 'fecha'], name='mov_origen_tipo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('stock_total_global__lte', models.F('stock_minimo'))), fields=['stock_total_global'], name='prod_bajo_stock_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def poblar_resumenes(apps, schema_editor):
+    # Backfill inicial: un GROUP BY sobre todo el historial (equivale a rebuild_rollups)
+    Movimiento = apps.get_model('Inventario', 'Movimiento')
+    ResumenDiario = apps.get_model('Inventario', 'ResumenDiario')
+    grupos = (
+        Movimiento.objects.values('fecha', 'producto_id', 'tipo', 'origen_id', 'destino_id')
+        .annotate(total=Sum('cantidad'), n=Count('id'))
+        .order_by()
+    )
+    ResumenDiario.objects.bulk_create(
+        (ResumenDiario(
+            fecha=g['fecha'], producto_id=g['producto_id'], tipo=g['tipo'],
+            origen_id=g['origen_id'], destino_id=g['destino_id'], cantidad=g['total'], movimientos=g['n'],
+        ) for g in grupos.iterator()),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventario', '0003_indices_reportes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo', models.CharField(choices=[('IN', 'Entry (Purchase/Income)'), ('OUT', 'Exit (Usage/Sale)'), ('REPLACEMENT', 'Exit (Replacement/Swap)'), ('TRANSFER', 'Transfer (Between Sites)'), ('ADJ_POS', 'Adjustment (+)'), ('ADJ_NEG', 'Adjustment (-)')], max_length=20)),
+                ('cantidad', models.BigIntegerField(default=0)),
+                ('movimientos', models.PositiveIntegerField(default=0)),
+                ('destino', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resumenes_entrada', to='Inventario.destino')),
+                ('origen', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resumenes_salida', to='Inventario.destino')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes', to='Inventario.producto')),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario',
+                'verbose_name_plural': 'Resúmenes Diarios',
+                'indexes': [models.Index(fields=['fecha', 'producto', 'tipo'], name='res_clave_idx'), models.Index(fields=['tipo', 'fecha'], name='res_tipo_fecha_idx'), models.Index(fields=['destino', 'tipo', 'fecha'], name='res_destino_tipo_fecha_idx')],
+            },
+        ),
+        migrations.RunPython(poblar_resumenes, migrations.RunPython.noop),
+    ]
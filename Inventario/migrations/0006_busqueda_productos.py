@@ -0,0 +1,80 @@
+from django.db import migrations
+
+# El índice de búsqueda depende del motor: FTS5 en SQLite, GIN (tsvector + trigram) en PostgreSQL.
+# En otros motores no se crea nada y la búsqueda cae a icontains.
+# TABLA_FTS y la expresión del índice GIN deben coincidir con Inventario/search.py.
+TABLA_FTS = 'inventario_producto_fts'
+
+FILA_FTS = (
+    "SELECT p.id, p.codigo, p.nombre, pv.nombre FROM \"Inventario_producto\" p "
+    "LEFT JOIN \"Inventario_proveedor\" pv ON pv.id = p.proveedor_id"
+)
+
+SQLITE_CREAR = [
+    f"CREATE VIRTUAL TABLE {TABLA_FTS} USING fts5("
+    "codigo, nombre, proveedor, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    f"INSERT INTO {TABLA_FTS}(rowid, codigo, nombre, proveedor) {FILA_FTS}",
+    f"""CREATE TRIGGER {TABLA_FTS}_ai AFTER INSERT ON "Inventario_producto" BEGIN
+        INSERT INTO {TABLA_FTS}(rowid, codigo, nombre, proveedor)
+        VALUES (new.id, new.codigo, new.nombre, (SELECT nombre FROM "Inventario_proveedor" WHERE id = new.proveedor_id));
+    END""",
+    # Solo cuando cambian las columnas indexadas: los UPDATE de stock no tocan el índice
+    f"""CREATE TRIGGER {TABLA_FTS}_au AFTER UPDATE OF codigo, nombre, proveedor_id ON "Inventario_producto" BEGIN
+        DELETE FROM {TABLA_FTS} WHERE rowid = old.id;
+        INSERT INTO {TABLA_FTS}(rowid, codigo, nombre, proveedor)
+        VALUES (new.id, new.codigo, new.nombre, (SELECT nombre FROM "Inventario_proveedor" WHERE id = new.proveedor_id));
+    END""",
+    f"""CREATE TRIGGER {TABLA_FTS}_ad AFTER DELETE ON "Inventario_producto" BEGIN
+        DELETE FROM {TABLA_FTS} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER {TABLA_FTS}_proveedor_au AFTER UPDATE OF nombre ON "Inventario_proveedor" BEGIN
+        UPDATE {TABLA_FTS} SET proveedor = new.nombre
+        WHERE rowid IN (SELECT id FROM "Inventario_producto" WHERE proveedor_id = new.id);
+    END""",
+]
+
+SQLITE_BORRAR = [
+    f"DROP TRIGGER IF EXISTS {TABLA_FTS}_proveedor_au",
+    f"DROP TRIGGER IF EXISTS {TABLA_FTS}_ad",
+    f"DROP TRIGGER IF EXISTS {TABLA_FTS}_au",
+    f"DROP TRIGGER IF EXISTS {TABLA_FTS}_ai",
+    f"DROP TABLE IF EXISTS {TABLA_FTS}",
+]
+
+POSTGRES_CREAR = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS prod_busqueda_fts_idx ON \"Inventario_producto\" USING GIN "
+    "(to_tsvector('simple', coalesce(codigo, '') || ' ' || coalesce(nombre, '')))",
+    "CREATE INDEX IF NOT EXISTS prod_nombre_trgm_idx ON \"Inventario_producto\" USING GIN (nombre gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS prov_nombre_trgm_idx ON \"Inventario_proveedor\" USING GIN (nombre gin_trgm_ops)",
+]
+
+POSTGRES_BORRAR = [
+    "DROP INDEX IF EXISTS prov_nombre_trgm_idx",
+    "DROP INDEX IF EXISTS prod_nombre_trgm_idx",
+    "DROP INDEX IF EXISTS prod_busqueda_fts_idx",
+]
+
+
+def _ejecutar(schema_editor, por_motor):
+    for sql in por_motor.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def crear_indice_busqueda(apps, schema_editor):
+    _ejecutar(schema_editor, {'sqlite': SQLITE_CREAR, 'postgresql': POSTGRES_CREAR})
+
+
+def borrar_indice_busqueda(apps, schema_editor):
+    _ejecutar(schema_editor, {'sqlite': SQLITE_BORRAR, 'postgresql': POSTGRES_BORRAR})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventario', '0005_tabla_cache'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice_busqueda, borrar_indice_busqueda),
+    ]
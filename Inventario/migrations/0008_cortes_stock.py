@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventario', '0007_cola_tareas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorteStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True, verbose_name='Stock al cierre de')),
+                ('ultimo_movimiento_id', models.BigIntegerField(default=0)),
+                ('lineas_total', models.PositiveIntegerField(default=0)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Corte de Stock',
+                'verbose_name_plural': 'Cortes de Stock',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CorteStockLinea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.IntegerField(default=0)),
+                ('corte', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='Inventario.cortestock')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Inventario.producto')),
+                ('ubicacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Inventario.destino')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['corte', 'ubicacion'], name='corte_ubicacion_idx')],
+                'unique_together': {('corte', 'producto', 'ubicacion')},
+            },
+        ),
+    ]
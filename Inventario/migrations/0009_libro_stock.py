@@ -0,0 +1,76 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:31
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def lados(tipo, cantidad, origen_id, destino_id):
+    # Mismas reglas que services.efecto_en_sitios (copiadas: la migración no depende del código actual)
+    if tipo in ('IN', 'ADJ_POS'):
+        return [(destino_id, cantidad)] if destino_id else []
+    if tipo in ('OUT', 'REPLACEMENT', 'ADJ_NEG'):
+        return [(origen_id, -cantidad)] if origen_id else []
+    if tipo == 'TRANSFER' and origen_id and destino_id:
+        return [(origen_id, -cantidad), (destino_id, cantidad)]
+    return []
+
+
+def poblar_libro(apps, schema_editor):
+    # Backfill: los asientos de todo el historial y, donde Inventario no coincide con el
+    # historial (stock cargado sin movimientos), un saldo de apertura por la diferencia
+    Movimiento = apps.get_model('Inventario', 'Movimiento')
+    Inventario = apps.get_model('Inventario', 'Inventario')
+    AsientoStock = apps.get_model('Inventario', 'AsientoStock')
+    saldos = defaultdict(int)
+
+    def asientos():
+        historial = Movimiento.objects.order_by('id').values_list(
+            'id', 'producto_id', 'tipo', 'cantidad', 'fecha', 'origen_id', 'destino_id'
+        )
+        for mov_id, producto_id, tipo, cantidad, fecha, origen_id, destino_id in historial.iterator(chunk_size=2000):
+            for ubicacion_id, delta in lados(tipo, cantidad, origen_id, destino_id):
+                saldos[(producto_id, ubicacion_id)] += delta
+                yield AsientoStock(movimiento_id=mov_id, producto_id=producto_id, ubicacion_id=ubicacion_id, cantidad=delta, fecha=fecha)
+
+    AsientoStock.objects.bulk_create(asientos(), batch_size=1000)
+
+    hoy = timezone.now().date()
+    apertura = []
+    for producto_id, ubicacion_id, cantidad in Inventario.objects.values_list('producto_id', 'ubicacion_id', 'cantidad').iterator():
+        diferencia = cantidad - saldos.pop((producto_id, ubicacion_id), 0)
+        if diferencia:
+            apertura.append(AsientoStock(producto_id=producto_id, ubicacion_id=ubicacion_id, cantidad=diferencia, fecha=hoy))
+    for (producto_id, ubicacion_id), saldo in saldos.items():  # saldo en el historial sin fila en Inventario
+        if saldo:
+            apertura.append(AsientoStock(producto_id=producto_id, ubicacion_id=ubicacion_id, cantidad=-saldo, fecha=hoy))
+    AsientoStock.objects.bulk_create(apertura, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventario', '0008_cortes_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AsientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.IntegerField()),
+                ('fecha', models.DateField()),
+                ('movimiento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='asientos', to='Inventario.movimiento')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Inventario.producto')),
+                ('ubicacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Inventario.destino')),
+            ],
+            options={
+                'verbose_name': 'Asiento de Stock',
+                'verbose_name_plural': 'Libro de Stock',
+                'indexes': [models.Index(fields=['producto', 'ubicacion'], name='asiento_saldo_idx')],
+            },
+        ),
+        migrations.RunPython(poblar_libro, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:35
+
+from django.db import migrations, models
+
+SECUENCIAS = ('inventario_ref_movimiento', 'inventario_ref_lista_compra')
+
+
+def crear_secuencias(apps, schema_editor):
+    # PostgreSQL reserva los números con secuencias nativas; SQLite usa la tabla ContadorReferencia
+    if schema_editor.connection.vendor == 'postgresql':
+        for nombre in SECUENCIAS:
+            schema_editor.execute(f"CREATE SEQUENCE IF NOT EXISTS {schema_editor.quote_name(nombre)}")
+
+
+def borrar_secuencias(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for nombre in SECUENCIAS:
+            schema_editor.execute(f"DROP SEQUENCE IF EXISTS {schema_editor.quote_name(nombre)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventario', '0009_libro_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorReferencia',
+            fields=[
+                ('serie', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('valor', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Contador de Referencias',
+                'verbose_name_plural': 'Contadores de Referencias',
+            },
+        ),
+        migrations.RunPython(crear_secuencias, borrar_secuencias),
+    ]
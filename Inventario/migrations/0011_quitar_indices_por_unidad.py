@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-17 22:26
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventario', '0010_referencias'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='movimiento',
+            name='mov_destino_tipo_fecha_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='movimiento',
+            name='mov_origen_tipo_fecha_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='resumendiario',
+            name='res_destino_tipo_fecha_idx',
+        ),
+    ]
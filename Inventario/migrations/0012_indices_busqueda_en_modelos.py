@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-17 22:33
+
+import Inventario.search
+import django.contrib.postgres.indexes
+import django.db.models.expressions
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventario', '0011_quitar_indices_por_unidad'),
+    ]
+
+    # Los índices ya existen en PostgreSQL (los creó el SQL de la 0006): solo se registran en el
+    # estado de migraciones para que Django los conozca.
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AddIndex(
+                model_name='producto',
+                index=Inventario.search.IndicePostgres(django.db.models.expressions.RawSQL("to_tsvector('simple', coalesce(codigo, '') || ' ' || coalesce(nombre, ''))", []), name='prod_busqueda_fts_idx'),
+            ),
+            migrations.AddIndex(
+                model_name='producto',
+                index=Inventario.search.IndicePostgres(django.contrib.postgres.indexes.OpClass('nombre', name='gin_trgm_ops'), name='prod_nombre_trgm_idx'),
+            ),
+            migrations.AddIndex(
+                model_name='proveedor',
+                index=Inventario.search.IndicePostgres(django.contrib.postgres.indexes.OpClass('nombre', name='gin_trgm_ops'), name='prov_nombre_trgm_idx'),
+            ),
+        ]),
+    ]
@@ -1,9 +1,15 @@
-from django.db import models
+from django.contrib.postgres.indexes import OpClass
+from django.db import models, transaction
+from django.db.models.expressions import RawSQL
 from django.utils import timezone
-from django.core.exceptions import ValidationError
-import uuid
+
+from .search import VECTOR_PG, IndicePostgres
 
 # --- PROVEEDOR ---
+# Búsqueda de productos (Inventario/search.py): en SQLite unos triggers copian el nombre al
+# índice FTS5 y Django no los conoce. Un AlterField sobre este modelo reconstruye la tabla y
+# choca con los triggers (o los borra sin aviso): envolver esas operaciones con
+# search.operaciones_sin_triggers_fts(). Inventario.W001 avisa si faltan; `manage.py rebuild_search`.
 class Proveedor(models.Model):
     nombre = models.CharField(max_length=100, verbose_name="Nombre Empresa / Proveedor")
     contacto = models.CharField(max_length=100, blank=True, verbose_name="Persona de Contacto")
@@ -16,6 +22,10 @@ class Proveedor(models.Model):
         verbose_name = "Proveedor"
         verbose_name_plural = "Proveedores"
         ordering = ['nombre']
+        indexes = [
+            # Solo PostgreSQL: ILIKE '%texto%' sobre el nombre del proveedor (pg_trgm, migración 0006)
+            IndicePostgres(OpClass('nombre', name='gin_trgm_ops'), name='prov_nombre_trgm_idx'),
+        ]
 
     def __str__(self):
         return self.nombre
@@ -37,6 +47,8 @@ class Destino(models.Model):
         return self.nombre
 
 # --- PRODUCTO ---
+# Igual que Proveedor: codigo, nombre y proveedor_id alimentan el índice FTS5 por triggers. Un
+# AlterField en SQLite va envuelto con search.operaciones_sin_triggers_fts().
 class Producto(models.Model):
     CATEGORIAS = [
         ('Kitchen', 'Kitchen'),
@@ -63,6 +75,17 @@ class Producto(models.Model):
     class Meta:
         verbose_name = "Producto"
         ordering = ['nombre']
+        indexes = [
+            # Alertas de reorden (dashboard, lista de compras, filtro de stock)
+            models.Index(
+                fields=['stock_total_global'],
+                condition=models.Q(stock_total_global__lte=models.F('stock_minimo')),
+                name='prod_bajo_stock_idx',
+            ),
+            # Solo PostgreSQL (migración 0006): texto completo y trigram para la búsqueda
+            IndicePostgres(RawSQL(VECTOR_PG.format(t=''), []), name='prod_busqueda_fts_idx'),
+            IndicePostgres(OpClass('nombre', name='gin_trgm_ops'), name='prod_nombre_trgm_idx'),
+        ]
 
     def __str__(self):
         return f"{self.codigo} - {self.nombre}"
@@ -92,6 +115,10 @@ class Inventario(models.Model):
         unique_together = ('producto', 'ubicacion')
         verbose_name = "Inventario por Sitio"
         verbose_name_plural = "Inventario por Sitios"
+        indexes = [
+            # Reportes por bodega: solo interesan las filas con existencias
+            models.Index(fields=['ubicacion'], condition=models.Q(cantidad__gt=0), name='inv_ubicacion_con_stock_idx'),
+        ]
 
     def __str__(self):
         return f"{self.producto.nombre} en {self.ubicacion.nombre}: {self.cantidad}"
@@ -119,103 +146,108 @@ class Movimiento(models.Model):
     razon_ajuste = models.TextField(blank=True, null=True)
     usuario = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Historial (reporte_movimientos, dashboard) y salidas de reporte_financiero: ORDER BY fecha DESC, id DESC y rango de fechas
+            models.Index(fields=['-fecha', '-id'], name='mov_fecha_id_desc_idx'),
+            # Historial filtrado por tipo (reporte_movimientos ?tipo=), con o sin rango de fechas.
+            # Los costos por unidad leen ResumenDiario: no hay índices de Movimiento por sitio
+            models.Index(fields=['tipo', 'fecha'], name='mov_tipo_fecha_idx'),
+        ]
+
+    PREFIJOS_REFERENCIA = {
+        'IN': "IN",
+        'OUT': "OUT",
+        'REPLACEMENT': "REP",
+        'TRANSFER': "TRF",
+        'ADJ_POS': "ADJ+",
+        'ADJ_NEG': "ADJ-",
+    }
+
+    @classmethod
+    def generar_referencias(cls, tipos):
+        """Una referencia por tipo (ej. TRF-261017-0000042), con sus números reservados en una sola consulta."""
+        from .referencias import formatear, reservar
+        return [
+            formatear(cls.PREFIJOS_REFERENCIA.get(tipo, "MOV"), numero)
+            for tipo, numero in zip(tipos, reservar('movimiento', len(tipos)))
+        ]
+
+    @classmethod
+    def generar_referencia(cls, tipo):
+        return cls.generar_referencias([tipo])[0]
+
     def save(self, *args, **kwargs):
         # 1. Generar Referencia
         if not self.referencia:
-            prefijo = "MOV"
-            if self.tipo == 'IN': prefijo = "IN"
-            elif self.tipo == 'OUT': prefijo = "OUT"
-            elif self.tipo == 'REPLACEMENT': prefijo = "REP"
-            elif self.tipo == 'TRANSFER': prefijo = "TRF"
-            elif self.tipo == 'ADJ_POS': prefijo = "ADJ+"
-            elif self.tipo == 'ADJ_NEG': prefijo = "ADJ-"
-            self.referencia = f"{prefijo}-{timezone.now().strftime('%y%m%d')}-{str(uuid.uuid4())[:6].upper()}"
+            self.referencia = self.generar_referencia(self.tipo)
 
         # 2. Lógica de Inventario (Solo si es nuevo)
-        if not self.pk: 
-            
-            # === CASO 1: ENTRADAS (IN) ===
-            if self.tipo == 'IN':
-                if self.destino:
-                    inv_destino, created = Inventario.objects.get_or_create(
-                        producto=self.producto, 
-                        ubicacion=self.destino
-                    )
-                    inv_destino.cantidad += self.cantidad
-                    inv_destino.save()
-
-            # === CASO 2: SALIDAS (OUT) O REEMPLAZOS (REPLACEMENT) ===
-            elif self.tipo == 'OUT' or self.tipo == 'REPLACEMENT':
-                if self.origen:
-                    try:
-                        inv_origen = Inventario.objects.get(producto=self.producto, ubicacion=self.origen)
-                        if inv_origen.cantidad < self.cantidad:
-                            raise ValidationError(f"Stock insuficiente en {self.origen.nombre}. Disponibles: {inv_origen.cantidad}")
-                        inv_origen.cantidad -= self.cantidad
-                        inv_origen.save()
-                    except Inventario.DoesNotExist:
-                        raise ValidationError(f"No hay stock de este producto en {self.origen.nombre}.")
-                else:
-                    raise ValidationError("Debes seleccionar el Origen (From) para salidas o reemplazos.")
-
-            # === CASO 3: AJUSTE POSITIVO (+) ===
-            elif self.tipo == 'ADJ_POS':
-                if self.destino:
-                    inv_destino, created = Inventario.objects.get_or_create(
-                        producto=self.producto, 
-                        ubicacion=self.destino
-                    )
-                    inv_destino.cantidad += self.cantidad
-                    inv_destino.save()
-                else:
-                    raise ValidationError("Para Ajuste Positivo, selecciona el Destino.")
-
-            # === CASO 4: AJUSTE NEGATIVO (-) ===
-            elif self.tipo == 'ADJ_NEG':
-                if self.origen:
-                    try:
-                        inv_origen = Inventario.objects.get(producto=self.producto, ubicacion=self.origen)
-                        if inv_origen.cantidad < self.cantidad:
-                            raise ValidationError(f"No puedes restar {self.cantidad}. Solo hay {inv_origen.cantidad}.")
-                        inv_origen.cantidad -= self.cantidad
-                        inv_origen.save()
-                    except Inventario.DoesNotExist:
-                        raise ValidationError(f"No existe inventario en {self.origen.nombre}.")
-                else:
-                    raise ValidationError("Para Ajuste Negativo, selecciona el Origen.")
-
-            # === CASO 5: TRANSFERENCIAS ===
-            elif self.tipo == 'TRANSFER':
-                if self.origen and self.destino:
-                    # Restar Origen
-                    try:
-                        inv_origen = Inventario.objects.get(producto=self.producto, ubicacion=self.origen)
-                        if inv_origen.cantidad < self.cantidad:
-                            raise ValidationError(f"Stock insuficiente en origen ({self.origen.nombre}).")
-                        inv_origen.cantidad -= self.cantidad
-                        inv_origen.save()
-                    except Inventario.DoesNotExist:
-                        raise ValidationError(f"No hay inventario en {self.origen.nombre}.")
-
-                    # Sumar Destino
-                    inv_destino, created = Inventario.objects.get_or_create(
-                        producto=self.producto, 
-                        ubicacion=self.destino
-                    )
-                    inv_destino.cantidad += self.cantidad
-                    inv_destino.save()
-
-            # 3. Recalcular Stock Global
-            total_real = 0
-            inventarios = Inventario.objects.filter(producto=self.producto)
-            for inv in inventarios:
-                total_real += inv.cantidad
-            
-            self.producto.stock_total_global = total_real
-            self.producto.save()
+        # El posteo de stock y el INSERT del movimiento van en la misma transacción:
+        # si algo falla a mitad de camino, no queda stock descontado sin su movimiento.
+        if not self.pk:
+            from .services import ajustar_cortes, asentar, postear_movimiento
+            with transaction.atomic():
+                postear_movimiento(self)
+                super().save(*args, **kwargs)
+                asentar([self])
+                ajustar_cortes([self])
+            return
 
         super().save(*args, **kwargs)
 
+# --- LIBRO DE STOCK (LEDGER) ---
+# Una línea con signo por cada sitio que toca un movimiento (TRANSFER: -origen y +destino),
+# insertadas junto al movimiento y nunca modificadas. Inventario.cantidad es un caché
+# del saldo del libro: verify_ledger compara ambos con un GROUP BY y repara Inventario.
+class AsientoStock(models.Model):
+    # Sin movimiento: saldo de apertura (stock que ya existía al crear el libro, migración 0009).
+    # El libro es la fuente de verdad: verify_ledger --repair corrige Inventario, nunca el libro
+    movimiento = models.ForeignKey(Movimiento, on_delete=models.RESTRICT, null=True, blank=True, related_name='asientos')
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    ubicacion = models.ForeignKey(Destino, on_delete=models.CASCADE)
+    cantidad = models.IntegerField()
+    fecha = models.DateField()
+
+    class Meta:
+        verbose_name = "Asiento de Stock"
+        verbose_name_plural = "Libro de Stock"
+        indexes = [
+            models.Index(fields=['producto', 'ubicacion'], name='asiento_saldo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id}@{self.ubicacion_id}: {self.cantidad:+d}"
+
+# --- RESUMEN DIARIO DE MOVIMIENTOS (ROLLUP) ---
+# Suma de cantidades por (fecha, producto, tipo, origen, destino). Se mantiene al
+# postear cada movimiento y los reportes leen aquí en vez de recorrer todo el historial.
+# El valor se calcula al leer (cantidad x precio_venta actual), igual que los reportes
+# sobre Movimiento. Puede haber filas repetidas para una misma clave (inserciones
+# concurrentes, sitios borrados): las sumas siguen siendo correctas y
+# rebuild_rollups las compacta.
+class ResumenDiario(models.Model):
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='resumenes')
+    tipo = models.CharField(max_length=20, choices=Movimiento.TIPO_MOVIMIENTO)
+    origen = models.ForeignKey(Destino, on_delete=models.SET_NULL, null=True, blank=True, related_name='resumenes_salida')
+    destino = models.ForeignKey(Destino, on_delete=models.SET_NULL, null=True, blank=True, related_name='resumenes_entrada')
+    cantidad = models.BigIntegerField(default=0)
+    movimientos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Resumen Diario"
+        verbose_name_plural = "Resúmenes Diarios"
+        indexes = [
+            # Búsqueda de la fila a acumular al postear
+            models.Index(fields=['fecha', 'producto', 'tipo'], name='res_clave_idx'),
+            # Gastos por tipo y rango de fechas, también agrupados por unidad (reporte_financiero, Elite AI)
+            models.Index(fields=['tipo', 'fecha'], name='res_tipo_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.tipo} {self.producto_id}: {self.cantidad}"
+
 # --- NUEVOS MODELOS PARA LISTA DE COMPRAS ---
 class ListaCompra(models.Model):
     ESTADOS = [
@@ -232,8 +264,9 @@ class ListaCompra(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.id_lista:
-            # Format: SHOP-YYMMDD-UUID (Short)
-            self.id_lista = f"SHOP-{timezone.now().strftime('%y%m%d')}-{str(uuid.uuid4())[:4].upper()}"
+            # Format: SHOP-YYMMDD-NNNNNNN (número de la serie, sin colisiones)
+            from .referencias import formatear, reservar
+            self.id_lista = formatear("SHOP", reservar('lista_compra')[0])
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -246,4 +279,86 @@ class ItemLista(models.Model):
     comprado = models.BooleanField(default=False)
 
     def __str__(self):
-        return f"{self.producto.nombre} - {self.cantidad_sugerida}"
\ No newline at end of file
+        return f"{self.producto.nombre} - {self.cantidad_sugerida}"
+
+# --- COLA DE TAREAS EN SEGUNDO PLANO ---
+class Tarea(models.Model):
+    """Efecto lateral lento (Google Calendar, reportes de IA) que ejecuta `manage.py run_worker`."""
+    ESTADOS = [
+        ('PENDING', 'Pendiente'),
+        ('RUNNING', 'En ejecución'),
+        ('DONE', 'Completada'),
+        ('FAILED', 'Fallida'),
+    ]
+
+    tipo = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='PENDING')
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=5)
+    # PENDING: no antes de esta hora (backoff). RUNNING: vence el lease del worker que la tomó
+    disponible_en = models.DateTimeField(default=timezone.now)
+    resultado = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    usuario = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True)
+    creada = models.DateTimeField(auto_now_add=True)
+    actualizada = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Tarea"
+        verbose_name_plural = "Tareas"
+        indexes = [
+            # El worker busca la siguiente tarea lista: estado + disponible_en
+            models.Index(fields=['estado', 'disponible_en'], name='tarea_cola_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.tipo} ({self.get_estado_display()})"
+
+# --- CORTES DE STOCK (SNAPSHOTS) ---
+# Foto del stock de cada producto x sitio al cierre de un día. El stock histórico se
+# reconstruye desde el corte más cercano aplicando solo los movimientos entre ese día y
+# la fecha pedida (ver cortes.py), en vez de repetir todo el historial.
+class CorteStock(models.Model):
+    fecha = models.DateField(unique=True, verbose_name="Stock al cierre de")
+    # Movimientos con id <= este ya existían al tomar el corte; los cargados después
+    # con fecha <= `fecha` se suman al corte al postearlos (services.ajustar_cortes)
+    ultimo_movimiento_id = models.BigIntegerField(default=0)
+    lineas_total = models.PositiveIntegerField(default=0)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Corte de Stock"
+        verbose_name_plural = "Cortes de Stock"
+        ordering = ['-fecha']
+
+    def __str__(self):
+        return f"Corte {self.fecha} ({self.lineas_total} líneas)"
+
+
+class CorteStockLinea(models.Model):
+    corte = models.ForeignKey(CorteStock, on_delete=models.CASCADE, related_name='lineas')
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    ubicacion = models.ForeignKey(Destino, on_delete=models.CASCADE)
+    cantidad = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('corte', 'producto', 'ubicacion')
+        indexes = [
+            # Stock histórico de un sitio: líneas del corte para esa ubicación
+            models.Index(fields=['corte', 'ubicacion'], name='corte_ubicacion_idx'),
+        ]
+
+# --- CONTADORES DE REFERENCIAS ---
+# Último número entregado por cada serie de referencias (referencias.py). En PostgreSQL
+# se usan secuencias nativas; esta tabla es el equivalente para SQLite.
+class ContadorReferencia(models.Model):
+    serie = models.CharField(max_length=50, primary_key=True)
+    valor = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Contador de Referencias"
+        verbose_name_plural = "Contadores de Referencias"
+
+    def __str__(self):
+        return f"{self.serie}: {self.valor}"
@@ -0,0 +1,48 @@
+from django.db import connection
+from django.utils import timezone
+
+from .models import ContadorReferencia
+
+# ==============================================================================
+# REFERENCIAS (MOVIMIENTOS, LISTAS DE COMPRA)
+# ==============================================================================
+# Formato PREFIJO-AAMMDD-NNNNNNN: el número sale de una serie que solo crece, así dos
+# referencias nunca chocan (antes eran 4-6 caracteres de un uuid4 y una colisión
+# terminaba en IntegrityError a mitad de la transacción). Reservar N números cuesta
+# una sola consulta, sin importar N:
+# - PostgreSQL: una SEQUENCE por serie (migración 0010). nextval no bloquea a otras
+#   transacciones ni se revierte con un rollback (pueden quedar huecos, nunca repetidos).
+# - SQLite: un UPSERT ... RETURNING atómico sobre ContadorReferencia.
+
+SERIES = ('movimiento', 'lista_compra')
+
+
+def nombre_secuencia(serie):
+    return f'inventario_ref_{serie}'
+
+
+def reservar(serie, cantidad=1):
+    """Reserva `cantidad` números de la serie y los retorna en orden creciente."""
+    if serie not in SERIES:
+        raise ValueError(f"Serie de referencias desconocida: {serie}")
+    if cantidad < 1:
+        return []
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s)", [nombre_secuencia(serie), cantidad])
+            return sorted(numero for (numero,) in cursor.fetchall())
+
+        tabla = connection.ops.quote_name(ContadorReferencia._meta.db_table)
+        cursor.execute(
+            f"INSERT INTO {tabla} (serie, valor) VALUES (%s, %s) "
+            f"ON CONFLICT (serie) DO UPDATE SET valor = {tabla}.valor + excluded.valor RETURNING valor",
+            [serie, cantidad],
+        )
+        ultimo = cursor.fetchone()[0]
+    return list(range(ultimo - cantidad + 1, ultimo + 1))
+
+
+def formatear(prefijo, numero, fecha=None):
+    """PREFIJO-AAMMDD-NNNNNNN; 7 dígitos como mínimo para no confundirse con las referencias viejas (uuid)."""
+    return f"{prefijo}-{(fecha or timezone.now()).strftime('%y%m%d')}-{numero:07d}"
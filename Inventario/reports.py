@@ -0,0 +1,275 @@
+import base64
+from datetime import date
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Destino, Inventario, ItemLista, ListaCompra, Movimiento, Producto, ResumenDiario
+from .services import version_inventario
+
+# ==============================================================================
+# CONSULTAS AGREGADAS PARA REPORTES
+# ==============================================================================
+# Todo se calcula en la BD con GROUP BY: el número de consultas es fijo,
+# sin importar cuántos productos o sitios existan. Los totales por fecha leen
+# ResumenDiario (una fila por día/producto/tipo/sitio) en vez de Movimiento.
+
+DINERO = DecimalField(max_digits=20, decimal_places=2)
+CERO = Decimal('0.00')
+
+# --- DASHBOARD ---
+KPIS_DASHBOARD_TTL = 60  # segundos; además se invalida al postear cualquier movimiento
+
+
+def valor_por_sitio():
+    """Cantidad de líneas y valor (cantidad x precio_venta) por sitio, en un solo GROUP BY."""
+    return (
+        Inventario.objects.values('ubicacion_id', 'ubicacion__nombre', 'ubicacion__tipo')
+        .annotate(
+            total_items=Count('id'),
+            valor=Coalesce(Sum(F('cantidad') * F('producto__precio_venta'), output_field=DINERO), CERO),
+        )
+        .order_by('-valor', 'ubicacion__nombre')
+    )
+
+
+def resumen_bodegas():
+    """Totales de cada sitio con existencias (reporte_bodegas) en un solo GROUP BY ubicacion."""
+    return (
+        Inventario.objects.filter(cantidad__gt=0)
+        .values('ubicacion_id', 'ubicacion__nombre', 'ubicacion__direccion')
+        .annotate(
+            lineas=Count('id'),
+            total_items=Sum('cantidad'),
+            valor_total=Sum(F('cantidad') * F('producto__precio_venta'), output_field=DINERO),
+        )
+        .order_by('ubicacion__nombre', 'ubicacion_id')
+    )
+
+
+def items_de_sitio(ubicacion_id):
+    """Líneas de stock de un sitio (values, sin instanciar modelos), para expandirlo bajo demanda."""
+    return (
+        Inventario.objects.filter(ubicacion_id=ubicacion_id, cantidad__gt=0)
+        .order_by('producto__nombre')
+        .values('producto__codigo', 'producto__nombre', 'producto__categoria', 'cantidad', 'producto__precio_venta')
+    )
+
+
+def calcular_kpis_dashboard():
+    """KPIs del dashboard en 4 consultas, independientes del tamaño del catálogo."""
+    totales = Producto.objects.aggregate(
+        total_productos=Count('id'),
+        valor_inventario=Coalesce(Sum(F('stock_total_global') * F('precio_venta'), output_field=DINERO), CERO),
+        alertas=Count('id', filter=Q(stock_total_global__lte=F('stock_minimo'))),
+    )
+
+    categorias = list(Producto.objects.values('categoria').annotate(total=Count('id')).order_by('-total'))
+
+    bodegas_summary = [
+        {
+            'name': fila['ubicacion__nombre'],
+            'type': fila['ubicacion__tipo'],
+            'total_items': fila['total_items'],
+            'value': float(fila['valor']),  # Float para evitar errores de serialización si fuera necesario
+        }
+        for fila in valor_por_sitio()
+    ]
+
+    return {
+        **totales,
+        'movimientos_hoy': ResumenDiario.objects.filter(fecha=timezone.now().date()).aggregate(
+            total=Coalesce(Sum('movimientos'), 0)
+        )['total'],
+        'chart_cat_labels': [c['categoria'] for c in categorias],
+        'chart_cat_data': [c['total'] for c in categorias],
+        'bodegas_summary': bodegas_summary,
+    }
+
+
+def kpis_dashboard():
+    """Snapshot cacheado de los KPIs; la clave cambia con la versión del inventario y con el día."""
+    clave = f"dashboard:kpis:{version_inventario()}:{timezone.now().date().isoformat()}"
+    return cache.get_or_set(clave, calcular_kpis_dashboard, timeout=KPIS_DASHBOARD_TTL)
+
+
+# --- REPORTE FINANCIERO ---
+# Compartido por la vista HTML y la exportación excel_financiero: cada sección es
+# una sola consulta agregada, sin recorrer sitios ni movimientos en Python.
+FILTRO_BODEGA = 'Bodega'  # Destinos cuyo tipo contiene 'Bodega' son almacenes; el resto, unidades
+
+
+def salidas_financieras(start_date=None, end_date=None):
+    """A. Salidas generales (OUT / REPLACEMENT), opcionalmente en un rango de fechas."""
+    salidas = Movimiento.objects.filter(tipo__in=['OUT', 'REPLACEMENT']).select_related(
+        'producto', 'origen', 'destino', 'usuario'
+    ).order_by('-fecha')
+    if start_date and end_date:
+        salidas = salidas.filter(fecha__range=[start_date, end_date])
+    return salidas
+
+
+def salidas_por_referencia(salidas):
+    """B. Total por generación de salida (agrupado por referencia)."""
+    return salidas.values('referencia', 'fecha', 'usuario__username', 'origen__nombre', 'destino__nombre').annotate(
+        total_items=Sum('cantidad'),
+        valor_total=Sum(F('cantidad') * F('producto__precio_venta'), output_field=DINERO),
+    ).order_by('-fecha')
+
+
+def valor_bodegas():
+    """C. Valor actual del inventario de cada bodega (incluye bodegas vacías)."""
+    # quantize: SQLite pierde la escala en SUM y el reporte siempre muestra centavos
+    return [
+        {'nombre': fila['nombre'], 'items': fila['items'], 'valor': fila['valor'].quantize(CERO)}
+        for fila in Destino.objects.filter(tipo__icontains=FILTRO_BODEGA)
+        .annotate(
+            items=Count('inventario_sitio'),
+            valor=Coalesce(
+                Sum(F('inventario_sitio__cantidad') * F('inventario_sitio__producto__precio_venta'), output_field=DINERO),
+                CERO,
+            ),
+        )
+        .order_by('nombre')
+        .values('nombre', 'items', 'valor')
+    ]
+
+
+def costos_por_unidad(start_date=None, end_date=None):
+    """D. Costo acumulado despachado (OUT / TRANSFER) hacia cada unidad que no es bodega."""
+    movs = ResumenDiario.objects.filter(tipo__in=['OUT', 'TRANSFER'], destino__isnull=False).exclude(
+        destino__tipo__icontains=FILTRO_BODEGA
+    )
+    if start_date and end_date:
+        movs = movs.filter(fecha__range=[start_date, end_date])
+    return [
+        {'nombre': fila['destino__nombre'], 'tipo': fila['destino__tipo'], 'costo_total': fila['costo_total'].quantize(CERO)}
+        for fila in movs.values('destino_id', 'destino__nombre', 'destino__tipo')
+        .annotate(costo_total=Sum(F('cantidad') * F('producto__precio_venta'), output_field=DINERO))
+        .filter(costo_total__gt=0)
+        .order_by('destino__nombre', 'destino_id')
+    ]
+
+
+# --- GASTOS (ELITE AI) ---
+TIPOS_GASTO = ['OUT', 'REPLACEMENT']
+
+
+def gasto_total(desde=None):
+    """Valor de las salidas (OUT / REPLACEMENT), total o a partir de una fecha, desde el rollup."""
+    resumenes = ResumenDiario.objects.filter(tipo__in=TIPOS_GASTO)
+    if desde:
+        resumenes = resumenes.filter(fecha__gte=desde)
+    return resumenes.aggregate(
+        total=Coalesce(Sum(F('cantidad') * F('producto__precio_venta'), output_field=DINERO), CERO)
+    )['total']
+
+
+def unidades_con_mas_gasto(limite=5):
+    """Destinos con mayor valor de salidas acumulado."""
+    return (
+        ResumenDiario.objects.filter(tipo__in=TIPOS_GASTO, destino__isnull=False)
+        .values('destino__nombre', 'destino__tipo')
+        .annotate(total_expense=Sum(F('cantidad') * F('producto__precio_venta'), output_field=DINERO))
+        .order_by('-total_expense')[:limite]
+    )
+
+
+# --- LISTAS DE COMPRA ---
+LISTAS_POR_PAGINA = 20
+COSTO_ITEM = F('cantidad_sugerida') * F('producto__precio_costo')
+
+
+def listas_con_totales():
+    """Listas con cantidad de ítems y costo estimado (precio_costo), en la misma consulta de la página."""
+    return (
+        ListaCompra.objects.select_related('usuario')
+        .annotate(
+            total_items=Count('items'),
+            costo_estimado=Coalesce(
+                Sum(F('items__cantidad_sugerida') * F('items__producto__precio_costo'), output_field=DINERO), CERO
+            ),
+        )
+        .order_by('-fecha_creacion', '-id')
+    )
+
+
+def items_de_lista(lista):
+    """Ítems con su subtotal calculado en la BD."""
+    return lista.items.select_related('producto').annotate(
+        subtotal=ExpressionWrapper(COSTO_ITEM, output_field=DINERO)
+    ).order_by('producto__nombre')
+
+
+def totales_lista(lista):
+    return ItemLista.objects.filter(lista=lista).aggregate(
+        total_items=Count('id'),
+        total_unidades=Coalesce(Sum('cantidad_sugerida'), 0),
+        costo_estimado=Coalesce(Sum(COSTO_ITEM, output_field=DINERO), CERO),
+    )
+
+
+# --- HISTORIAL DE MOVIMIENTOS (PAGINACIÓN KEYSET) ---
+# En vez de OFFSET, cada página arranca "después" de la última fila vista sobre
+# (fecha DESC, id DESC): la página 1.000 cuesta lo mismo que la primera.
+MOVIMIENTOS_POR_PAGINA = 50
+LIMITE_CONTEO = 10_000
+
+
+def codificar_cursor(mov):
+    token = f"{mov.fecha.isoformat()}|{mov.pk}".encode()
+    return base64.urlsafe_b64encode(token).decode().rstrip('=')
+
+
+def decodificar_cursor(token):
+    """Retorna (fecha, id) o None si el token es inválido (se trata como primera página)."""
+    try:
+        texto = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        fecha, pk = texto.split('|')
+        return date.fromisoformat(fecha), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def pagina_movimientos(queryset, despues=None, antes=None, por_pagina=MOVIMIENTOS_POR_PAGINA):
+    """
+    Una página del historial ordenado por (-fecha, -id).
+    despues: cursor de la última fila mostrada (avanzar). antes: cursor de la primera (retroceder).
+    Retorna (movimientos, cursor_siguiente, cursor_anterior).
+    """
+    despues = decodificar_cursor(despues) if despues else None
+    antes = decodificar_cursor(antes) if antes else None
+
+    if despues:
+        fecha, pk = despues
+        # fecha <= f AND (fecha < f OR id < pk): el primer término acota el rango del índice
+        qs = queryset.filter(Q(fecha__lte=fecha), Q(fecha__lt=fecha) | Q(id__lt=pk)).order_by('-fecha', '-id')
+    elif antes:
+        fecha, pk = antes
+        qs = queryset.filter(Q(fecha__gte=fecha), Q(fecha__gt=fecha) | Q(id__gt=pk)).order_by('fecha', 'id')
+    else:
+        qs = queryset.order_by('-fecha', '-id')
+
+    movimientos = list(qs[:por_pagina + 1])
+    hay_mas = len(movimientos) > por_pagina
+    movimientos = movimientos[:por_pagina]
+    if antes:
+        movimientos.reverse()
+
+    if not movimientos:
+        return [], None, None
+    siguiente = codificar_cursor(movimientos[-1]) if (hay_mas or antes) else None
+    anterior = codificar_cursor(movimientos[0]) if (despues or (antes and hay_mas)) else None
+    return movimientos, siguiente, anterior
+
+
+def total_aproximado(queryset, limite=LIMITE_CONTEO):
+    """
+    Conteo acotado: COUNT(*) sobre un subquery con LIMIT, así nunca recorre más de
+    `limite` filas del índice. Retorna (total, es_aproximado).
+    """
+    total = queryset.order_by()[:limite + 1].count()
+    return min(total, limite), total > limite
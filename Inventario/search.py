@@ -0,0 +1,242 @@
+import re
+
+from django.contrib.postgres.indexes import GinIndex
+from django.core import checks
+from django.db import connection, connections, migrations, transaction
+from django.db.models import BooleanField, Case, FloatField, Func, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+# ==============================================================================
+# BÚSQUEDA DE PRODUCTOS
+# ==============================================================================
+# Un índice de texto por motor de BD (los crea la migración 0006):
+# - PostgreSQL: GIN sobre to_tsvector(codigo || nombre) + índices trigram (pg_trgm)
+#   para que los ILIKE '%texto%' de nombre / proveedor no recorran la tabla. Declarados
+#   también en Meta.indexes (IndicePostgres) para que el estado de migraciones los conozca.
+# - SQLite: tabla FTS5 "espejo" (inventario_producto_fts) mantenida por triggers.
+# Cada palabra se busca como prefijo ("toa" encuentra "Toalla", "P-0" encuentra
+# "P-001") y los resultados salen ordenados por relevancia; un código que empieza
+# exactamente con el texto buscado va siempre primero.
+
+TABLA_FTS = 'inventario_producto_fts'
+# Debe coincidir textualmente con el índice GIN de la migración para que Postgres lo use
+VECTOR_PG = "to_tsvector('simple', coalesce({t}codigo, '') || ' ' || coalesce({t}nombre, ''))"
+RESULTADOS_POR_PAGINA = 20
+
+
+class IndicePostgres(GinIndex):
+    """
+    GinIndex declarado en Meta.indexes (así el estado de migraciones lo conoce) que solo
+    existe en PostgreSQL: en otros motores no emite SQL, tampoco cuando SQLite reconstruye
+    la tabla en un AlterField.
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
+
+    def remove_sql(self, model, schema_editor, **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        return super().remove_sql(model, schema_editor, **kwargs)
+
+
+# --- ÍNDICE FTS5 (SQLITE) ---
+# La tabla y los triggers son SQL crudo que Django no conoce. Un AlterField sobre Producto o
+# Proveedor hace que SQLite reconstruya la tabla: con SQLite >= 3.26 el RENAME falla porque los
+# triggers apuntan a la tabla borrada; con ALTER TABLE legacy pasa y los triggers desaparecen
+# sin error (la búsqueda deja de ver los cambios). Esas migraciones envuelven sus operaciones con
+# operaciones_sin_triggers_fts(); si igual se pierden, `Inventario.W001` lo avisa y
+# `manage.py rebuild_search` vuelve a crear todo. Mismo SQL que la migración 0006.
+FILA_FTS = (
+    "SELECT p.id, p.codigo, p.nombre, pv.nombre FROM \"Inventario_producto\" p "
+    "LEFT JOIN \"Inventario_proveedor\" pv ON pv.id = p.proveedor_id"
+)
+INSERTAR_FILA_FTS = (
+    f"INSERT INTO {TABLA_FTS}(rowid, codigo, nombre, proveedor) "
+    "VALUES (new.id, new.codigo, new.nombre, (SELECT nombre FROM \"Inventario_proveedor\" WHERE id = new.proveedor_id));"
+)
+TRIGGERS_FTS = {
+    f'{TABLA_FTS}_ai': f'AFTER INSERT ON "Inventario_producto" BEGIN {INSERTAR_FILA_FTS} END',
+    # Solo cuando cambian las columnas indexadas: los UPDATE de stock no tocan el índice
+    f'{TABLA_FTS}_au': (
+        f'AFTER UPDATE OF codigo, nombre, proveedor_id ON "Inventario_producto" BEGIN '
+        f'DELETE FROM {TABLA_FTS} WHERE rowid = old.id; {INSERTAR_FILA_FTS} END'
+    ),
+    f'{TABLA_FTS}_ad': f'AFTER DELETE ON "Inventario_producto" BEGIN DELETE FROM {TABLA_FTS} WHERE rowid = old.id; END',
+    f'{TABLA_FTS}_proveedor_au': (
+        f'AFTER UPDATE OF nombre ON "Inventario_proveedor" BEGIN UPDATE {TABLA_FTS} SET proveedor = new.nombre '
+        f'WHERE rowid IN (SELECT id FROM "Inventario_producto" WHERE proveedor_id = new.id); END'
+    ),
+}
+
+
+def triggers_fts_faltantes(using='default'):
+    """Triggers del índice FTS5 que no existen. Vacío si no es SQLite o si la tabla todavía no se creó."""
+    conexion = connections[using]
+    if conexion.vendor != 'sqlite':
+        return []
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            "SELECT type, name FROM sqlite_master WHERE (type = 'table' AND name = %s) OR type = 'trigger'", [TABLA_FTS]
+        )
+        existentes = cursor.fetchall()
+    if ('table', TABLA_FTS) not in existentes:
+        return []
+    return sorted(set(TRIGGERS_FTS) - {nombre for tipo, nombre in existentes if tipo == 'trigger'})
+
+
+def quitar_triggers_fts(using='default'):
+    """Borra los triggers del índice FTS5 (solo SQLite); la tabla queda hasta reconstruir_indice_fts."""
+    conexion = connections[using]
+    if conexion.vendor != 'sqlite':
+        return
+    with conexion.cursor() as cursor:
+        for nombre in TRIGGERS_FTS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+
+
+def reconstruir_indice_fts(using='default'):
+    """Vuelve a crear la tabla FTS5 y sus triggers desde Producto. Retorna las filas indexadas (solo SQLite)."""
+    conexion = connections[using]
+    if conexion.vendor != 'sqlite':
+        return None
+    with transaction.atomic(using=using):
+        quitar_triggers_fts(using)
+        with conexion.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {TABLA_FTS}")
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {TABLA_FTS} USING fts5("
+                "codigo, nombre, proveedor, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            cursor.execute(f"INSERT INTO {TABLA_FTS}(rowid, codigo, nombre, proveedor) {FILA_FTS}")
+            for nombre, cuerpo in TRIGGERS_FTS.items():
+                cursor.execute(f"CREATE TRIGGER {nombre} {cuerpo}")
+            cursor.execute(f"SELECT count(*) FROM {TABLA_FTS}")
+            return cursor.fetchone()[0]
+
+
+def _quitar_triggers(apps, schema_editor):
+    quitar_triggers_fts(schema_editor.connection.alias)
+
+
+def _reconstruir_indice(apps, schema_editor):
+    reconstruir_indice_fts(schema_editor.connection.alias)
+
+
+def operaciones_sin_triggers_fts(*operaciones):
+    """
+    Para migraciones que reconstruyen Producto o Proveedor en SQLite (AlterField, RemoveField...):
+    quita los triggers antes y reconstruye el índice después, en ambos sentidos.
+        operations = operaciones_sin_triggers_fts(migrations.AlterField('producto', 'nombre', ...))
+    """
+    return [
+        migrations.RunPython(_quitar_triggers, _reconstruir_indice),
+        *operaciones,
+        migrations.RunPython(_reconstruir_indice, _quitar_triggers),
+    ]
+
+
+@checks.register(checks.Tags.database)
+def revisar_triggers_fts(app_configs=None, databases=None, **kwargs):
+    """Inventario.W001: la búsqueda de SQLite quedó sin triggers (ej. tras un AlterField de Producto)."""
+    avisos = []
+    for alias in databases or []:
+        faltantes = triggers_fts_faltantes(alias)
+        if faltantes:
+            avisos.append(checks.Warning(
+                f"Faltan los triggers del índice de búsqueda {TABLA_FTS}: {', '.join(faltantes)}.",
+                hint="La búsqueda de productos no verá los cambios. Ejecuta `manage.py rebuild_search`.",
+                id='Inventario.W001',
+            ))
+    return avisos
+
+
+def _terminos(texto):
+    """Palabras del texto (solo caracteres de palabra: nada que el motor pueda interpretar como sintaxis)."""
+    return re.findall(r'\w+', texto.lower())
+
+
+def _buscar_postgres(queryset, texto, terminos):
+    tsquery = ' & '.join(f"{t}:*" for t in terminos)
+    vector = VECTOR_PG.format(t='"Inventario_producto".')
+    coincide = RawSQL(f"{vector} @@ to_tsquery('simple', %s)", [tsquery], output_field=BooleanField())
+    return queryset.filter(
+        Q(coincide) | Q(nombre__icontains=texto) | Q(proveedor__nombre__icontains=texto)
+    ).annotate(
+        rank=RawSQL(f"ts_rank({vector}, to_tsquery('simple', %s))", [tsquery], output_field=FloatField())
+        + Func('nombre', Value(texto), function='similarity', output_field=FloatField()),
+    )
+
+
+def _buscar_sqlite(queryset, terminos):
+    match = ' '.join(f'"{t}"*' for t in terminos)
+    return queryset.filter(
+        pk__in=RawSQL(f"SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s", [match])
+    ).annotate(
+        # bm25 es "menor = mejor": se niega para ordenar igual que ts_rank. Pesos: código, nombre, proveedor
+        rank=RawSQL(
+            f"(SELECT -bm25({TABLA_FTS}, 10.0, 5.0, 1.0) FROM {TABLA_FTS} "
+            f"WHERE {TABLA_FTS} MATCH %s AND {TABLA_FTS}.rowid = \"Inventario_producto\".\"id\")",
+            [match], output_field=FloatField(),
+        ),
+    )
+
+
+def buscar_productos(queryset, texto):
+    """Filtra `queryset` (de Producto) por `texto` y lo ordena por relevancia."""
+    texto = (texto or '').strip()
+    terminos = _terminos(texto)
+    if not terminos:
+        return queryset
+
+    if connection.vendor == 'postgresql':
+        queryset = _buscar_postgres(queryset, texto, terminos)
+    elif connection.vendor == 'sqlite':
+        queryset = _buscar_sqlite(queryset, terminos)
+    else:
+        return queryset.filter(
+            Q(codigo__icontains=texto) | Q(nombre__icontains=texto) | Q(proveedor__nombre__icontains=texto)
+        )
+
+    return queryset.annotate(
+        codigo_exacto=Case(When(codigo__istartswith=texto, then=Value(0)), default=Value(1)),
+    ).order_by('codigo_exacto', '-rank', 'nombre')
+
+
+def _pagina_select2(filas_qs, texto_de, pagina, por_pagina):
+    """Formato Select2 (ajax): {'results': [{'id', 'text'}], 'pagination': {'more': bool}}."""
+    inicio = (max(pagina, 1) - 1) * por_pagina
+    filas = list(filas_qs[inicio:inicio + por_pagina + 1])
+    return {
+        'results': [{'id': fila[0], 'text': texto_de(fila)} for fila in filas[:por_pagina]],
+        'pagination': {'more': len(filas) > por_pagina},
+    }
+
+
+def pagina_autocompletar(queryset, texto, pagina=1, por_pagina=RESULTADOS_POR_PAGINA):
+    """Página de productos para Select2, ordenada por relevancia."""
+    return _pagina_select2(
+        buscar_productos(queryset, texto).values_list('id', 'codigo', 'nombre'),
+        lambda fila: f"{fila[1]} - {fila[2]}", pagina, por_pagina,
+    )
+
+
+def pagina_destinos(queryset, texto, pagina=1, producto_id=None, por_pagina=RESULTADOS_POR_PAGINA):
+    """
+    Página de sitios para Select2. Con `producto_id` solo trae los sitios que tienen
+    stock de ese producto (un JOIN con Inventario) y muestra la cantidad disponible.
+    """
+    texto = (texto or '').strip()
+    if texto:
+        queryset = queryset.filter(Q(nombre__icontains=texto) | Q(tipo__icontains=texto))
+
+    if producto_id:
+        filas = queryset.filter(
+            inventario_sitio__producto_id=producto_id, inventario_sitio__cantidad__gt=0
+        ).values_list('id', 'nombre', 'inventario_sitio__cantidad').order_by('nombre', 'id')
+        return _pagina_select2(filas, lambda fila: f"{fila[1]} (stock: {fila[2]})", pagina, por_pagina)
+
+    filas = queryset.values_list('id', 'nombre', 'tipo').order_by('nombre', 'id')
+    return _pagina_select2(filas, lambda fila: f"{fila[1]} ({fila[2]})" if fila[2] else fila[1], pagina, por_pagina)
@@ -0,0 +1,564 @@
+import time
+from collections import Counter, defaultdict
+from datetime import date
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import AsientoStock, CorteStock, CorteStockLinea, Destino, Inventario, Movimiento, Producto, ResumenDiario
+
+# ==============================================================================
+# VERSIÓN DEL INVENTARIO (INVALIDACIÓN DE CACHÉS)
+# ==============================================================================
+# Las cachés derivadas del stock (KPIs del dashboard, etc.) incluyen esta versión
+# en su clave. Postear un movimiento la incrementa y todas quedan obsoletas de golpe.
+
+CLAVE_VERSION_INVENTARIO = 'inventario:version'
+
+
+def version_inventario():
+    # Si la clave fue desalojada arrancamos desde el reloj: nunca se reusa una versión vieja
+    return cache.get_or_set(CLAVE_VERSION_INVENTARIO, time.time_ns, timeout=None)
+
+
+def invalidar_cache_inventario():
+    try:
+        cache.incr(CLAVE_VERSION_INVENTARIO)
+    except ValueError:
+        cache.set(CLAVE_VERSION_INVENTARIO, time.time_ns(), timeout=None)
+
+
+# ==============================================================================
+# RESUMEN DIARIO (ROLLUP)
+# ==============================================================================
+# Cada movimiento suma su cantidad a la fila (fecha, producto, tipo, origen, destino)
+# en la misma transacción del posteo: el rollup nunca queda adelantado ni atrasado.
+
+def _clave_resumen(fecha, producto_id, tipo, origen_id, destino_id):
+    return {'fecha': fecha, 'producto_id': producto_id, 'tipo': tipo, 'origen_id': origen_id, 'destino_id': destino_id}
+
+
+def acumular_resumen(fecha, producto_id, tipo, origen_id, destino_id, cantidad, movimientos=1):
+    """Suma al rollup del día; UPDATE sobre una sola fila de la clave, o INSERT si no existe."""
+    clave = _clave_resumen(fecha, producto_id, tipo, origen_id, destino_id)
+    # Subquery con LIMIT 1: si la clave quedó repetida, solo se acumula en una de sus filas
+    actualizadas = ResumenDiario.objects.filter(
+        pk=Subquery(ResumenDiario.objects.filter(**clave).order_by('pk').values('pk')[:1])
+    ).update(cantidad=F('cantidad') + cantidad, movimientos=F('movimientos') + movimientos)
+    if not actualizadas:
+        ResumenDiario.objects.create(**clave, cantidad=cantidad, movimientos=movimientos)
+
+
+def acumular_resumenes_en_lote(movimientos):
+    """Versión de acumular_resumen para un lote: una lectura, un bulk_update y un bulk_create."""
+    totales = defaultdict(lambda: [0, 0])
+    for m in movimientos:
+        total = totales[(m.fecha, m.producto_id, m.tipo, m.origen_id, m.destino_id)]
+        total[0] += m.cantidad
+        total[1] += 1
+    if not totales:
+        return
+
+    existentes = {}
+    for r in ResumenDiario.objects.select_for_update().filter(
+        fecha__in={c[0] for c in totales}, producto_id__in={c[1] for c in totales}
+    ).order_by('pk'):
+        existentes.setdefault((r.fecha, r.producto_id, r.tipo, r.origen_id, r.destino_id), r)
+
+    modificados = []
+    nuevos = []
+    for clave, (cantidad, n) in totales.items():
+        resumen = existentes.get(clave)
+        if resumen is None:
+            nuevos.append(ResumenDiario(**_clave_resumen(*clave), cantidad=cantidad, movimientos=n))
+        else:
+            resumen.cantidad += cantidad
+            resumen.movimientos += n
+            modificados.append(resumen)
+    ResumenDiario.objects.bulk_update(modificados, ['cantidad', 'movimientos'], batch_size=500)
+    ResumenDiario.objects.bulk_create(nuevos, batch_size=500)
+
+
+def reconstruir_resumenes(desde=None):
+    """
+    Recalcula el rollup desde Movimiento con un GROUP BY (backfill / reparación).
+    Con `desde` solo se reemplazan los días a partir de esa fecha. Retorna las filas creadas.
+    """
+    movimientos = Movimiento.objects.all()
+    resumenes = ResumenDiario.objects.all()
+    if desde:
+        movimientos = movimientos.filter(fecha__gte=desde)
+        resumenes = resumenes.filter(fecha__gte=desde)
+
+    grupos = (
+        movimientos.values('fecha', 'producto_id', 'tipo', 'origen_id', 'destino_id')
+        .annotate(total=Sum('cantidad'), n=Count('id'))
+        .order_by()
+    )
+    with transaction.atomic():
+        resumenes.delete()
+        creados = ResumenDiario.objects.bulk_create(
+            [ResumenDiario(
+                **_clave_resumen(g['fecha'], g['producto_id'], g['tipo'], g['origen_id'], g['destino_id']),
+                cantidad=g['total'], movimientos=g['n'],
+            ) for g in grupos.iterator()],
+            batch_size=500,
+        )
+        transaction.on_commit(invalidar_cache_inventario)
+    return len(creados)
+
+
+# ==============================================================================
+# CORTES DE STOCK: MOVIMIENTOS CARGADOS CON FECHA PASADA
+# ==============================================================================
+# Un corte es el stock al cierre de su fecha. Si después se carga un movimiento con
+# fecha igual o anterior, se suma a ese corte (y a todos los posteriores) para que la
+# reconstrucción histórica siga cuadrando. Se llama después del INSERT del movimiento:
+# así take_snapshot, que bloquea las inserciones mientras corre, siempre ve uno de los
+# dos lados (el movimiento ya posteado, o el corte ya creado).
+
+def efecto_en_sitios(tipo, cantidad, origen_id, destino_id):
+    """[(ubicacion_id, delta)] que postear_movimiento aplica sobre Inventario."""
+    if tipo in ('IN', 'ADJ_POS'):
+        return [(destino_id, cantidad)] if destino_id else []
+    if tipo in ('OUT', 'REPLACEMENT', 'ADJ_NEG'):
+        return [(origen_id, -cantidad)] if origen_id else []
+    if tipo == 'TRANSFER' and origen_id and destino_id:
+        return [(origen_id, -cantidad), (destino_id, cantidad)]
+    return []
+
+
+def ajustar_cortes(movimientos):
+    """Suma los movimientos recién insertados a los cortes con fecha >= la del movimiento."""
+    fechas = [Movimiento._meta.get_field('fecha').to_python(m.fecha) for m in movimientos]
+    if not fechas:
+        return
+    # Bloqueamos los cortes afectados (siempre en el mismo orden, sin deadlocks): dos
+    # movimientos con fecha pasada posteados a la vez se aplican uno detrás del otro, y
+    # ninguno pisa el total del otro ni crea la misma línea en paralelo.
+    cortes = list(
+        CorteStock.objects.select_for_update().filter(fecha__gte=min(fechas)).order_by('fecha').values_list('id', 'fecha')
+    )
+    if not cortes:  # caso normal: el movimiento es posterior al último corte
+        return
+
+    deltas = defaultdict(int)
+    for m, fecha in zip(movimientos, fechas):
+        for ubicacion_id, delta in efecto_en_sitios(m.tipo, m.cantidad, m.origen_id, m.destino_id):
+            for corte_id, fecha_corte in cortes:
+                if fecha_corte >= fecha:
+                    deltas[(corte_id, m.producto_id, ubicacion_id)] += delta
+    existentes = {}
+    for linea in CorteStockLinea.objects.select_for_update().filter(
+        corte_id__in={c[0] for c in deltas}, producto_id__in={c[1] for c in deltas},
+        ubicacion_id__in={c[2] for c in deltas},
+    ):
+        clave = (linea.corte_id, linea.producto_id, linea.ubicacion_id)
+        if clave in deltas:
+            existentes[clave] = linea
+    nuevas = []
+    for clave, delta in deltas.items():
+        if clave in existentes:
+            existentes[clave].cantidad += delta
+        else:
+            nuevas.append(CorteStockLinea(corte_id=clave[0], producto_id=clave[1], ubicacion_id=clave[2], cantidad=delta))
+    CorteStockLinea.objects.bulk_update(existentes.values(), ['cantidad'], batch_size=500)
+    CorteStockLinea.objects.bulk_create(nuevas, batch_size=500)
+    for corte_id, n in Counter(linea.corte_id for linea in nuevas).items():
+        CorteStock.objects.filter(pk=corte_id).update(lineas_total=F('lineas_total') + n)
+
+
+# ==============================================================================
+# LIBRO DE STOCK (LEDGER)
+# ==============================================================================
+# Cada movimiento deja sus asientos (uno con signo por sitio tocado) en un solo
+# bulk_create, en la misma transacción que su INSERT. El saldo de (producto, sitio)
+# es la suma de sus asientos; Inventario.cantidad es el caché que leen las vistas.
+
+def asentar(movimientos):
+    """Inserta los asientos de movimientos ya guardados (con pk)."""
+    campo_fecha = Movimiento._meta.get_field('fecha')
+    AsientoStock.objects.bulk_create(
+        [
+            AsientoStock(movimiento_id=m.pk, producto_id=m.producto_id, ubicacion_id=ubicacion_id,
+                         cantidad=delta, fecha=campo_fecha.to_python(m.fecha))
+            for m in movimientos
+            for ubicacion_id, delta in efecto_en_sitios(m.tipo, m.cantidad, m.origen_id, m.destino_id)
+        ],
+        batch_size=1000,
+    )
+
+
+def diferencias_libro():
+    """
+    [(producto_id, ubicacion_id, inventario, libro)] donde Inventario no coincide con el
+    saldo del libro: un GROUP BY sobre los asientos y una lectura de Inventario.
+    """
+    libro = {
+        (p, u): saldo
+        for p, u, saldo in AsientoStock.objects.values('producto_id', 'ubicacion_id')
+        .annotate(saldo=Sum('cantidad')).values_list('producto_id', 'ubicacion_id', 'saldo').order_by()
+    }
+    inventario = {(p, u): c for p, u, c in Inventario.objects.values_list('producto_id', 'ubicacion_id', 'cantidad')}
+    return sorted(
+        (p, u, inventario.get((p, u), 0), libro.get((p, u), 0))
+        for p, u in inventario.keys() | libro.keys()
+        if inventario.get((p, u), 0) != libro.get((p, u), 0)
+    )
+
+
+def reparar_inventario(diferencias):
+    """
+    Lleva Inventario al saldo del libro y recalcula stock_total_global de los productos
+    afectados. Los saldos negativos no caben en Inventario: se omiten y se retornan.
+    """
+    negativos = [d for d in diferencias if d[3] < 0]
+    corregibles = [d for d in diferencias if d[3] >= 0]
+    with transaction.atomic():
+        existentes = {
+            (inv.producto_id, inv.ubicacion_id): inv
+            for inv in Inventario.objects.select_for_update().filter(
+                producto_id__in={d[0] for d in corregibles}, ubicacion_id__in={d[1] for d in corregibles},
+            )
+        }
+        modificados = []
+        nuevos = []
+        for producto_id, ubicacion_id, _, saldo in corregibles:
+            inv = existentes.get((producto_id, ubicacion_id))
+            if inv is None:
+                nuevos.append(Inventario(producto_id=producto_id, ubicacion_id=ubicacion_id, cantidad=saldo))
+            else:
+                inv.cantidad = saldo
+                modificados.append(inv)
+        Inventario.objects.bulk_update(modificados, ['cantidad'], batch_size=500)
+        Inventario.objects.bulk_create(nuevos, batch_size=500)
+
+        productos = list(
+            Producto.objects.filter(pk__in={d[0] for d in corregibles})
+            .annotate(stock_real=Coalesce(Sum('inventarios__cantidad'), 0)).only('id')
+        )
+        for p in productos:
+            p.stock_total_global = p.stock_real
+        Producto.objects.bulk_update(productos, ['stock_total_global'], batch_size=500)
+        transaction.on_commit(invalidar_cache_inventario)
+    return negativos
+
+
+# ==============================================================================
+# MOTOR DE POSTEO DE STOCK
+# ==============================================================================
+# Cada movimiento se aplica como UN solo UPDATE condicional por fila afectada.
+# La validación (cantidad >= n) y la escritura ocurren en la misma sentencia,
+# así dos workers concurrentes nunca pueden pisarse ni sobrevender un sitio.
+
+def sumar_stock(producto_id, ubicacion_id, cantidad):
+    """Incrementa el stock de un sitio, creando la fila si todavía no existe."""
+    actualizadas = Inventario.objects.filter(
+        producto_id=producto_id, ubicacion_id=ubicacion_id
+    ).update(cantidad=F('cantidad') + cantidad)
+    if actualizadas:
+        return
+
+    try:
+        # Savepoint: si otro worker crea la fila primero, solo se revierte este INSERT
+        with transaction.atomic():
+            Inventario.objects.create(producto_id=producto_id, ubicacion_id=ubicacion_id, cantidad=cantidad)
+    except IntegrityError:
+        Inventario.objects.filter(
+            producto_id=producto_id, ubicacion_id=ubicacion_id
+        ).update(cantidad=F('cantidad') + cantidad)
+
+
+def restar_stock(producto_id, ubicacion_id, cantidad, msg_insuficiente, msg_inexistente):
+    """
+    Decremento protegido: solo descuenta si hay stock suficiente.
+    Si el UPDATE no afecta filas, se consultan el saldo y el nombre del sitio únicamente
+    para armar el error. Los mensajes pueden usar {sitio}, {disponible} y {cantidad}.
+    """
+    actualizadas = Inventario.objects.filter(
+        producto_id=producto_id, ubicacion_id=ubicacion_id, cantidad__gte=cantidad
+    ).update(cantidad=F('cantidad') - cantidad)
+    if actualizadas:
+        return
+
+    disponible = Inventario.objects.filter(
+        producto_id=producto_id, ubicacion_id=ubicacion_id
+    ).values_list('cantidad', flat=True).first()
+    sitio = Destino.objects.filter(pk=ubicacion_id).values_list('nombre', flat=True).first()
+    if disponible is None:
+        raise ValidationError(msg_inexistente.format(sitio=sitio, cantidad=cantidad))
+    raise ValidationError(msg_insuficiente.format(sitio=sitio, disponible=disponible, cantidad=cantidad))
+
+
+def delta_global(tipo, cantidad, destino_id=None):
+    """Efecto neto de un movimiento sobre stock_total_global (TRANSFER no cambia el total)."""
+    if tipo == 'IN':
+        return cantidad if destino_id else 0
+    if tipo == 'ADJ_POS':
+        return cantidad
+    if tipo in ('OUT', 'REPLACEMENT', 'ADJ_NEG'):
+        return -cantidad
+    return 0
+
+
+def ajustar_stock_global(producto_id, delta):
+    """UPDATE dirigido a una sola columna: no reescribe el producto ni toca updated_at."""
+    if delta:
+        Producto.objects.filter(pk=producto_id).update(stock_total_global=F('stock_total_global') + delta)
+
+
+def ajustar_stock_global_en_lote(deltas):
+    """ajustar_stock_global para muchos productos: un UPDATE con CASE por cada bloque de 250."""
+    ids = [producto_id for producto_id, delta in deltas.items() if delta]
+    for i in range(0, len(ids), 250):
+        bloque = ids[i:i + 250]
+        Producto.objects.filter(pk__in=bloque).update(stock_total_global=F('stock_total_global') + Case(
+            *[When(pk=producto_id, then=Value(deltas[producto_id])) for producto_id in bloque],
+            output_field=IntegerField(),
+        ))
+
+
+def postear_movimiento(mov):
+    """
+    Aplica el efecto de un Movimiento nuevo sobre Inventario.
+    Debe llamarse dentro de una transacción: si una parte falla (ej. el destino
+    de una transferencia), el decremento del origen también se revierte.
+    """
+    producto_id = mov.producto_id
+    # Solo ids: el nombre del sitio se consulta en restar_stock y únicamente si el posteo falla
+
+    # === CASO 1: ENTRADAS (IN) ===
+    if mov.tipo == 'IN':
+        if mov.destino_id:
+            sumar_stock(producto_id, mov.destino_id, mov.cantidad)
+
+    # === CASO 2: SALIDAS (OUT) O REEMPLAZOS (REPLACEMENT) ===
+    elif mov.tipo in ('OUT', 'REPLACEMENT'):
+        if not mov.origen_id:
+            raise ValidationError("Debes seleccionar el Origen (From) para salidas o reemplazos.")
+        restar_stock(
+            producto_id, mov.origen_id, mov.cantidad,
+            "Stock insuficiente en {sitio}. Disponibles: {disponible}",
+            "No hay stock de este producto en {sitio}.",
+        )
+
+    # === CASO 3: AJUSTE POSITIVO (+) ===
+    elif mov.tipo == 'ADJ_POS':
+        if not mov.destino_id:
+            raise ValidationError("Para Ajuste Positivo, selecciona el Destino.")
+        sumar_stock(producto_id, mov.destino_id, mov.cantidad)
+
+    # === CASO 4: AJUSTE NEGATIVO (-) ===
+    elif mov.tipo == 'ADJ_NEG':
+        if not mov.origen_id:
+            raise ValidationError("Para Ajuste Negativo, selecciona el Origen.")
+        restar_stock(
+            producto_id, mov.origen_id, mov.cantidad,
+            "No puedes restar {cantidad}. Solo hay {disponible}.",
+            "No existe inventario en {sitio}.",
+        )
+
+    # === CASO 5: TRANSFERENCIAS ===
+    elif mov.tipo == 'TRANSFER':
+        if mov.origen_id and mov.destino_id:
+            restar_stock(
+                producto_id, mov.origen_id, mov.cantidad,
+                "Stock insuficiente en origen ({sitio}).",
+                "No hay inventario en {sitio}.",
+            )
+            sumar_stock(producto_id, mov.destino_id, mov.cantidad)
+
+    # Stock Global: se ajusta por el delta neto, sin releer todos los sitios del producto
+    ajustar_stock_global(producto_id, delta_global(mov.tipo, mov.cantidad, mov.destino_id))
+
+    # fecha puede venir como datetime (default=timezone.now): se normaliza igual que al guardar
+    fecha = mov._meta.get_field('fecha').to_python(mov.fecha)
+    acumular_resumen(fecha, producto_id, mov.tipo, mov.origen_id, mov.destino_id, mov.cantidad)
+
+    # Solo tras el COMMIT: invalidar antes permitiría re-cachear el estado anterior
+    transaction.on_commit(invalidar_cache_inventario)
+
+
+# ==============================================================================
+# CARGA MASIVA DE MOVIMIENTOS
+# ==============================================================================
+# Un lote completo se valida en memoria contra el stock actual y se escribe con
+# bulk_update / bulk_create: el número de consultas no depende del tamaño del lote.
+
+TIPOS_VALIDOS = {tipo for tipo, _ in Movimiento.TIPO_MOVIMIENTO}
+TIPOS_CON_ORIGEN = ('OUT', 'REPLACEMENT', 'ADJ_NEG', 'TRANSFER')
+TIPOS_CON_DESTINO = ('IN', 'ADJ_POS', 'TRANSFER')
+
+
+def resolver_filas(filas_crudas):
+    """
+    Traduce filas "humanas" (código de producto, nombre o id de sitio) a ids.
+    Todo el lote se resuelve con una consulta a Producto y otra a Destino.
+    Retorna (filas, errores); cada fila conserva su número original en 'fila'.
+    """
+    def texto(valor):
+        return str(valor).strip() if valor is not None else ''
+
+    codigos = {texto(f.get('producto')) for f in filas_crudas}
+    productos = dict(Producto.objects.filter(codigo__in=codigos).values_list('codigo', 'id'))
+
+    claves_sitio = {texto(f.get(campo)) for f in filas_crudas for campo in ('origen', 'destino')} - {''}
+    ids_sitio = {int(c) for c in claves_sitio if c.isdigit()}
+    sitios_por_id = {}
+    sitios_por_nombre = {}
+    ambiguos = set()
+    for pk, nombre in Destino.objects.filter(Q(pk__in=ids_sitio) | Q(nombre__in=claves_sitio)).values_list('id', 'nombre'):
+        sitios_por_id[pk] = pk
+        if nombre in sitios_por_nombre:
+            ambiguos.add(nombre)
+        sitios_por_nombre[nombre] = pk
+
+    def sitio(valor, campo):
+        clave = texto(valor)
+        if not clave:
+            return None
+        if clave in ambiguos:
+            raise ValidationError(f"Hay varios sitios llamados '{clave}' ({campo}). Usa su id.")
+        if clave in sitios_por_nombre:
+            return sitios_por_nombre[clave]
+        if clave.isdigit() and int(clave) in sitios_por_id:
+            return int(clave)
+        raise ValidationError(f"Sitio '{clave}' no existe ({campo}).")
+
+    filas = []
+    errores = []
+    for numero, cruda in enumerate(filas_crudas, start=1):
+        try:
+            codigo = texto(cruda.get('producto'))
+            if codigo not in productos:
+                raise ValidationError(f"Producto '{codigo}' no existe.")
+            try:
+                cantidad = int(texto(cruda.get('cantidad')))
+            except ValueError:
+                raise ValidationError("La cantidad debe ser un número entero.")
+            fecha = texto(cruda.get('fecha'))
+            try:
+                fecha = date.fromisoformat(fecha) if fecha else timezone.now().date()
+            except ValueError:
+                raise ValidationError(f"Fecha inválida '{fecha}' (usa AAAA-MM-DD).")
+
+            filas.append({
+                'fila': numero,
+                'producto_id': productos[codigo],
+                'tipo': texto(cruda.get('tipo')).upper(),
+                'cantidad': cantidad,
+                'fecha': fecha,
+                'origen_id': sitio(cruda.get('origen'), 'origen'),
+                'destino_id': sitio(cruda.get('destino'), 'destino'),
+                'razon_ajuste': texto(cruda.get('razon_ajuste')) or None,
+            })
+        except ValidationError as e:
+            errores.append({'fila': numero, 'error': e.messages[0]})
+    return filas, errores
+
+
+def validar_fila(fila):
+    """Mismas reglas que MovimientoForm.clean, aplicadas a una fila ya resuelta."""
+    tipo = fila['tipo']
+    if tipo not in TIPOS_VALIDOS:
+        raise ValidationError(f"Tipo de movimiento '{tipo}' no válido.")
+    if fila['cantidad'] <= 0:
+        raise ValidationError("La cantidad debe ser mayor que cero.")
+    if tipo in TIPOS_CON_ORIGEN and not fila.get('origen_id'):
+        raise ValidationError("Este tipo de movimiento requiere Origen.")
+    if tipo in TIPOS_CON_DESTINO and not fila.get('destino_id'):
+        raise ValidationError("Este tipo de movimiento requiere Destino.")
+    if tipo == 'TRANSFER' and fila['origen_id'] == fila['destino_id']:
+        raise ValidationError("El origen y el destino no pueden ser el mismo sitio.")
+
+
+def registrar_movimientos_en_lote(filas, usuario=None):
+    """
+    Registra un lote de movimientos en una sola transacción.
+    Las filas inválidas (o sin stock suficiente) se reportan y se omiten;
+    las demás se aplican en orden, así una entrada puede cubrir una salida posterior.
+    Retorna {'creados': n, 'errores': [{'fila': i, 'error': msg}, ...]}.
+    """
+    errores = []
+    validas = []
+    for numero, fila in enumerate(filas, start=1):
+        fila.setdefault('fila', numero)
+        try:
+            validar_fila(fila)
+            validas.append(fila)
+        except ValidationError as e:
+            errores.append({'fila': fila['fila'], 'error': e.messages[0]})
+
+    with transaction.atomic():
+        # Bloqueamos las filas de stock involucradas (Postgres) para que nadie las
+        # modifique entre la validación en memoria y el bulk_update.
+        def bloquear_stock():
+            return {
+                (inv.producto_id, inv.ubicacion_id): inv
+                for inv in Inventario.objects.select_for_update().filter(
+                    producto_id__in={f['producto_id'] for f in validas},
+                    ubicacion_id__in={f[c] for f in validas for c in ('origen_id', 'destino_id')} - {None},
+                )
+            }
+
+        existentes = bloquear_stock()
+        faltantes = {(f['producto_id'], f['destino_id']) for f in validas if f['tipo'] in TIPOS_CON_DESTINO} - existentes.keys()
+        if faltantes:
+            # Las filas nuevas se crean en cero antes de aplicar el lote. Con ignore_conflicts,
+            # si otro lote crea la misma fila al mismo tiempo no se aborta todo: se relee y se
+            # bloquea la fila que haya quedado (propia o ajena) y el loop trabaja sobre su saldo real.
+            Inventario.objects.bulk_create(
+                (Inventario(producto_id=p, ubicacion_id=u, cantidad=0) for p, u in faltantes),
+                batch_size=500, ignore_conflicts=True,
+            )
+            existentes = bloquear_stock()
+        modificados = set()
+        deltas_producto = defaultdict(int)
+        movimientos = []
+
+        for fila in validas:
+            producto_id, tipo, cantidad = fila['producto_id'], fila['tipo'], fila['cantidad']
+
+            if tipo in TIPOS_CON_ORIGEN:
+                clave = (producto_id, fila['origen_id'])
+                inv_origen = existentes.get(clave)
+                if inv_origen is None:
+                    errores.append({'fila': fila['fila'], 'error': "No hay stock de este producto en el origen."})
+                    continue
+                if inv_origen.cantidad < cantidad:
+                    errores.append({'fila': fila['fila'], 'error': f"Stock insuficiente en origen. Disponibles: {inv_origen.cantidad}"})
+                    continue
+                inv_origen.cantidad -= cantidad
+                modificados.add(clave)
+
+            if tipo in TIPOS_CON_DESTINO:
+                clave = (producto_id, fila['destino_id'])
+                existentes[clave].cantidad += cantidad
+                modificados.add(clave)
+
+            deltas_producto[producto_id] += delta_global(tipo, cantidad, fila['destino_id'])
+
+            movimientos.append(Movimiento(
+                producto_id=producto_id, tipo=tipo, cantidad=cantidad, fecha=fila['fecha'],
+                origen_id=fila['origen_id'], destino_id=fila['destino_id'],
+                razon_ajuste=fila.get('razon_ajuste'), usuario=usuario,
+            ))
+
+        Inventario.objects.bulk_update([existentes[clave] for clave in modificados], ['cantidad'], batch_size=500)
+        ajustar_stock_global_en_lote(deltas_producto)
+        # Todas las referencias del lote en una sola consulta a la serie
+        for movimiento, referencia in zip(movimientos, Movimiento.generar_referencias([m.tipo for m in movimientos])):
+            movimiento.referencia = referencia
+        Movimiento.objects.bulk_create(movimientos, batch_size=500)
+        acumular_resumenes_en_lote(movimientos)
+        asentar(movimientos)
+        ajustar_cortes(movimientos)
+        if movimientos:
+            transaction.on_commit(invalidar_cache_inventario)
+
+    errores.sort(key=lambda e: e['fila'])
+    return {'creados': len(movimientos), 'errores': errores}
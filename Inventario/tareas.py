@@ -0,0 +1,157 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Tarea
+from .utils import create_google_calendar_event
+
+# ==============================================================================
+# COLA DE TAREAS EN SEGUNDO PLANO
+# ==============================================================================
+# Las llamadas externas lentas (Google Calendar, reportes de Elite AI) no se hacen
+# dentro del request: la vista guarda una Tarea y responde al instante con su id,
+# y `manage.py run_worker` la ejecuta. La UI consulta el estado en /api/tareas/<id>/.
+# - Tomar una tarea es un UPDATE condicionado (compare-and-set): dos workers nunca
+#   ejecutan la misma, sin depender de SELECT ... FOR UPDATE SKIP LOCKED.
+# - Si falla, vuelve a PENDING con backoff exponencial hasta max_intentos.
+# - Mientras corre, disponible_en es el lease: si el worker muere, otro la retoma al vencer.
+
+TIPOS = {}
+
+
+class ErrorPermanente(Exception):
+    """Error que no se arregla reintentando (payload inválido, tipo desconocido)."""
+
+
+def tarea(tipo):
+    """Registra la función que ejecuta las tareas de `tipo`; recibe la Tarea y retorna un dict (resultado)."""
+    def registrar(funcion):
+        TIPOS[tipo] = funcion
+        return funcion
+    return registrar
+
+
+def encolar(tipo, payload=None, usuario=None, max_intentos=5):
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de tarea desconocido: {tipo}")
+    return Tarea.objects.create(tipo=tipo, payload=payload or {}, usuario=usuario, max_intentos=max_intentos)
+
+
+def espera_reintento(intentos):
+    """Segundos hasta el siguiente intento: BASE, 2xBASE, 4xBASE... con tope en BACKOFF_MAX."""
+    return min(settings.TAREAS_BACKOFF_BASE * 2 ** max(intentos - 1, 0), settings.TAREAS_BACKOFF_MAX)
+
+
+def tomar_siguiente():
+    """Marca como RUNNING la siguiente tarea lista y la retorna (None si la cola está vacía)."""
+    for _ in range(5):  # si otro worker gana la carrera por la misma fila, se prueba la siguiente
+        ahora = timezone.now()
+        candidata = (
+            Tarea.objects.filter(estado__in=['PENDING', 'RUNNING'], disponible_en__lte=ahora)
+            .order_by('disponible_en', 'id')
+            .values_list('pk', flat=True)
+            .first()
+        )
+        if candidata is None:
+            return None
+        tomada = Tarea.objects.filter(
+            pk=candidata, estado__in=['PENDING', 'RUNNING'], disponible_en__lte=ahora
+        ).update(
+            estado='RUNNING',
+            intentos=F('intentos') + 1,
+            disponible_en=ahora + timedelta(seconds=settings.TAREAS_LEASE),
+            actualizada=ahora,
+        )
+        if tomada:
+            return Tarea.objects.select_related('usuario').get(pk=candidata)
+    return None
+
+
+def _terminar(tarea_obj, estado, **campos):
+    for campo, valor in campos.items():
+        setattr(tarea_obj, campo, valor)
+    tarea_obj.estado = estado
+    tarea_obj.save(update_fields=['estado', 'actualizada', *campos])
+
+
+def ejecutar(tarea_obj):
+    """Ejecuta una tarea ya tomada y guarda su resultado, el reintento o el fallo definitivo."""
+    try:
+        if tarea_obj.intentos > tarea_obj.max_intentos:
+            raise ErrorPermanente("Sin intentos restantes (el worker que la ejecutaba no terminó).")
+        funcion = TIPOS.get(tarea_obj.tipo)
+        if funcion is None:
+            raise ErrorPermanente(f"Tipo de tarea desconocido: {tarea_obj.tipo}")
+        resultado = funcion(tarea_obj)
+    except Exception as e:
+        if isinstance(e, ErrorPermanente) or tarea_obj.intentos >= tarea_obj.max_intentos:
+            _terminar(tarea_obj, 'FAILED', error=str(e))
+        else:
+            espera = timedelta(seconds=espera_reintento(tarea_obj.intentos))
+            _terminar(tarea_obj, 'PENDING', error=str(e), disponible_en=timezone.now() + espera)
+    else:
+        _terminar(tarea_obj, 'DONE', resultado=resultado, error='')
+    return tarea_obj
+
+
+def procesar(limite=None):
+    """Ejecuta tareas disponibles hasta vaciar la cola (o `limite`). Retorna cuántas ejecutó."""
+    ejecutadas = 0
+    while limite is None or ejecutadas < limite:
+        tarea_obj = tomar_siguiente()
+        if tarea_obj is None:
+            break
+        ejecutar(tarea_obj)
+        ejecutadas += 1
+    return ejecutadas
+
+
+def trabajar(intervalo=2.0, limite=None):
+    """Bucle del worker: procesa la cola y duerme `intervalo` segundos cuando está vacía."""
+    ejecutadas = 0
+    while limite is None or ejecutadas < limite:
+        close_old_connections()  # un worker vive días: descarta conexiones caídas o vencidas (CONN_MAX_AGE)
+        hechas = procesar(None if limite is None else limite - ejecutadas)
+        ejecutadas += hechas
+        if not hechas:
+            time.sleep(intervalo)
+    return ejecutadas
+
+
+def como_dict(tarea_obj):
+    """Estado de la tarea para la API de consulta (polling)."""
+    return {
+        'id': tarea_obj.pk,
+        'tipo': tarea_obj.tipo,
+        'estado': tarea_obj.estado,
+        'intentos': tarea_obj.intentos,
+        'resultado': tarea_obj.resultado,
+        'error': tarea_obj.error,
+    }
+
+
+# --- TIPOS DE TAREA ---
+
+@tarea('calendar_event')
+def evento_calendario(tarea_obj):
+    link = create_google_calendar_event(
+        tarea_obj.payload['summary'], tarea_obj.payload.get('description', ''), interactivo=False
+    )
+    if not link:
+        raise RuntimeError("No se pudo crear el evento en Google Calendar (ver logs del worker).")
+    return {'link': link}
+
+
+@tarea('ai_report')
+def reporte_ia(tarea_obj):
+    from .ai_service import EliteIntelligenceService  # carga el SDK de OpenAI solo en el worker
+
+    pregunta = tarea_obj.payload.get('pregunta', '').strip()
+    if not pregunta or tarea_obj.usuario is None:
+        raise ErrorPermanente("El reporte necesita una pregunta y un usuario.")
+    servicio = EliteIntelligenceService(tarea_obj.usuario)
+    return {'respuesta': servicio.complete(servicio.build_context(pregunta, []), pregunta)}
@@ -1,3 +1,1794 @@
-from django.test import TestCase
+import asyncio
+import csv
+import email
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+from urllib.parse import quote
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, migrations, models
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import Count, F, RestrictedError, Sum
+from django.test import AsyncClient, Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from Elite_brand.database import base_de_datos
+
+from . import google_calendar
+from .ai_cache import CacheRespuestas, normalizar_pregunta, respuestas_ia
+from .ai_service import EliteIntelligenceService
+from .benchmark import (
+    PREFIJO, comparar, limpiar, medir_endpoints, medir_exportacion, medir_financiero, revisar_planes, sembrar,
+)
+from .cortes import corte_mas_cercano, stock_en, stock_por_reproduccion, tomar_corte, valoracion_en
+from .google_calendar import calendario
+from .management.commands import reconcile_stock
+from .models import AsientoStock, CorteStock, Destino, Inventario, ItemLista, ListaCompra, Movimiento, Producto, Proveedor, ResumenDiario, Tarea
+from .referencias import reservar
+from .reports import costos_por_unidad, gasto_total, total_aproximado
+from .search import TABLA_FTS, buscar_productos, operaciones_sin_triggers_fts, revisar_triggers_fts
+from .services import diferencias_libro, invalidar_cache_inventario, registrar_movimientos_en_lote, resolver_filas
+from .tareas import encolar, procesar, tomar_siguiente
+from .utils import create_google_calendar_event
+
+
+def crear_catalogo_basico():
+    bodega = Destino.objects.create(nombre="Bodega Central", direccion="Calle 1", tipo="Bodega")
+    apto = Destino.objects.create(nombre="Apto 101", direccion="Calle 2", tipo="Apto")
+    producto = Producto.objects.create(
+        codigo="P-001", nombre="Toalla", categoria="Bathroom",
+        precio_costo=5, precio_venta=10,
+    )
+    return bodega, apto, producto
+
+
+class PosteoStockTests(TestCase):
+    def setUp(self):
+        self.bodega, self.apto, self.producto = crear_catalogo_basico()
+
+    def stock(self, sitio):
+        return Inventario.objects.get(producto=self.producto, ubicacion=sitio).cantidad
+
+    def test_entrada_crea_y_suma_inventario(self):
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=10, destino=self.bodega)
+        Movimiento.objects.create(producto=self.producto, tipo='ADJ_POS', cantidad=3, destino=self.bodega)
+        self.assertEqual(self.stock(self.bodega), 13)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_total_global, 13)
+
+    def test_salidas_y_transferencia(self):
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=10, destino=self.bodega)
+        Movimiento.objects.create(producto=self.producto, tipo='TRANSFER', cantidad=4, origen=self.bodega, destino=self.apto)
+        Movimiento.objects.create(producto=self.producto, tipo='OUT', cantidad=1, origen=self.apto)
+        Movimiento.objects.create(producto=self.producto, tipo='REPLACEMENT', cantidad=1, origen=self.apto)
+        Movimiento.objects.create(producto=self.producto, tipo='ADJ_NEG', cantidad=2, origen=self.bodega)
+        self.assertEqual(self.stock(self.bodega), 4)
+        self.assertEqual(self.stock(self.apto), 2)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_total_global, 6)
+
+    def test_salida_sin_stock_suficiente_no_registra_nada(self):
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=2, destino=self.bodega)
+        with self.assertRaisesMessage(ValidationError, "Disponibles: 2"):
+            Movimiento.objects.create(producto=self.producto, tipo='OUT', cantidad=3, origen=self.bodega)
+        with self.assertRaises(ValidationError):
+            Movimiento.objects.create(producto=self.producto, tipo='OUT', cantidad=1, origen=self.apto)
+        self.assertEqual(self.stock(self.bodega), 2)
+        self.assertEqual(Movimiento.objects.count(), 1)
+
+    def test_posteo_por_id_no_consulta_sitios(self):
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=5, destino_id=self.bodega.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            Movimiento.objects.create(producto=self.producto, tipo='TRANSFER', cantidad=2, origen_id=self.bodega.pk, destino_id=self.apto.pk)
+        self.assertFalse(any('FROM "Inventario_destino"' in q['sql'] for q in ctx.captured_queries))
+
+        # El nombre del sitio se consulta solo para armar el error
+        with self.assertRaisesMessage(ValidationError, "Stock insuficiente en Bodega Central. Disponibles: 3"):
+            Movimiento.objects.create(producto=self.producto, tipo='OUT', cantidad=4, origen_id=self.bodega.pk)
+        with self.assertRaisesMessage(ValidationError, "No puedes restar 9. Solo hay 3."):
+            Movimiento.objects.create(producto=self.producto, tipo='ADJ_NEG', cantidad=9, origen_id=self.bodega.pk)
+
+    def test_transferencia_fallida_revierte_el_origen(self):
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=5, destino=self.bodega)
+        with self.assertRaises(ValidationError):
+            Movimiento.objects.create(producto=self.producto, tipo='TRANSFER', cantidad=6, origen=self.bodega, destino=self.apto)
+        self.assertEqual(self.stock(self.bodega), 5)
+        self.assertFalse(Inventario.objects.filter(ubicacion=self.apto).exists())
+
+    def test_stock_global_por_delta_no_toca_updated_at(self):
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=10, destino=self.bodega)
+        self.producto.refresh_from_db()
+        updated_at = self.producto.updated_at
+
+        with CaptureQueriesContext(connection) as ctx:
+            Movimiento.objects.create(producto=self.producto, tipo='TRANSFER', cantidad=3, origen=self.bodega, destino=self.apto)
+        # Una transferencia no cambia el total: no se consulta ni se escribe Producto
+        self.assertFalse(any('"Inventario_producto"' in q['sql'] for q in ctx.captured_queries))
+
+        Movimiento.objects.create(producto=self.producto, tipo='OUT', cantidad=2, origen=self.apto)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_total_global, 8)
+        self.assertEqual(self.producto.updated_at, updated_at)
+
+
+class ReconcileStockTests(TestCase):
+    def test_reporta_y_corrige_diferencias(self):
+        bodega, _, producto = crear_catalogo_basico()
+        Movimiento.objects.create(producto=producto, tipo='IN', cantidad=7, destino=bodega)
+        Producto.objects.filter(pk=producto.pk).update(stock_total_global=2)
+
+        salida = StringIO()
+        call_command('reconcile_stock', stdout=salida)
+        self.assertIn("registrado=2 real=7", salida.getvalue())
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock_total_global, 2)
+
+        call_command('reconcile_stock', '--fix', stdout=StringIO())
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock_total_global, 7)
+
+        salida = StringIO()
+        call_command('reconcile_stock', stdout=salida)
+        self.assertIn("Sin diferencias", salida.getvalue())
+
+    def test_fix_no_pisa_un_movimiento_posteado_despues_de_la_lectura(self):
+        bodega, _, producto = crear_catalogo_basico()
+        Movimiento.objects.create(producto=producto, tipo='IN', cantidad=7, destino=bodega)
+        Producto.objects.filter(pk=producto.pk).update(stock_total_global=2)
+        leer = reconcile_stock._desfasados
+
+        def leer_y_postear(productos):
+            filas = list(leer(productos))
+            if not Movimiento.objects.filter(cantidad=3).exists():
+                # Otro worker postea entre el reporte y la corrección
+                Movimiento.objects.create(producto=producto, tipo='IN', cantidad=3, destino=bodega)
+            return filas
+
+        with mock.patch.object(reconcile_stock, '_desfasados', side_effect=leer_y_postear):
+            call_command('reconcile_stock', '--fix', stdout=StringIO())
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock_total_global, 10)
+
+
+class ResumenDiarioTests(TestCase):
+    def setUp(self):
+        self.bodega, self.apto, self.producto = crear_catalogo_basico()
+
+    def _rollup(self):
+        return {
+            (r['fecha'], r['producto_id'], r['tipo'], r['origen_id'], r['destino_id']): (r['c'], r['n'])
+            for r in ResumenDiario.objects.values('fecha', 'producto_id', 'tipo', 'origen_id', 'destino_id')
+            .annotate(c=Sum('cantidad'), n=Sum('movimientos')).order_by()
+        }
+
+    def _desde_movimientos(self):
+        return {
+            (r['fecha'], r['producto_id'], r['tipo'], r['origen_id'], r['destino_id']): (r['c'], r['n'])
+            for r in Movimiento.objects.values('fecha', 'producto_id', 'tipo', 'origen_id', 'destino_id')
+            .annotate(c=Sum('cantidad'), n=Count('id')).order_by()
+        }
+
+    def test_posteo_acumula_en_una_fila_por_clave(self):
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=4, destino=self.bodega)
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=6, destino=self.bodega)
+        with self.assertRaises(ValidationError):
+            Movimiento.objects.create(producto=self.producto, tipo='OUT', cantidad=99, origen=self.bodega, destino=self.apto)
+
+        resumen = ResumenDiario.objects.get()
+        self.assertEqual((resumen.tipo, resumen.cantidad, resumen.movimientos), ('IN', 10, 2))
+        self.assertEqual(resumen.fecha, Movimiento.objects.first().fecha)
+
+    def test_carga_masiva_y_posteo_individual_coinciden_con_movimientos(self):
+        hoy = date.today()
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=20, destino=self.bodega)
+        registrar_movimientos_en_lote([
+            {'producto_id': self.producto.id, 'tipo': 'OUT', 'cantidad': 2, 'fecha': hoy, 'origen_id': self.bodega.id, 'destino_id': self.apto.id},
+            {'producto_id': self.producto.id, 'tipo': 'OUT', 'cantidad': 3, 'fecha': hoy, 'origen_id': self.bodega.id, 'destino_id': self.apto.id},
+            {'producto_id': self.producto.id, 'tipo': 'IN', 'cantidad': 1, 'fecha': hoy - timedelta(days=40), 'origen_id': None, 'destino_id': self.bodega.id},
+        ])
+        Movimiento.objects.create(producto=self.producto, tipo='OUT', cantidad=1, origen=self.bodega, destino=self.apto)
+
+        self.assertEqual(self._rollup(), self._desde_movimientos())
+        self.assertEqual(ResumenDiario.objects.filter(tipo='OUT').count(), 1)
+
+    def test_rebuild_rollups_repara_el_resumen(self):
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=5, destino=self.bodega)
+        Movimiento.objects.create(producto=self.producto, tipo='TRANSFER', cantidad=2, origen=self.bodega, destino=self.apto)
+        esperado = self._desde_movimientos()
+        ResumenDiario.objects.update(cantidad=0)
+        ResumenDiario.objects.create(fecha=date.today(), producto=self.producto, tipo='IN', destino=self.bodega, cantidad=9)
+
+        salida = StringIO()
+        call_command('rebuild_rollups', stdout=salida)
+        self.assertIn("2 filas de resumen reconstruidas", salida.getvalue())
+        self.assertEqual(self._rollup(), esperado)
+
+    def test_reportes_no_recorren_movimientos(self):
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=5, destino=self.bodega)
+        Movimiento.objects.create(producto=self.producto, tipo='OUT', cantidad=2, origen=self.bodega, destino=self.apto)
+        tabla_movimientos = Movimiento._meta.db_table
+
+        with CaptureQueriesContext(connection) as consultas:
+            unidades = costos_por_unidad()
+            gasto = gasto_total(desde=date.today() - timedelta(days=30))
+
+        self.assertEqual(unidades, [{'nombre': 'Apto 101', 'tipo': 'Apto', 'costo_total': Decimal('20.00')}])
+        self.assertEqual(gasto, Decimal('20.00'))
+        self.assertFalse([q for q in consultas.captured_queries if f'"{tabla_movimientos}"' in q['sql']])
+
+
+class PosteoConcurrenteTests(TransactionTestCase):
+    """Dispara cientos de movimientos en paralelo sobre el mismo producto/sitio."""
+
+    HILOS = 8
+    MOVIMIENTOS = 200
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("SQLite en memoria no admite escrituras concurrentes entre hilos.")
+        self.bodega, self.apto, self.producto = crear_catalogo_basico()
+
+    def _en_paralelo(self, funcion, argumentos):
+        def tarea(arg):
+            try:
+                return funcion(arg)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.HILOS) as pool:
+            return list(pool.map(tarea, argumentos))
+
+    def test_entradas_y_salidas_concurrentes_son_exactas(self):
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=self.MOVIMIENTOS, destino=self.bodega)
+
+        def mover(i):
+            tipo = 'IN' if i % 2 == 0 else 'TRANSFER'
+            Movimiento.objects.create(
+                producto_id=self.producto.id, tipo=tipo, cantidad=1,
+                origen=self.bodega if tipo == 'TRANSFER' else None,
+                destino=self.bodega if tipo == 'IN' else self.apto,
+            )
+
+        self._en_paralelo(mover, range(self.MOVIMIENTOS))
+
+        mitad = self.MOVIMIENTOS // 2
+        self.assertEqual(Inventario.objects.get(producto=self.producto, ubicacion=self.bodega).cantidad, self.MOVIMIENTOS)
+        self.assertEqual(Inventario.objects.get(producto=self.producto, ubicacion=self.apto).cantidad, mitad)
+        self.assertEqual(Movimiento.objects.count(), self.MOVIMIENTOS + 1)
+
+    def test_salidas_concurrentes_no_sobrevenden(self):
+        disponible = self.MOVIMIENTOS // 4
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=disponible, destino=self.bodega)
+
+        def sacar(_):
+            try:
+                Movimiento.objects.create(producto_id=self.producto.id, tipo='OUT', cantidad=1, origen=self.bodega)
+                return True
+            except ValidationError:
+                return False
+
+        resultados = self._en_paralelo(sacar, range(self.MOVIMIENTOS))
+
+        self.assertEqual(sum(resultados), disponible)
+        self.assertEqual(Inventario.objects.get(producto=self.producto, ubicacion=self.bodega).cantidad, 0)
+        self.assertEqual(Movimiento.objects.filter(tipo='OUT').count(), disponible)
+
+
+class CargaMasivaTests(TestCase):
+    def setUp(self):
+        self.bodega, self.apto, self.producto = crear_catalogo_basico()
+
+    def test_lote_reporta_errores_sin_abortar_filas_buenas(self):
+        filas, errores = resolver_filas([
+            {'producto': 'P-001', 'tipo': 'IN', 'cantidad': '10', 'destino': 'Bodega Central'},
+            {'producto': 'NO-EXISTE', 'tipo': 'IN', 'cantidad': '1', 'destino': 'Bodega Central'},
+            {'producto': 'P-001', 'tipo': 'TRANSFER', 'cantidad': '4', 'origen': 'Bodega Central', 'destino': str(self.apto.id)},
+            {'producto': 'P-001', 'tipo': 'OUT', 'cantidad': '5', 'origen': 'Apto 101'},
+            {'producto': 'P-001', 'tipo': 'OUT', 'cantidad': '1', 'origen': 'Apto 101', 'fecha': '2025-01-31'},
+        ])
+        resultado = registrar_movimientos_en_lote(filas)
+
+        self.assertEqual(resultado['creados'], 3)
+        self.assertEqual([e['fila'] for e in errores], [2])
+        self.assertEqual([e['fila'] for e in resultado['errores']], [4])
+        self.assertEqual(Inventario.objects.get(producto=self.producto, ubicacion=self.bodega).cantidad, 6)
+        self.assertEqual(Inventario.objects.get(producto=self.producto, ubicacion=self.apto).cantidad, 3)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_total_global, 9)
+        self.assertEqual(Movimiento.objects.filter(fecha='2025-01-31').count(), 1)
+
+    def test_lote_tolera_fila_de_stock_creada_en_paralelo(self):
+        """Otro lote crea la misma fila (producto, sitio) entre la lectura y el INSERT: se suma sobre ella."""
+        bulk_create = Inventario.objects.bulk_create
+
+        def crear_antes(objs, **kwargs):
+            Inventario.objects.create(producto=self.producto, ubicacion=self.apto, cantidad=5)
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(Inventario.objects, 'bulk_create', side_effect=crear_antes):
+            resultado = registrar_movimientos_en_lote([
+                {'producto_id': self.producto.id, 'tipo': 'IN', 'cantidad': 3, 'fecha': date(2025, 6, 1), 'destino_id': self.apto.id, 'origen_id': None},
+            ])
+
+        self.assertEqual((resultado['creados'], resultado['errores']), (1, []))
+        self.assertEqual(Inventario.objects.get(producto=self.producto, ubicacion=self.apto).cantidad, 8)
+
+    def test_endpoint_lote(self):
+        usuario = User.objects.create_user('staff', password='x')
+        self.client.force_login(usuario)
+        response = self.client.post(
+            reverse('movimientos_lote'),
+            data={'movimientos': [
+                {'producto': 'P-001', 'tipo': 'IN', 'cantidad': 2, 'destino': 'Bodega Central'},
+                {'producto': 'P-001', 'tipo': 'ADJ_NEG', 'cantidad': 1},
+            ]},
+            content_type='application/json',
+        )
+        data = response.json()
+        self.assertEqual(data['creados'], 1)
+        self.assertEqual(data['errores'][0]['fila'], 2)
+        self.assertEqual(Movimiento.objects.get().usuario, usuario)
+
+    def test_endpoint_lote_exige_csrf_y_json(self):
+        usuario = User.objects.create_user('staff', password='x')
+        cliente = Client(enforce_csrf_checks=True)
+        cliente.force_login(usuario)
+        cuerpo = json.dumps({'movimientos': [{'producto': 'P-001', 'tipo': 'IN', 'cantidad': 2, 'destino': 'Bodega Central'}]})
+
+        # POST cross-site "simple" (text/plain, sin token): rechazado antes de tocar el stock
+        self.assertEqual(cliente.post(reverse('movimientos_lote'), cuerpo, content_type='text/plain').status_code, 403)
+        self.assertEqual(cliente.post(reverse('movimientos_lote'), cuerpo, content_type='application/json').status_code, 403)
+
+        cliente.get(reverse('proveedor_list'))
+        token = cliente.cookies['csrftoken'].value
+        response = cliente.post(reverse('movimientos_lote'), cuerpo, content_type='text/plain', HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(response.status_code, 415)
+        self.assertFalse(Movimiento.objects.exists())
+
+        response = cliente.post(reverse('movimientos_lote'), cuerpo, content_type='application/json', HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(response.json()['creados'], 1)
+
+    def test_import_csv_10k_filas_consultas_por_movimiento(self):
+        """Benchmark: el número de consultas no crece con el tamaño del archivo."""
+        productos = [self.producto] + [
+            Producto.objects.create(codigo=f"P-{i:03d}", nombre=f"Producto {i}", categoria='Other', precio_costo=1, precio_venta=2)
+            for i in range(2, 51)
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', delete=False) as f:
+            writer = csv.writer(f)
+            writer.writerow(['producto', 'tipo', 'cantidad', 'fecha', 'origen', 'destino', 'razon_ajuste'])
+            for i in range(10_000):
+                p = productos[i % len(productos)]
+                if i % 4 == 3 and i >= len(productos):
+                    writer.writerow([p.codigo, 'TRANSFER', 1, '', 'Bodega Central', 'Apto 101', ''])
+                else:
+                    writer.writerow([p.codigo, 'IN', 2, '2025-06-01', '', 'Bodega Central', 'Carga inicial'])
+        self.addCleanup(os.remove, f.name)
+
+        salida = StringIO()
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('import_movimientos', f.name, stdout=salida)
+
+        self.assertEqual(Movimiento.objects.count(), 10_000)
+        self.assertIn("10000 movimientos importados, 0 filas con error", salida.getvalue())
+        # ~2 consultas de resolución + lecturas/escrituras en lotes (movimientos, asientos del libro) + 1 UPDATE de totales
+        self.assertLess(len(ctx.captured_queries) / 10_000, 0.02)
+        self.assertEqual(Producto.objects.get(pk=self.producto.pk).stock_total_global, 400)
+
+
+class IndicesPlanTests(TestCase):
+    """
+    Regresión de planes: las consultas que ejecutan las funciones de reportes deben usar sus índices.
+    El tamaño del dataset se controla con ELITE_PLAN_MOVIMIENTOS (ej. 1000000 para la corrida completa);
+    `run_benchmark --pesado` revisa los mismos planes sobre 1M de movimientos sembrados.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        # Sembrado por el camino de posteo: también llena Inventario y ResumenDiario
+        sembrar(200, 40, int(os.environ.get('ELITE_PLAN_MOVIMIENTOS', 20_000)))
+
+    def test_reportes_usan_sus_indices(self):
+        for nombre, plan in revisar_planes().items():
+            with self.subTest(nombre):
+                self.assertTrue(plan['usa_indice'], f"El plan no usa {plan['indice']}:\n{plan['plan']}")
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('staff', password='x'))
+        self.bodega, self.apto, self.producto = crear_catalogo_basico()
+
+    def poblar_sitios(self, cantidad):
+        for i in range(cantidad):
+            sitio = Destino.objects.create(nombre=f"Extra {i}", direccion="-", tipo="Apto")
+            Inventario.objects.create(producto=self.producto, ubicacion=sitio, cantidad=i + 1)
+
+    def consultas_dashboard(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('dashboard'))
+        return len(ctx.captured_queries)
+
+    def test_consultas_no_crecen_con_los_sitios(self):
+        self.poblar_sitios(2)
+        pocas = self.consultas_dashboard()
+        self.poblar_sitios(30)
+        self.assertEqual(self.consultas_dashboard(), pocas)
+
+    def test_valor_por_sitio_y_snapshot_invalidado_al_postear(self):
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=3, destino=self.bodega)
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['valor_inventario'], Decimal('30.00'))
+        self.assertEqual(response.context['bodegas_summary'][0]['value'], 30.0)
+
+        # Con el snapshot en caché, los KPIs no vuelven a consultarse
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('dashboard'))
+        self.assertFalse(any('SUM(' in q['sql'] for q in ctx.captured_queries))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Movimiento.objects.create(producto=self.producto, tipo='TRANSFER', cantidad=1, origen=self.bodega, destino=self.apto)
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(len(response.context['bodegas_summary']), 2)
+
+
+class ExportacionesStreamingTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('staff', password='x'))
+        self.bodega, self.apto, self.producto = crear_catalogo_basico()
+
+    def descargar(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertTrue(response.streaming)
+        return list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+
+    def test_todas_las_exportaciones_son_streaming(self):
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=4, destino=self.bodega)
+        Movimiento.objects.create(producto=self.producto, tipo='OUT', cantidad=1, origen=self.bodega, destino=self.apto)
+
+        filas = self.descargar(reverse('reporte_movimientos'), export='excel')
+        self.assertEqual(filas[1][2], 'Exit (Usage/Sale)')
+        self.assertEqual(filas[1][9:12], ['Bodega Central', 'Apto 101', 'System'])
+
+        filas = self.descargar(reverse('producto_list'), export='excel')
+        self.assertEqual(filas[0][-2:], ['Stock: Apto 101', 'Stock: Bodega Central'])
+        self.assertEqual(filas[1], ['P-001', 'Toalla', 'Bathroom', '10.00', '3', '30.00', '0', '3'])
+
+        filas = self.descargar(reverse('reporte_bodegas'), export='general_excel')
+        self.assertEqual(filas[1], ['Bodega Central', 'P-001', 'Toalla', 'Bathroom', '3', '10.00', '30.00'])
+        filas = self.descargar(reverse('reporte_bodegas'), export='excel', bodega_id=self.bodega.id)
+        self.assertEqual(filas[1][3], '3')
+
+        filas = self.descargar(reverse('reporte_financiero'), export='excel_financiero', type='salidas_detalladas')
+        self.assertEqual(filas[1][2:8], ['Toalla', '1', '10.00', '10.00', 'Bodega Central', 'Apto 101'])
+        filas = self.descargar(reverse('reporte_financiero'), export='excel_financiero', type='unidades')
+        self.assertEqual(filas[1], ['Apto 101', 'Apto', '10.00'])
+
+        filas = self.descargar(reverse('dashboard'), export='dashboard_excel')
+        self.assertIn(['Total Products', '1'], filas)
+
+    def test_memoria_plana_sin_importar_el_numero_de_filas(self):
+        """
+        Benchmark reducido: 10x más filas no deben multiplicar el pico de memoria del export.
+        La corrida completa (1M de movimientos bajo un techo de RSS) es `run_benchmark --pesado`.
+        """
+        Movimiento.objects.bulk_create([
+            Movimiento(producto=self.producto, tipo='IN', cantidad=1, destino=self.bodega,
+                       fecha=date(2024, 1, 1) + timedelta(days=i % 100), referencia=f"EXP-{i}")
+            for i in range(20_000)
+        ], batch_size=5_000)
+
+        def pico(**params):
+            response = self.client.get(reverse('reporte_movimientos'), {'export': 'excel', **params})
+            tracemalloc.start()
+            filas = sum(1 for _ in response.streaming_content)
+            _, pico_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return filas, pico_bytes
+
+        filas_pocas, pico_pocas = pico(fecha_inicio='2024-01-01', fecha_fin='2024-01-10')
+        filas_todas, pico_todas = pico()
+        self.assertEqual((filas_pocas, filas_todas), (2_001, 20_001))
+        self.assertLess(pico_todas, pico_pocas * 2)
+
+
+class PaginacionKeysetTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('staff', password='x'))
+        self.bodega, _, self.producto = crear_catalogo_basico()
+        # Varias filas por día para ejercitar el desempate por id
+        Movimiento.objects.bulk_create([
+            Movimiento(producto=self.producto, tipo='IN' if i % 3 else 'ADJ_POS', cantidad=1, destino=self.bodega,
+                       fecha=date(2025, 1, 1) + timedelta(days=i // 7), referencia=f"PAG-{i}")
+            for i in range(120)
+        ])
+        self.esperado = list(Movimiento.objects.order_by('-fecha', '-id').values_list('id', flat=True))
+
+    def ids(self, response):
+        return [m.id for m in response.context['movimientos']]
+
+    def test_recorre_todas_las_paginas_en_ambos_sentidos(self):
+        url = reverse('reporte_movimientos')
+        response = self.client.get(url)
+        self.assertIsNone(response.context['url_anterior'])
+        vistos, paginas = self.ids(response), [response]
+        while response.context['url_siguiente']:
+            response = self.client.get(url + response.context['url_siguiente'])
+            vistos += self.ids(response)
+            paginas.append(response)
+        self.assertEqual(vistos, self.esperado)
+        self.assertEqual(len(paginas), 3)
+
+        anterior = self.client.get(url + paginas[-1].context['url_anterior'])
+        self.assertEqual(self.ids(anterior), self.ids(paginas[-2]))
+        primera = self.client.get(url + anterior.context['url_anterior'])
+        self.assertEqual(self.ids(primera), self.ids(paginas[0]))
+        self.assertIsNone(primera.context['url_anterior'])
+
+    def test_filtros_se_conservan_y_total_acotado(self):
+        url = reverse('reporte_movimientos')
+        response = self.client.get(url, {'tipo': 'IN'})
+        self.assertEqual(response.context['total_movimientos'], 80)
+        self.assertFalse(response.context['total_es_aproximado'])
+        self.assertIn('tipo=IN', response.context['url_siguiente'])
+
+        siguiente = self.client.get(url + response.context['url_siguiente'])
+        self.assertTrue(all(m.tipo == 'IN' for m in siguiente.context['movimientos']))
+        self.assertEqual(total_aproximado(Movimiento.objects.all(), limite=100), (100, True))
+
+    def test_cursor_invalido_vuelve_a_la_primera_pagina(self):
+        response = self.client.get(reverse('reporte_movimientos'), {'despues': 'basura!!'})
+        self.assertEqual(self.ids(response), self.esperado[:50])
+
+
+class ReporteBodegasTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('staff', password='x'))
+        self.bodega, self.apto, self.producto = crear_catalogo_basico()
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=5, destino=self.bodega)
+        Movimiento.objects.create(producto=self.producto, tipo='TRANSFER', cantidad=2, origen=self.bodega, destino=self.apto)
+
+    def test_totales_por_sitio_en_consultas_fijas(self):
+        for i in range(20):
+            sitio = Destino.objects.create(nombre=f"Extra {i:02d}", direccion="-", tipo="Apto")
+            Inventario.objects.create(producto=self.producto, ubicacion=sitio, cantidad=1)
+
+        with self.assertNumQueries(3):  # sesión + usuario + GROUP BY
+            response = self.client.get(reverse('reporte_bodegas'))
+
+        sitios = response.context['inventario_completo']
+        self.assertEqual(len(sitios), 22)
+        self.assertEqual(sitios[0]['sitio']['nombre'], 'Apto 101')
+        self.assertEqual((sitios[0]['total_items'], sitios[0]['valor_total']), (2, Decimal('20.00')))
+        self.assertNotContains(response, 'Toalla')
+
+    def test_items_de_un_sitio_bajo_demanda(self):
+        data = self.client.get(reverse('bodega_items', args=[self.bodega.id])).json()
+        self.assertEqual(data['items'], [
+            {'codigo': 'P-001', 'nombre': 'Toalla', 'categoria': 'Bathroom', 'cantidad': 3, 'precio_venta': '10.00'}
+        ])
+        self.assertEqual(self.client.get(reverse('bodega_items', args=[999])).status_code, 404)
+
+
+class ReporteFinancieroTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('staff', password='x'))
+        self.bodega, self.apto, self.producto = crear_catalogo_basico()
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=10, destino=self.bodega)
+        Movimiento.objects.create(producto=self.producto, tipo='TRANSFER', cantidad=3, origen=self.bodega, destino=self.apto)
+        Movimiento.objects.create(producto=self.producto, tipo='OUT', cantidad=1, origen=self.bodega, destino=self.apto)
+
+    def _agregar_sitios(self, n):
+        for i in range(n):
+            bodega = Destino.objects.create(nombre=f"Bodega {i:03d}", direccion="-", tipo="Bodega")
+            unidad = Destino.objects.create(nombre=f"Unidad {i:03d}", direccion="-", tipo="Apto")
+            Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=2, destino=bodega)
+            Movimiento.objects.create(producto=self.producto, tipo='OUT', cantidad=1, origen=bodega, destino=unidad)
+
+    def _consultas_reporte(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('reporte_financiero'))
+        return response, len(consultas.captured_queries)
+
+    def test_totales_por_bodega_y_unidad(self):
+        response = self.client.get(reverse('reporte_financiero'))
+
+        self.assertEqual(response.context['data_bodegas'], [{'nombre': 'Bodega Central', 'items': 1, 'valor': Decimal('60.00')}])
+        self.assertEqual(response.context['data_unidades'], [{'nombre': 'Apto 101', 'tipo': 'Apto', 'costo_total': Decimal('40.00')}])
+        self.assertEqual(response.context['salidas_por_ref'][0]['valor_total'], Decimal('10.00'))
+
+    def test_consultas_no_crecen_con_los_sitios(self):
+        self._agregar_sitios(5)
+        _, pocas = self._consultas_reporte()
+        self._agregar_sitios(45)
+        response, muchas = self._consultas_reporte()
+
+        self.assertEqual(pocas, muchas)
+        self.assertEqual(len(response.context['data_bodegas']), 51)
+        self.assertEqual(len(response.context['data_unidades']), 51)
+
+    def test_export_unidades_usa_el_mismo_calculo(self):
+        response = self.client.get(reverse('reporte_financiero'), {'export': 'excel_financiero', 'type': 'unidades'})
+        filas = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(filas, [['Nombre Unidad', 'Tipo', 'Costo Acumulado ($)'], ['Apto 101', 'Apto', '40.00']])
+
+
+class ContextoEliteAITests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user('staff', password='x')
+        self.bodega, self.apto, self.producto = crear_catalogo_basico()
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=4, destino=self.bodega)
+
+    def _consultas_de_negocio(self, consultas):
+        # Las lecturas de la tabla de caché no cuentan: solo las que tocan tablas de Inventario
+        return [q for q in consultas.captured_queries if '"Inventario_' in q['sql']]
+
+    def test_solo_calcula_las_secciones_de_la_intencion(self):
+        servicio = EliteIntelligenceService(self.usuario)
+        with mock.patch.object(EliteIntelligenceService, '_get_inventory_health') as inventario, \
+                mock.patch.object(EliteIntelligenceService, '_get_operational_logs') as operaciones:
+            contexto = servicio.build_context('What is the total cost?', [])
+
+        inventario.assert_not_called()
+        operaciones.assert_not_called()
+        self.assertIn('Total Assets Value (Inventory): $40.00', contexto)
+
+    def test_pregunta_de_seguimiento_no_consulta_la_bd(self):
+        EliteIntelligenceService(self.usuario).build_context('hello', [])
+
+        with CaptureQueriesContext(connection) as consultas:
+            contexto = EliteIntelligenceService(self.usuario).build_context('hello again', [])
+        self.assertEqual(self._consultas_de_negocio(consultas), [])
+        self.assertIn('Movements Today: 1', contexto)
+
+    def test_postear_un_movimiento_invalida_el_contexto(self):
+        EliteIntelligenceService(self.usuario).build_context('movement log', [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Movimiento.objects.create(producto=self.producto, tipo='OUT', cantidad=1, origen=self.bodega, destino=self.apto)
+
+        contexto = EliteIntelligenceService(self.usuario).build_context('movement log', [])
+        self.assertIn('Movements Today: 2', contexto)
+
+
+class _OpenAIFalso(BaseHTTPRequestHandler):
+    """Servidor local compatible con /chat/completions (stream=True): un chunk SSE por token."""
+    tokens = ['Hello', ' from', ' Elite']
+    pausa = 0.0
+    peticiones = []
+
+    def do_POST(self):
+        cuerpo = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        type(self).peticiones.append(cuerpo)
+        if cuerpo['messages'][-1]['content'] == 'fallar':
+            self.send_response(400)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(b'{"error": {"message": "bad request"}}')
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for token in self.tokens:
+            time.sleep(self.pausa)
+            chunk = {
+                'id': 'x', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'deepseek-chat',
+                'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+
+class ChatAsincronoTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ThreadingHTTPServer(('127.0.0.1', 0), _OpenAIFalso)
+        cls.servidor.daemon_threads = True
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+        cls.ajustes = override_settings(
+            DEEPSEEK_API_KEY='test', DEEPSEEK_BASE_URL=f"http://127.0.0.1:{cls.servidor.server_port}/v1",
+        )
+        cls.ajustes.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.ajustes.disable()
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('staff', password='x')
+        _OpenAIFalso.pausa = 0.0
+        _OpenAIFalso.peticiones = []
+        respuestas_ia.limpiar()
+
+    async def _chat(self, cliente, pregunta):
+        response = await cliente.post(
+            reverse('chat_inventario_stream'), json.dumps({'pregunta': pregunta}), content_type='application/json'
+        )
+        crudo = ''.join([c.decode() async for c in response.streaming_content])
+        eventos = []
+        for bloque in filter(None, crudo.split('\n\n')):
+            lineas = dict(linea.split(': ', 1) for linea in bloque.split('\n'))
+            eventos.append((lineas.get('event', 'message'), json.loads(lineas['data'])))
+        return response, eventos
+
+    async def test_stream_entrega_tokens_y_guarda_historial(self):
+        await self.async_client.aforce_login(self.usuario)
+        response, eventos = await self._chat(self.async_client, 'How much stock?')
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual([e[1]['delta'] for e in eventos if e[0] == 'message'], ['Hello', ' from', ' Elite'])
+        self.assertEqual(eventos[-1], ('done', {'status': 'success', 'cached': False}))
+
+        # El historial guardado al final del stream llega al contexto de la siguiente pregunta
+        await self._chat(self.async_client, 'And now?')
+        self.assertIn('Elite AI: Hello from Elite', _OpenAIFalso.peticiones[-1]['messages'][0]['content'])
+
+    async def test_stream_se_mide_hasta_el_ultimo_evento(self):
+        await self.async_client.aforce_login(self.usuario)
+        with self.assertLogs('Inventario.instrumentacion', 'INFO') as logs:
+            response = await self.async_client.post(
+                reverse('chat_inventario_stream'), json.dumps({'pregunta': 'How much stock?'}), content_type='application/json'
+            )
+            antes = response.asgi_request.medicion.consultas
+            [c async for c in response.streaming_content]
+
+        registro = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((registro['url_name'], registro['streaming']), ('chat_inventario_stream', True))
+        # El historial se guarda en la sesión al final del stream: esas consultas también cuentan
+        self.assertGreater(registro['queries'], antes)
+
+    async def test_endpoint_json_y_errores(self):
+        await self.async_client.aforce_login(self.usuario)
+        response = await self.async_client.post(
+            reverse('chat_inventario'), json.dumps({'pregunta': 'stock'}), content_type='application/json'
+        )
+        self.assertEqual(response.json(), {'status': 'success', 'respuesta': 'Hello from Elite', 'cached': False})
+
+        with self.assertLogs('Inventario.views', 'ERROR'):
+            _, eventos = await self._chat(self.async_client, 'fallar')
+        self.assertEqual(eventos[0][0], 'error')
+        self.assertIn('Critical AI Error', eventos[0][1]['message'])
+
+        response = await self.async_client.get(reverse('chat_inventario_stream'))
+        self.assertEqual(response.status_code, 405)
+
+    async def test_chat_exige_csrf(self):
+        cliente = AsyncClient(enforce_csrf_checks=True)
+        await cliente.aforce_login(self.usuario)
+        for vista in ('chat_inventario', 'chat_inventario_stream'):
+            with self.subTest(vista=vista):
+                response = await cliente.post(reverse(vista), json.dumps({'pregunta': 'stock'}), content_type='application/json')
+                self.assertEqual(response.status_code, 403)
+        self.assertEqual(_OpenAIFalso.peticiones, [])
+
+        # El dashboard manda el token en X-CSRFToken
+        dashboard = await cliente.get(reverse('dashboard'))
+        token = dashboard.cookies['csrftoken'].value
+        self.assertContains(dashboard, f"'X-CSRFToken': '{dashboard.context['csrf_token']}'")
+        response = await cliente.post(
+            reverse('chat_inventario'), json.dumps({'pregunta': 'stock'}), content_type='application/json', headers={'X-CSRFToken': token}
+        )
+        self.assertEqual(response.json()['respuesta'], 'Hello from Elite')
+
+    async def test_preguntas_repetidas_se_sirven_desde_cache(self):
+        _OpenAIFalso.pausa = 0.05
+        otro = await sync_to_async(User.objects.create_user)('otro', password='x')
+
+        async def sesion_nueva(usuario):
+            cliente = AsyncClient()
+            await cliente.aforce_login(usuario)
+            return cliente
+
+        async def preguntar(cliente, pregunta):
+            response = await cliente.post(
+                reverse('chat_inventario'), json.dumps({'pregunta': pregunta}), content_type='application/json'
+            )
+            return response.json()
+
+        conversacion = await sesion_nueva(self.usuario)
+        self.assertFalse((await preguntar(conversacion, "What's low on stock?"))['cached'])
+        # Mismo usuario, sin historial (mismo prompt): se sirve desde la caché
+        repetida = await preguntar(await sesion_nueva(self.usuario), "  what's LOW on   stock ")
+        self.assertEqual((repetida['respuesta'], repetida['cached']), ('Hello from Elite', True))
+        _, eventos = await self._chat(await sesion_nueva(self.usuario), "What's low on stock?")
+        self.assertEqual(eventos, [('message', {'delta': 'Hello from Elite'}), ('done', {'status': 'success', 'cached': True})])
+        self.assertEqual(len(_OpenAIFalso.peticiones), 1)
+
+        # El historial y el usuario van en el prompt: otra conversación u otro usuario no reusan la respuesta
+        self.assertFalse((await preguntar(conversacion, "What's low on stock?"))['cached'])
+        self.assertFalse((await preguntar(await sesion_nueva(otro), "What's low on stock?"))['cached'])
+        self.assertIn('USER: otro', _OpenAIFalso.peticiones[-1]['messages'][0]['content'])
+        self.assertEqual(len(_OpenAIFalso.peticiones), 3)
+
+        # Un movimiento posteado cambia la huella de los datos: la respuesta se vuelve a pedir
+        await sync_to_async(invalidar_cache_inventario)()
+        self.assertFalse((await preguntar(await sesion_nueva(self.usuario), "What's low on stock?"))['cached'])
+        self.assertEqual(len(_OpenAIFalso.peticiones), 4)
+
+        stats = (await conversacion.get(reverse('chat_cache_stats'))).json()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (2, 4, 4))
+        self.assertGreater(stats['saved_seconds'], 0.1)
+
+    async def test_preguntas_abiertas_no_se_cachean(self):
+        await self.async_client.aforce_login(self.usuario)
+        await self._chat(self.async_client, 'Why?')
+        await self._chat(self.async_client, 'Why?')
+        self.assertEqual(len(_OpenAIFalso.peticiones), 2)
+        self.assertEqual(respuestas_ia.estadisticas()['misses'], 0)
+
+    async def test_50_chats_concurrentes_no_se_bloquean(self):
+        # Cada respuesta tarda ~0.3 s en el servidor; en serie serían ~15 s
+        _OpenAIFalso.pausa = 0.1
+        await self.async_client.aforce_login(self.usuario)
+
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(*(self._chat(self.async_client, f'stock {i}') for i in range(50)))
+        duracion = time.perf_counter() - inicio
+
+        for _, eventos in resultados:
+            self.assertEqual(''.join(e[1]['delta'] for e in eventos if e[0] == 'message'), 'Hello from Elite')
+        self.assertLess(duracion, 4)
+
+
+class CacheRespuestasTests(TestCase):
+    def test_normaliza_la_pregunta(self):
+        self.assertEqual(normalizar_pregunta('  ¿Gástos del MES?  '), 'gastos del mes')
+
+    def test_desaloja_la_menos_usada(self):
+        lru = CacheRespuestas(max_entradas=2)
+        lru.guardar('a', 'A', 1.0)
+        lru.guardar('b', 'B', 1.0)
+        self.assertEqual(lru.obtener('a'), 'A')
+        lru.guardar('c', 'C', 1.0)
+
+        self.assertIsNone(lru.obtener('b'))
+        self.assertEqual((lru.obtener('a'), lru.obtener('c')), ('A', 'C'))
+        self.assertEqual(lru.estadisticas()['entries'], 2)
+
+
+class BusquedaProductosTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('staff', password='x'))
+        _, _, self.toalla = crear_catalogo_basico()
+        self.proveedor = Proveedor.objects.create(nombre="Textiles Andinos")
+        self.crear('TOA-9', 'Cortina de baño')
+        self.crear('P-002', 'Toalla grande')
+        self.jabon = self.crear('P-003', 'Jabón líquido', proveedor=self.proveedor)
+
+    def crear(self, codigo, nombre, **extra):
+        return Producto.objects.create(codigo=codigo, nombre=nombre, categoria='Bathroom', precio_costo=1, precio_venta=2, **extra)
+
+    def buscar(self, texto):
+        return list(buscar_productos(Producto.objects.all(), texto).values_list('codigo', flat=True))
+
+    def test_prefijos_y_codigo_primero(self):
+        self.assertEqual(self.buscar('toa'), ['TOA-9', 'P-001', 'P-002'])
+        self.assertEqual(self.buscar('toalla gra'), ['P-002'])
+        self.assertEqual(self.buscar('P-00'), ['P-001', 'P-002', 'P-003'])
+
+    def test_acentos_y_proveedor(self):
+        self.assertEqual(self.buscar('jabon'), ['P-003'])
+        self.assertEqual(self.buscar('andinos'), ['P-003'])
+        self.assertEqual(self.buscar('"; DROP'), [])
+
+    def test_el_indice_sigue_los_cambios(self):
+        self.jabon.nombre = 'Shampoo'
+        self.jabon.save()
+        self.proveedor.nombre = 'Distribuidora Norte'
+        self.proveedor.save()
+        self.toalla.delete()
+
+        self.assertEqual(self.buscar('jabon'), [])
+        self.assertEqual(self.buscar('shampoo norte'), ['P-003'])
+        self.assertEqual(self.buscar('toalla'), ['P-002'])
+
+    def test_autocompletar_pagina_en_formato_select2(self):
+        for i in range(25):
+            self.crear(f'SAB-{i:02d}', f'Sábana {i:02d}')
+
+        primera = self.client.get(reverse('producto_autocomplete'), {'q': 'saban'}).json()
+        self.assertEqual(len(primera['results']), 20)
+        self.assertTrue(primera['pagination']['more'])
+        self.assertEqual(set(primera['results'][0]), {'id', 'text'})
+
+        segunda = self.client.get(reverse('producto_autocomplete'), {'q': 'saban', 'page': 2}).json()
+        self.assertEqual((len(segunda['results']), segunda['pagination']['more']), (5, False))
+
+    def test_lista_de_productos_usa_el_indice(self):
+        response = self.client.get(reverse('producto_list'), {'q': 'toa'})
+        self.assertEqual([p.codigo for p in response.context['productos']], ['TOA-9', 'P-001', 'P-002'])
+
+    def test_triggers_perdidos_se_detectan_y_se_reconstruyen(self):
+        self.assertEqual(revisar_triggers_fts(databases=['default']), [])
+
+        # Lo que deja un AlterField en SQLite: la tabla se reconstruye sin los triggers
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TRIGGER {TABLA_FTS}_au")
+        avisos = revisar_triggers_fts(databases=['default'])
+        self.assertEqual([a.id for a in avisos], ['Inventario.W001'])
+        self.assertIn(f"{TABLA_FTS}_au", avisos[0].msg)
+        self.jabon.nombre = 'Shampoo'
+        self.jabon.save()
+        self.assertEqual(self.buscar('shampoo'), [])  # índice desactualizado, sin error
+
+        salida = StringIO()
+        call_command('rebuild_search', stdout=salida)
+        self.assertIn("reconstruida con 4 productos", salida.getvalue())
+        self.assertEqual(revisar_triggers_fts(databases=['default']), [])
+        self.assertEqual(self.buscar('shampoo'), ['P-003'])
+
+
+class IndiceBusquedaSqliteTests(TransactionTestCase):
+    def aplicar(self, operaciones, hacia_atras=False):
+        estados = [MigrationLoader(connection).project_state()]
+        for operacion in operaciones:
+            estados.append(estados[-1].clone())
+            operacion.state_forwards('Inventario', estados[-1])
+        pasos = list(zip(operaciones, estados, estados[1:]))
+        with connection.schema_editor() as editor:
+            for operacion, antes, despues in (reversed(pasos) if hacia_atras else pasos):
+                if hacia_atras:
+                    operacion.database_backwards('Inventario', editor, despues, antes)
+                else:
+                    operacion.database_forwards('Inventario', editor, antes, despues)
+
+    def buscar(self, texto):
+        return list(buscar_productos(Producto.objects.all(), texto).values_list('codigo', flat=True))
+
+    def test_alter_field_envuelto_conserva_los_triggers(self):
+        Producto.objects.create(codigo='P-1', nombre='Toalla', categoria='Bathroom', precio_costo=1, precio_venta=2)
+        alter = migrations.AlterField('producto', 'nombre', models.CharField(max_length=250))
+
+        # Sin envolver, SQLite no puede reconstruir la tabla con los triggers apuntándola
+        with self.assertRaises(OperationalError):
+            self.aplicar([alter])
+
+        operaciones = operaciones_sin_triggers_fts(alter)
+        self.aplicar(operaciones)
+        self.addCleanup(self.aplicar, operaciones, hacia_atras=True)
+        self.assertEqual(revisar_triggers_fts(databases=['default']), [])
+        Producto.objects.filter(codigo='P-1').update(nombre='Cortina')
+        self.assertEqual(self.buscar('cortina'), ['P-1'])
+
+
+class FormularioMovimientoTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('staff', password='x'))
+        self.bodega, self.apto, self.producto = crear_catalogo_basico()
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=5, destino=self.bodega)
+
+    def poblar_catalogo(self, n):
+        inicio = Producto.objects.count()
+        Producto.objects.bulk_create(
+            Producto(codigo=f"X-{inicio + i:04d}", nombre=f"Producto {inicio + i:04d}", categoria='Other', precio_costo=1, precio_venta=1)
+            for i in range(n)
+        )
+        Destino.objects.bulk_create(Destino(nombre=f"Sitio {inicio + i:04d}", direccion="-") for i in range(n))
+
+    def test_html_inicial_no_depende_del_catalogo(self):
+        self.poblar_catalogo(5)
+        pocos = len(self.client.get(reverse('movimiento_create')).content)
+        self.poblar_catalogo(300)
+        response = self.client.get(reverse('movimiento_create'))
+
+        self.assertEqual(len(response.content), pocos)
+        self.assertNotContains(response, 'Toalla')
+        self.assertContains(response, f'data-ajax-url="{reverse("destino_autocomplete")}"', count=2)
+
+    def test_validacion_y_opcion_seleccionada_al_reenviar(self):
+        response = self.client.post(reverse('movimiento_create'), {
+            'producto': self.producto.id, 'tipo': 'OUT', 'cantidad': 1, 'fecha': '2025-01-10',
+        })
+        self.assertContains(response, 'Selecciona la bodega de donde sale el producto (Origen).')
+        self.assertContains(response, f'<option value="{self.producto.id}" selected>P-001 - Toalla</option>', html=True)
+
+        response = self.client.post(reverse('movimiento_create'), {
+            'producto': self.producto.id, 'tipo': 'OUT', 'cantidad': 2, 'fecha': '2025-01-10',
+            'origen': self.bodega.id, 'destino': self.apto.id,
+        })
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        self.assertEqual(Inventario.objects.get(ubicacion=self.bodega).cantidad, 3)
+
+    def test_origen_filtra_sitios_con_stock_del_producto(self):
+        url = reverse('destino_autocomplete')
+        con_stock = self.client.get(url, {'producto': self.producto.id}).json()
+        self.assertEqual(con_stock['results'], [{'id': self.bodega.id, 'text': 'Bodega Central (stock: 5)'}])
+
+        todos = self.client.get(url, {'q': 'a'}).json()
+        self.assertEqual([r['text'] for r in todos['results']], ['Apto 101 (Apto)', 'Bodega Central (Bodega)'])
+
+
+class ListasCompraTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('staff', password='x'))
+
+    def crear_productos(self, n):
+        inicio = Producto.objects.count()
+        return Producto.objects.bulk_create(
+            Producto(codigo=f"L-{inicio + i:04d}", nombre=f"Item {inicio + i:04d}", categoria='Other',
+                     precio_costo=Decimal('2.50'), precio_venta=5, stock_minimo=4)
+            for i in range(n)
+        )
+
+    def generar(self, productos):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.post(reverse('generar_lista'), {'selected_products': [p.id for p in productos]})
+        return response, len(consultas.captured_queries)
+
+    def test_generar_lista_en_consultas_fijas(self):
+        _, pocas = self.generar(self.crear_productos(10))
+        response, muchas = self.generar(self.crear_productos(200))
+
+        self.assertEqual(pocas, muchas)
+        lista = ListaCompra.objects.latest('id')
+        self.assertRedirects(response, reverse('shopping_list_detail', args=[lista.id]), fetch_redirect_response=False)
+        self.assertEqual(lista.items.count(), 200)
+        self.assertEqual(set(lista.items.values_list('cantidad_sugerida', flat=True)), {4})
+
+    def test_indice_paginado_con_totales(self):
+        productos = self.crear_productos(3)
+        for _ in range(25):
+            self.generar(productos)
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('shopping_list'))
+        primera = response.context['listas']
+        self.assertEqual(len(primera), 20)
+        self.assertEqual((primera[0].total_items, primera[0].costo_estimado), (3, Decimal('30.00')))
+        self.assertContains(response, '$30,00')  # LANGUAGE_CODE = 'es'
+        self.assertLessEqual(len(consultas.captured_queries), 4)  # sesión + usuario + COUNT + página
+
+        self.assertEqual(len(self.client.get(reverse('shopping_list'), {'page': 2}).context['listas']), 5)
+
+    def test_detalle_con_totales_en_la_bd(self):
+        productos = self.crear_productos(2)
+        self.generar(productos)
+        ItemLista.objects.filter(producto=productos[0]).update(cantidad_sugerida=10)
+        lista = ListaCompra.objects.get()
+
+        response = self.client.get(reverse('shopping_list_detail', args=[lista.id]))
+        self.assertEqual(response.context['totales'], {'total_items': 2, 'total_unidades': 14, 'costo_estimado': Decimal('35.00')})
+        self.assertEqual([i.subtotal for i in response.context['items']], [Decimal('25.00'), Decimal('10.00')])
+
+
+class _GoogleCalendarFalso(BaseHTTPRequestHandler):
+    """
+    Stub local de events.insert de Google Calendar (también en batch: /batch/calendar/v3).
+    Responde 503 a las primeras `fallos` peticiones HTTP.
+    """
+    fallos = 0
+    peticiones = []
+
+    @staticmethod
+    def evento(cuerpo):
+        return {'id': 'evt1', 'htmlLink': f"https://calendar.google.com/event?eid={quote(cuerpo['summary'])}"}
+
+    def do_POST(self):
+        datos = self.rfile.read(int(self.headers['Content-Length']))
+        fallar = type(self).fallos > 0
+        type(self).fallos -= 1
+        if self.path.startswith('/batch/'):
+            return self.batch(datos, fallar)
+        cuerpo = json.loads(datos)
+        type(self).peticiones.append((self.path, cuerpo))
+        self.send_response(503 if fallar else 200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        if fallar:
+            self.wfile.write(b'{"error": {"code": 503, "message": "backend error"}}')
+        else:
+            self.wfile.write(json.dumps(self.evento(cuerpo)).encode())
+
+    def batch(self, datos, fallar):
+        mensaje = email.message_from_bytes(f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + datos)
+        partes = [(p['Content-ID'], json.loads(re.split(r'\r?\n\r?\n', p.get_payload(), 1)[1])) for p in mensaje.get_payload()]
+        type(self).peticiones.append((self.path, [cuerpo for _, cuerpo in partes]))
+        if fallar:
+            self.send_response(503)
+            self.end_headers()
+            return
+        frontera = 'batch_respuesta'
+        respuesta = ''.join(
+            f"--{frontera}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id.strip('<>')}>\r\n\r\n"
+            f"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n{json.dumps(self.evento(cuerpo))}\r\n"
+            for content_id, cuerpo in partes
+        ) + f"--{frontera}--\r\n"
+        self.send_response(200)
+        self.send_header('Content-Type', f'multipart/mixed; boundary={frontera}')
+        self.end_headers()
+        self.wfile.write(respuesta.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+class StubGoogleTestCase(TestCase):
+    """Levanta el stub de Google Calendar y un token.json vigente en un BASE_DIR temporal."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ThreadingHTTPServer(('127.0.0.1', 0), _GoogleCalendarFalso)
+        cls.servidor.daemon_threads = True
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+        # token.json vigente para que el cliente no intente refrescar ni abrir el navegador
+        cls.directorio = tempfile.TemporaryDirectory()
+        cls.escribir_token('2099-01-01T00:00:00Z')
+        cls.ajustes = override_settings(
+            BASE_DIR=cls.directorio.name, TAREAS_BACKOFF_BASE=5,
+            GOOGLE_CALENDAR_API_ENDPOINT=f"http://127.0.0.1:{cls.servidor.server_port}/calendar/v3/",
+        )
+        cls.ajustes.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.ajustes.disable()
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        cls.directorio.cleanup()
+        calendario.reiniciar()
+        super().tearDownClass()
+
+    @classmethod
+    def escribir_token(cls, expiry):
+        with open(os.path.join(cls.directorio.name, 'token.json'), 'w') as token:
+            json.dump({'token': 't', 'refresh_token': 'r', 'client_id': 'c', 'client_secret': 's', 'expiry': expiry}, token)
+
+    def setUp(self):
+        _GoogleCalendarFalso.fallos = 0
+        _GoogleCalendarFalso.peticiones = []
+        calendario.reiniciar()
+
+
+class ColaTareasTests(StubGoogleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.usuario = User.objects.create_user('staff', password='x')
+        self.client.force_login(self.usuario)
+        self.lista = ListaCompra.objects.create(usuario=self.usuario)
+        p = Producto.objects.create(codigo='T-1', nombre='Toalla', categoria='Other', precio_costo=2, precio_venta=5)
+        ItemLista.objects.create(lista=self.lista, producto=p, cantidad_sugerida=3)
+
+    def encolar_desde_lista(self):
+        response = self.client.post(reverse('shopping_list_calendar', args=[self.lista.id]))
+        self.assertEqual(response.status_code, 202)
+        return Tarea.objects.get(pk=response.json()['job_id'])
+
+    def test_el_request_solo_encola(self):
+        tarea = self.encolar_desde_lista()
+        self.assertEqual((tarea.tipo, tarea.estado, tarea.usuario), ('calendar_event', 'PENDING', self.usuario))
+        self.assertIn('Toalla (Qty: 3)', tarea.payload['description'])
+        self.assertEqual(_GoogleCalendarFalso.peticiones, [])
+
+    def test_worker_crea_el_evento_y_la_ui_lo_consulta(self):
+        tarea = self.encolar_desde_lista()
+        call_command('run_worker', '--once', stdout=StringIO())
+
+        ruta, evento = _GoogleCalendarFalso.peticiones[0]
+        self.assertTrue(ruta.startswith('/calendar/v3/calendars/primary/events'))
+        self.assertEqual(evento['summary'], f"🛒 Pending Purchases List #{self.lista.id_lista}")
+        job = self.client.get(reverse('tarea_estado', args=[tarea.pk])).json()['job']
+        self.assertEqual(job['estado'], 'DONE')
+        self.assertEqual(job['resultado'], {'link': f"https://calendar.google.com/event?eid={quote(evento['summary'])}"})
+
+    def test_reintento_con_backoff_exponencial(self):
+        _GoogleCalendarFalso.fallos = 2
+        tarea = self.encolar_desde_lista()
+
+        esperas = []
+        for _ in range(3):
+            antes = timezone.now()
+            self.assertEqual(procesar(), 1)
+            tarea.refresh_from_db()
+            if tarea.estado == 'PENDING':
+                esperas.append(round((tarea.disponible_en - antes).total_seconds()))
+                self.assertEqual(procesar(), 0)  # todavía no le toca
+                Tarea.objects.filter(pk=tarea.pk).update(disponible_en=timezone.now())
+
+        self.assertEqual(esperas, [5, 10])
+        self.assertEqual((tarea.estado, tarea.intentos, tarea.error), ('DONE', 3, ''))
+
+    def test_falla_definitiva_al_agotar_intentos(self):
+        _GoogleCalendarFalso.fallos = 10
+        tarea = encolar('calendar_event', {'summary': 'x'}, usuario=self.usuario, max_intentos=2)
+        procesar()
+        Tarea.objects.filter(pk=tarea.pk).update(disponible_en=timezone.now())
+        procesar()
+
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), ('FAILED', 2))
+        self.assertIn('Google Calendar', tarea.error)
+
+    def test_lease_vencido_se_retoma(self):
+        tarea = encolar('calendar_event', {'summary': 'x'})
+        self.assertEqual(tomar_siguiente().pk, tarea.pk)
+        self.assertIsNone(tomar_siguiente())  # RUNNING con lease vigente: nadie más la toma
+
+        Tarea.objects.filter(pk=tarea.pk).update(disponible_en=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(tomar_siguiente().intentos, 2)
+
+    def test_tarea_de_otro_usuario(self):
+        tarea = encolar('calendar_event', {'summary': 'x'}, usuario=User.objects.create_user('otro'))
+        self.assertEqual(self.client.get(reverse('tarea_estado', args=[tarea.pk])).status_code, 404)
+
+    def test_reporte_ia_en_segundo_plano(self):
+        with mock.patch.object(EliteIntelligenceService, 'complete', return_value='Weekly report') as complete:
+            response = self.client.post(
+                reverse('chat_reporte'), json.dumps({'pregunta': 'gastos del mes'}), content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 202)
+            complete.assert_not_called()
+            procesar()
+
+        job = self.client.get(response.json()['poll_url']).json()['job']
+        self.assertEqual((job['estado'], job['resultado']), ('DONE', {'respuesta': 'Weekly report'}))
+
+    def test_reporte_ia_exige_csrf(self):
+        cliente = Client(enforce_csrf_checks=True)
+        cliente.force_login(self.usuario)
+        response = cliente.post(reverse('chat_reporte'), json.dumps({'pregunta': 'gastos del mes'}), content_type='text/plain')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Tarea.objects.filter(tipo='ai_report').exists())
+
+
+class ClienteCalendarioTests(StubGoogleTestCase):
+    def test_credenciales_y_servicio_se_cargan_una_vez(self):
+        with mock.patch('Inventario.google_calendar.build', wraps=google_calendar.build) as build, \
+                mock.patch.object(google_calendar.Credentials, 'from_authorized_user_file', wraps=google_calendar.Credentials.from_authorized_user_file) as leer:
+            links = [create_google_calendar_event(f"E{i}", 'x') for i in range(5)]
+
+        self.assertEqual(links, [f"https://calendar.google.com/event?eid=E{i}" for i in range(5)])
+        self.assertEqual((build.call_count, leer.call_count), (1, 1))
+
+    def test_token_vencido_se_refresca_una_sola_vez_entre_hilos(self):
+        self.escribir_token('2000-01-01T00:00:00Z')
+        self.addCleanup(self.escribir_token, '2099-01-01T00:00:00Z')
+
+        def refrescar(creds, request):
+            time.sleep(0.05)
+            creds.token, creds.expiry = 'nuevo', datetime(2099, 1, 1)
+
+        with mock.patch.object(google_calendar.Credentials, 'refresh', autospec=True, side_effect=refrescar) as refresh:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                links = list(pool.map(lambda i: create_google_calendar_event(f"E{i}", 'x', interactivo=False), range(16)))
+
+        self.assertEqual(refresh.call_count, 1)
+        self.assertTrue(all(links))
+        with open(os.path.join(self.directorio.name, 'token.json')) as token:
+            self.assertEqual(json.load(token)['token'], 'nuevo')
+
+    def test_refresh_fallido_en_el_worker_conserva_el_token(self):
+        self.escribir_token('2000-01-01T00:00:00Z')
+        self.addCleanup(self.escribir_token, '2099-01-01T00:00:00Z')
+        token_path = os.path.join(self.directorio.name, 'token.json')
+
+        for error in (ConnectionError('sin red'), google_calendar.RefreshError('invalid_grant')):
+            with self.subTest(error=type(error).__name__):
+                calendario.reiniciar()
+                with mock.patch.object(google_calendar.Credentials, 'refresh', side_effect=error):
+                    with self.assertRaises(type(error)):
+                        calendario._credenciales(interactivo=False)
+                    self.assertIsNone(create_google_calendar_event('E', 'x', interactivo=False))  # la tarea se reintenta
+                self.assertTrue(os.path.exists(token_path))
+
+        # En modo interactivo un refresh token revocado sí fuerza un login nuevo
+        calendario.reiniciar()
+        with mock.patch.object(google_calendar.Credentials, 'refresh', side_effect=google_calendar.RefreshError('invalid_grant')):
+            self.assertIsNone(create_google_calendar_event('E', 'x'))  # sin credentials.json no hay flujo
+        self.assertFalse(os.path.exists(token_path))
+
+    def test_batch_de_eventos(self):
+        eventos = [(f"E{i}", 'x') for i in range(60)]
+        links = calendario.crear_eventos(eventos)
+
+        self.assertEqual(links, [f"https://calendar.google.com/event?eid=E{i}" for i in range(60)])
+        rutas = [ruta for ruta, _ in _GoogleCalendarFalso.peticiones]
+        self.assertEqual(rutas, ['/batch/calendar/v3'] * 2)  # 50 + 10
+        self.assertEqual([len(cuerpos) for _, cuerpos in _GoogleCalendarFalso.peticiones], [50, 10])
+
+    def test_batch_fallido_no_rompe(self):
+        _GoogleCalendarFalso.fallos = 1
+        self.assertEqual(calendario.crear_eventos([('A', 'x'), ('B', 'x')]), [None, None])
+
+    def test_costo_por_evento(self):
+        """Benchmark contra el stub: cliente nuevo por evento (antes) vs. cliente compartido vs. batch."""
+        n = 30
+
+        def por_evento(crear):
+            inicio = time.perf_counter()
+            crear()
+            return (time.perf_counter() - inicio) / n
+
+        nuevo = por_evento(lambda: [google_calendar.ClienteCalendario().crear_evento(f"E{i}", 'x') for i in range(n)])
+        create_google_calendar_event('calentar', 'x')
+        compartido = por_evento(lambda: [create_google_calendar_event(f"E{i}", 'x') for i in range(n)])
+        batch = por_evento(lambda: calendario.crear_eventos([(f"E{i}", 'x') for i in range(n)]))
+
+        self.assertLess(compartido, nuevo)
+        self.assertLess(batch, nuevo)
+
+
+class ArranqueWorkerTests(SimpleTestCase):
+    """Tiempo de import al arrancar un worker (django.setup + URLconf), medido con `python -X importtime`."""
+    PRESUPUESTO_MS = 1000  # hoy ~450 ms; con openai + google importados al arrancar eran ~1.500 ms
+    SDKS_PESADOS = ('openai', 'googleapiclient', 'google_auth_oauthlib', 'google.oauth2')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        codigo = "import sys, django; django.setup(); import Elite_brand.urls; print(*sys.modules, sep='\\n')"
+        entorno = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'Elite_brand.settings', 'SECRET_KEY': 'importtime'}
+        proceso = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', codigo],
+            cwd=settings.BASE_DIR, env=entorno, capture_output=True, text=True, check=True,
+        )
+        cls.modulos = set(proceso.stdout.split())
+        # Líneas "import time: self | cumulative | paquete": el total es la suma de los imports de primer nivel
+        cls.total_ms = sum(
+            int(acumulado) for _, acumulado, nombre in (
+                linea[len('import time:'):].split('|') for linea in proceso.stderr.splitlines()
+                if linea.startswith('import time:') and '|' in linea
+            )
+            if acumulado.strip().isdigit() and not nombre.startswith('  ')
+        ) / 1000
+
+    def test_no_carga_sdks_pesados(self):
+        cargados = {m for m in self.modulos if m.startswith(self.SDKS_PESADOS)}
+        self.assertEqual(cargados, set())
+
+    def test_presupuesto_de_arranque(self):
+        self.assertLess(self.total_ms, self.PRESUPUESTO_MS)
+
+
+class ConfiguracionBaseDeDatosTests(SimpleTestCase):
+    POSTGRES = 'postgres://elite:x@db.example.com:5432/elite'
+
+    def test_postgres_con_pool_dimensionado_por_entorno(self):
+        config = base_de_datos(settings.BASE_DIR, {
+            'DATABASE_URL': self.POSTGRES, 'DB_POOL_MIN_SIZE': '1', 'DB_POOL_MAX_SIZE': '4', 'DB_POOL_TIMEOUT': '2.5',
+        })
+        self.assertEqual(config['OPTIONS']['pool'], {'min_size': 1, 'max_size': 4, 'timeout': 2.5, 'max_idle': 300.0})
+        self.assertEqual((config['CONN_MAX_AGE'], config['CONN_HEALTH_CHECKS']), (0, True))
+
+    def test_postgres_sin_pool_usa_conexiones_persistentes(self):
+        sin_pool = base_de_datos(settings.BASE_DIR, {'DATABASE_URL': self.POSTGRES, 'DB_POOL': '0', 'DB_CONN_MAX_AGE': '120'})
+        with mock.patch('Elite_brand.database.pool_disponible', return_value=False):
+            sin_psycopg_pool = base_de_datos(settings.BASE_DIR, {'DATABASE_URL': self.POSTGRES})
+
+        for config, max_age in ((sin_pool, 120), (sin_psycopg_pool, 600)):
+            self.assertNotIn('pool', config.get('OPTIONS', {}))
+            self.assertEqual((config['CONN_MAX_AGE'], config['CONN_HEALTH_CHECKS']), (max_age, True))
+
+    def test_sqlite_local(self):
+        config = base_de_datos(settings.BASE_DIR, {})
+        self.assertEqual(config['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(config['OPTIONS'], {'transaction_mode': 'IMMEDIATE', 'timeout': 20})
+        self.assertEqual(config['TEST'], {'NAME': str(settings.BASE_DIR / 'test_db.sqlite3')})
+
+
+class LoadtestTests(TransactionTestCase):
+    def test_reporta_latencias(self):
+        User.objects.create_user('staff', password='x')
+        crear_catalogo_basico()
+        salida = StringIO()
+        call_command('loadtest', '--url', '/productos/?q=toalla', '--concurrencia', '4', '--peticiones', '20', stdout=salida)
+
+        texto = salida.getvalue()
+        self.assertIn('20 peticiones a /productos/?q=toalla con 4 hilos', texto)
+        self.assertIn(', 0 errores', texto)
+        self.assertRegex(texto, r'p50=[\d.]+ p95=[\d.]+ p99=[\d.]+')
+
+    def test_sin_usuario(self):
+        with self.assertRaises(CommandError):
+            call_command('loadtest', '--peticiones', '1', stdout=StringIO())
+
+
+class InstrumentacionTests(TestCase):
+    """Presupuestos de consultas (settings.PRESUPUESTOS_CONSULTAS) sobre un dataset sembrado."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('staff', password='x')
+        sembrar(productos=60, sitios=30, movimientos=600)
+        lista = ListaCompra.objects.create(usuario=cls.usuario)
+        ItemLista.objects.bulk_create(ItemLista(lista=lista, producto=p, cantidad_sugerida=3) for p in Producto.objects.all()[:10])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def test_vistas_dentro_de_su_presupuesto(self):
+        for url_name, presupuesto in settings.PRESUPUESTOS_CONSULTAS.items():
+            with self.subTest(url_name=url_name):
+                cache.clear()
+                response = self.client.get(reverse(url_name))
+                self.assertEqual(response.status_code, 200)
+                consultas = response.wsgi_request.medicion.consultas
+                self.assertLessEqual(consultas, presupuesto, f"{url_name} hizo {consultas} consultas (presupuesto {presupuesto})")
+
+    def test_server_timing_y_log_estructurado(self):
+        with self.assertLogs('Inventario.instrumentacion', 'INFO') as logs:
+            response = self.client.get(reverse('reporte_bodegas'))
+
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="3 queries", total;dur=[\d.]+$')
+        registro = json.loads(logs.records[0].getMessage())
+        self.assertEqual(
+            {k: registro[k] for k in ('event', 'method', 'url_name', 'status', 'queries')},
+            {'event': 'request', 'method': 'GET', 'url_name': 'reporte_bodegas', 'status': 200, 'queries': 3},
+        )
+        self.assertIsNone(registro['peak_kb'])
+
+    def test_consultas_a_la_tabla_de_cache_se_cuentan_aparte(self):
+        response = self.client.get(reverse('dashboard'))
+        medicion = response.wsgi_request.medicion
+        self.assertEqual(medicion.consultas_cache, 10)  # versión y snapshot de KPIs: leer, purgar, guardar, releer
+        self.assertEqual(medicion.consultas, settings.PRESUPUESTOS_CONSULTAS['dashboard'])  # sin los SAVEPOINT de la caché
+        self.assertIn(f'desc="{medicion.consultas} queries"', response['Server-Timing'])
+
+    def test_streaming_se_registra_al_terminar_el_cuerpo(self):
+        with self.assertLogs('Inventario.instrumentacion', 'INFO') as logs:
+            response = self.client.get(reverse('producto_list'), {'export': 'excel'})
+            antes = response.wsgi_request.medicion.consultas
+            self.assertEqual(logs.records, [])  # la vista retornó, pero el CSV todavía no se generó
+            b''.join(response.streaming_content)
+
+        registro = json.loads(logs.records[0].getMessage())
+        self.assertEqual((registro['url_name'], registro['streaming']), ('producto_list', True))
+        self.assertGreater(registro['queries'], antes)  # el SELECT de las filas corre al enviar el cuerpo
+        self.assertEqual(registro['queries'], response.wsgi_request.medicion.consultas)
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(PRESUPUESTOS_CONSULTAS={'reporte_bodegas': 1})
+    def test_presupuesto_excedido_se_registra(self):
+        with self.assertLogs('Inventario.instrumentacion', 'WARNING') as logs:
+            self.client.get(reverse('reporte_bodegas'))
+        registro = json.loads(logs.records[0].getMessage())
+        self.assertEqual((registro['event'], registro['budget'], registro['queries']), ('query_budget_exceeded', 1, 3))
+
+    def test_cuenta_consultas_de_vistas_async(self):
+        # login_required async carga sesión y usuario en hilos (sync_to_async): también cuentan
+        response = self.client.post(reverse('chat_inventario'), {'pregunta': ''}, content_type='application/json')
+        self.assertEqual(response.json()['message'], 'Empty query')
+        self.assertEqual(response.wsgi_request.medicion.consultas, 2)
+
+    @override_settings(INSTRUMENTACION_MEMORIA=True)
+    def test_pico_de_memoria_con_tracemalloc(self):
+        estaba_activo = tracemalloc.is_tracing()
+        try:
+            response = self.client.get(reverse('reporte_bodegas'))
+        finally:
+            if not estaba_activo:
+                tracemalloc.stop()
+        self.assertGreater(response.wsgi_request.medicion.pico_bytes, 0)
+        self.assertIn('mem;desc="peak', response['Server-Timing'])
+
+
+class BenchmarkTests(TestCase):
+    def test_siembra_reproducible_y_consistente(self):
+        out = StringIO()
+        call_command('seed_benchmark', products=40, sites=12, movements=500, stdout=out)
+        self.assertIn("40 productos, 12 sitios, 1 proveedores y 500 movimientos", out.getvalue())
+        primera = list(Movimiento.objects.order_by('id').values_list('producto__codigo', 'tipo', 'cantidad', 'fecha'))
+
+        with self.assertRaises(CommandError):
+            call_command('seed_benchmark', products=40, sites=12, movements=500)
+        # En lotes chicos (como la escala de 1M) el historial sembrado es el mismo
+        with mock.patch('Inventario.benchmark.LOTE_SIEMBRA', 120):
+            call_command('seed_benchmark', products=40, sites=12, movements=500, reset=True, stdout=StringIO())
+        self.assertEqual(list(Movimiento.objects.order_by('id').values_list('producto__codigo', 'tipo', 'cantidad', 'fecha')), primera)
+
+        # Stock, total global y rollup coinciden con el historial sembrado
+        self.assertFalse(Producto.objects.annotate(real=Sum('inventarios__cantidad')).exclude(stock_total_global=F('real')).exists())
+        self.assertEqual(ResumenDiario.objects.aggregate(n=Sum('movimientos'))['n'], 500)
+        self.assertEqual(Destino.objects.filter(tipo='Bodega').count(), 1)
+        self.assertGreater(Movimiento.objects.filter(tipo='TRANSFER').count(), 0)
+
+        limpiar()
+        self.assertFalse(Producto.objects.filter(codigo__startswith=PREFIJO).exists())
+        self.assertFalse(Destino.objects.exists())
+
+    def test_medir_endpoints_y_comparar(self):
+        sembrar(productos=30, sitios=10, movimientos=200)
+        resultados = medir_endpoints(repeticiones=1)
+
+        self.assertEqual(resultados['reporte_bodegas']['consultas'], 3)
+        self.assertEqual(resultados['producto_list']['consultas'], settings.PRESUPUESTOS_CONSULTAS['producto_list'])
+        self.assertTrue(all(r['mediana_ms'] > 0 for r in resultados.values()))
+        self.assertEqual(Movimiento.objects.filter(usuario__username='bench_runner').count(), 2)
+
+        exportacion = medir_exportacion()
+        self.assertEqual(exportacion['filas'], Movimiento.objects.count())
+        self.assertTrue(exportacion['dentro_del_techo'])
+
+        planes = revisar_planes()
+        self.assertEqual(
+            {nombre for nombre, plan in planes.items() if not plan['usa_indice']}, set(),
+            "\n".join(plan['plan'] for plan in planes.values()),
+        )
+
+        financiero = medir_financiero()
+        self.assertTrue(financiero['coinciden'])
+        self.assertEqual(financiero['actual']['consultas'], 2)
+        self.assertGreater(financiero['anterior']['consultas'], 2 * Destino.objects.count())  # una por sitio, más una por fila
+
+        anterior = {'escalas': [{'escala': '30x10x200', 'endpoints': {'dashboard': {'mediana_ms': 10.0}}}]}
+        actual = {'escalas': [{'escala': '30x10x200', 'endpoints': {'dashboard': {'mediana_ms': 12.5}, 'nuevo': {'mediana_ms': 1.0}}}]}
+        self.assertEqual(comparar(anterior, actual), [('30x10x200', 'dashboard', 10.0, 12.5, 25.0)])
+
+
+class CortesStockTests(TestCase):
+    def setUp(self):
+        sembrar(productos=25, sitios=8, movimientos=600)
+        self.hoy = timezone.now().date()
+        self.sitio = Destino.objects.filter(tipo='Bodega').values_list('id', flat=True).first()
+
+    def test_reconstruccion_coincide_con_el_historial(self):
+        fechas = [self.hoy - timedelta(days=d) for d in (0, 1, 45, 120, 200, 364, 400)]
+        sin_cortes = {f: stock_en(f) for f in fechas}
+        tomar_corte(self.hoy - timedelta(days=100))
+        tomar_corte(self.hoy - timedelta(days=250))
+
+        for fecha in fechas:
+            with self.subTest(fecha=fecha):
+                esperado = stock_por_reproduccion(fecha)
+                self.assertEqual(sin_cortes[fecha], esperado)
+                self.assertEqual(stock_en(fecha), esperado)
+                self.assertEqual(stock_en(fecha, ubicacion_id=self.sitio), {k: v for k, v in esperado.items() if k[1] == self.sitio})
+        actual = {(i.producto_id, i.ubicacion_id): i.cantidad for i in Inventario.objects.exclude(cantidad=0)}
+        self.assertEqual(stock_en(self.hoy), actual)
+
+    def test_solo_aplica_los_movimientos_de_la_ventana(self):
+        corte = tomar_corte(self.hoy - timedelta(days=100))
+        fecha = self.hoy - timedelta(days=95)
+        self.assertEqual(corte_mas_cercano(fecha), (corte, 5))
+
+        with CaptureQueriesContext(connection) as consultas:
+            stock_en(fecha, ubicacion_id=self.sitio)
+        self.assertEqual(len(consultas.captured_queries), 5)  # 2 cortes vecinos + líneas + entradas + salidas
+        ventana = [q['sql'] for q in consultas.captured_queries if 'Inventario_movimiento' in q['sql']]
+        self.assertTrue(all(str(corte.fecha) in sql and str(fecha) in sql for sql in ventana))
+
+    def test_movimiento_con_fecha_pasada_ajusta_los_cortes(self):
+        viejo = tomar_corte(self.hoy - timedelta(days=30))
+        reciente = tomar_corte(self.hoy - timedelta(days=2))
+        producto = Producto.objects.first()
+
+        Movimiento.objects.create(producto=producto, tipo='IN', cantidad=7, destino_id=self.sitio, fecha=self.hoy - timedelta(days=10))
+        registrar_movimientos_en_lote([{
+            'producto_id': producto.id, 'tipo': 'ADJ_POS', 'cantidad': 3, 'fecha': self.hoy - timedelta(days=40),
+            'origen_id': None, 'destino_id': self.sitio,
+        }])
+
+        for corte in (viejo, reciente):
+            guardado = {(l.producto_id, l.ubicacion_id): l.cantidad for l in corte.lineas.exclude(cantidad=0)}
+            self.assertEqual(guardado, stock_por_reproduccion(corte.fecha))
+        self.assertEqual(
+            reciente.lineas.get(producto=producto, ubicacion_id=self.sitio).cantidad,
+            stock_por_reproduccion(reciente.fecha)[(producto.id, self.sitio)],
+        )
+
+        # Un sitio sin stock en los cortes: las líneas nuevas también cuentan en lineas_total
+        nuevo = Destino.objects.create(nombre='Bodega Nueva', direccion='-', tipo='Bodega')
+        Movimiento.objects.create(producto=producto, tipo='IN', cantidad=2, destino=nuevo, fecha=self.hoy - timedelta(days=5))
+        viejo.refresh_from_db()
+        reciente.refresh_from_db()
+        self.assertFalse(viejo.lineas.filter(ubicacion=nuevo).exists())
+        self.assertEqual(reciente.lineas.get(ubicacion=nuevo).cantidad, 2)
+        for corte in (viejo, reciente):
+            self.assertEqual(corte.lineas_total, corte.lineas.count())
+
+    def test_comando_take_snapshot(self):
+        out = StringIO()
+        call_command('take_snapshot', verificar=True, stdout=out)
+        corte = CorteStock.objects.get()
+        self.assertEqual(corte.fecha, self.hoy - timedelta(days=1))
+        self.assertEqual(corte.ultimo_movimiento_id, Movimiento.objects.latest('id').id)
+        self.assertIn("El corte coincide con el historial", out.getvalue())
+
+        call_command('take_snapshot', fecha=str(corte.fecha), stdout=StringIO())
+        self.assertEqual(CorteStock.objects.count(), 1)
+        with self.assertRaises(CommandError):
+            call_command('take_snapshot', fecha='ayer')
+
+        # Un desfase en Inventario (edición manual) se detecta contra el historial
+        Inventario.objects.filter(ubicacion_id=self.sitio, cantidad__gt=0).update(cantidad=F('cantidad') + 1)
+        with self.assertRaisesMessage(CommandError, "no coinciden con el historial"):
+            call_command('take_snapshot', fecha=str(self.hoy), verificar=True, stdout=StringIO())
+
+    def test_valoracion_y_api_por_fecha(self):
+        fecha = self.hoy - timedelta(days=60)
+        stock = stock_en(fecha)
+        valoracion = valoracion_en(fecha)
+        self.assertEqual(sum(s['unidades'] for s in valoracion), sum(stock.values()))
+        self.assertEqual(
+            sum(s['valor'] for s in valoracion),
+            sum(c * Producto.objects.get(pk=p).precio_venta for (p, _), c in stock.items()),
+        )
+
+        self.client.force_login(User.objects.create_user('staff', password='x'))
+        data = self.client.get(reverse('bodega_items', args=[self.sitio]), {'fecha': str(fecha)}).json()
+        self.assertEqual(data['fecha'], str(fecha))
+        self.assertEqual(sum(i['cantidad'] for i in data['items']), sum(c for (_, u), c in stock.items() if u == self.sitio))
+        self.assertEqual(self.client.get(reverse('bodega_items', args=[self.sitio]), {'fecha': 'x'}).status_code, 400)
+
+
+class LibroStockTests(TestCase):
+    def setUp(self):
+        self.bodega, self.apto, self.producto = crear_catalogo_basico()
+
+    def saldos(self):
+        return {
+            (a['producto_id'], a['ubicacion_id']): a['saldo']
+            for a in AsientoStock.objects.values('producto_id', 'ubicacion_id').annotate(saldo=Sum('cantidad'))
+        }
+
+    def test_admin_de_inventario_es_de_solo_lectura(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=10, destino=self.bodega)
+        inv = Inventario.objects.get(ubicacion=self.bodega)
+        url = reverse('admin:Inventario_inventario_change', args=[inv.pk])
+
+        self.assertEqual(self.client.get(url).status_code, 200)  # se puede ver
+        response = self.client.post(url, {'producto': self.producto.pk, 'ubicacion': self.bodega.pk, 'cantidad': 99})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.get(reverse('admin:Inventario_inventario_add')).status_code, 403)
+        inv.refresh_from_db()
+        self.assertEqual(inv.cantidad, 10)
+
+    def test_asientos_por_sitio_tocado(self):
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=10, destino=self.bodega)
+        with CaptureQueriesContext(connection) as consultas:
+            transferencia = Movimiento.objects.create(producto=self.producto, tipo='TRANSFER', cantidad=4, origen=self.bodega, destino=self.apto)
+        self.assertEqual(sum('INSERT INTO "Inventario_asientostock"' in q['sql'] for q in consultas.captured_queries), 1)
+        self.assertEqual(
+            sorted(transferencia.asientos.values_list('ubicacion_id', 'cantidad')),
+            sorted([(self.bodega.id, -4), (self.apto.id, 4)]),
+        )
+
+        with self.assertRaises(ValidationError):
+            Movimiento.objects.create(producto=self.producto, tipo='OUT', cantidad=99, origen=self.apto)
+        registrar_movimientos_en_lote([
+            {'producto_id': self.producto.id, 'tipo': 'OUT', 'cantidad': 1, 'fecha': date(2025, 3, 1), 'origen_id': self.apto.id, 'destino_id': None},
+            {'producto_id': self.producto.id, 'tipo': 'ADJ_NEG', 'cantidad': 2, 'fecha': date(2025, 3, 1), 'origen_id': self.bodega.id, 'destino_id': None},
+        ])
+
+        self.assertEqual(self.saldos(), {(self.producto.id, self.bodega.id): 4, (self.producto.id, self.apto.id): 3})
+        self.assertEqual(diferencias_libro(), [])
+        self.assertEqual(AsientoStock.objects.get(movimiento__tipo='OUT').fecha, date(2025, 3, 1))
+
+    def test_verify_ledger_detecta_y_repara(self):
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=10, destino=self.bodega)
+        Movimiento.objects.create(producto=self.producto, tipo='TRANSFER', cantidad=3, origen=self.bodega, destino=self.apto)
+        out = StringIO()
+        call_command('verify_ledger', stdout=out)
+        self.assertIn("Sin diferencias", out.getvalue())
+
+        # Desfase: una fila editada a mano y otra borrada
+        Inventario.objects.filter(ubicacion=self.bodega).update(cantidad=50)
+        Inventario.objects.filter(ubicacion=self.apto).delete()
+        with CaptureQueriesContext(connection) as consultas:
+            call_command('verify_ledger', stdout=out)
+        self.assertEqual(len(consultas.captured_queries), 2)  # GROUP BY del libro + lectura de Inventario
+        self.assertIn(f"producto {self.producto.id} en sitio {self.bodega.id}: inventario=50 libro=7 (diferencia -43)", out.getvalue())
+        self.assertIn("2 líneas con diferencias", out.getvalue())
+
+        asientos = AsientoStock.objects.count()
+        call_command('verify_ledger', repair=True, stdout=out)
+        self.assertIn("2 líneas de Inventario reparadas", out.getvalue())
+        self.assertEqual(AsientoStock.objects.count(), asientos)  # el libro no se toca
+        self.assertEqual(diferencias_libro(), [])
+        self.assertEqual(Inventario.objects.get(ubicacion=self.apto).cantidad, 3)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_total_global, 10)
+
+    def test_libro_de_solo_agregado(self):
+        movimiento = Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=1, destino=self.bodega)
+        with self.assertRaises(RestrictedError):
+            movimiento.delete()
+        self.producto.delete()  # al borrar el producto sí caen sus movimientos y asientos
+        self.assertFalse(AsientoStock.objects.exists())
+
+    def test_backfill_con_saldo_de_apertura(self):
+        Movimiento.objects.create(producto=self.producto, tipo='IN', cantidad=10, destino=self.bodega)
+        Movimiento.objects.create(producto=self.producto, tipo='TRANSFER', cantidad=4, origen=self.bodega, destino=self.apto)
+        otro = Producto.objects.create(codigo="P-002", nombre="Vaso", categoria='Kitchen', precio_costo=1, precio_venta=2)
+        Inventario.objects.create(producto=otro, ubicacion=self.apto, cantidad=6)  # stock cargado sin movimientos
+        AsientoStock.objects.all().delete()
+
+        import_module('Inventario.migrations.0009_libro_stock').poblar_libro(django_apps, None)
+
+        self.assertEqual(diferencias_libro(), [])
+        self.assertEqual(AsientoStock.objects.filter(movimiento__isnull=False).count(), 3)
+        apertura = AsientoStock.objects.get(movimiento__isnull=True)
+        self.assertEqual((apertura.producto_id, apertura.ubicacion_id, apertura.cantidad), (otro.id, self.apto.id, 6))
+
+
+class ReferenciasTests(TransactionTestCase):
+    HILOS = 16
+    RESERVAS = 10_000
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("SQLite en memoria no admite escrituras concurrentes entre hilos.")
+        self.bodega, self.apto, self.producto = crear_catalogo_basico()
+
+    def en_paralelo(self, funcion, argumentos):
+        def tarea(arg):
+            try:
+                return funcion(arg)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.HILOS) as pool:
+            return list(pool.map(tarea, argumentos))
+
+    def test_reservas_concurrentes_no_se_repiten(self):
+        # 10k reservas sueltas más 200 lotes de 5, todas en paralelo
+        lotes = self.en_paralelo(lambda i: reservar('movimiento', 1 if i < self.RESERVAS else 5), range(self.RESERVAS + 200))
+
+        numeros = [n for lote in lotes for n in lote]
+        self.assertEqual(len(numeros), self.RESERVAS + 1000)
+        self.assertEqual(len(set(numeros)), len(numeros))
+        self.assertTrue(all(lote == list(range(lote[0], lote[0] + len(lote))) for lote in lotes))
+
+    def test_listas_concurrentes_sin_colisiones(self):
+        listas = self.en_paralelo(lambda _: ListaCompra.objects.create().id_lista, range(300))
+        self.assertEqual(len(set(listas)), 300)
+        self.assertRegex(listas[0], r'^SHOP-\d{6}-\d{7}$')
+
+    def test_lote_reserva_todas_las_referencias_en_una_consulta(self):
+        filas = [
+            {'producto_id': self.producto.id, 'tipo': 'IN', 'cantidad': 1, 'fecha': date(2025, 1, 1),
+             'origen_id': None, 'destino_id': self.bodega.id}
+            for _ in range(300)
+        ]
+        with CaptureQueriesContext(connection) as consultas:
+            registrar_movimientos_en_lote(filas)
+        self.assertEqual(sum('contadorreferencia' in q['sql'] for q in consultas.captured_queries), 1)
+
+        referencias = list(Movimiento.objects.order_by('id').values_list('referencia', flat=True))
+        self.assertEqual(len(set(referencias)), 300)
+        self.assertTrue(all(re.fullmatch(r'IN-\d{6}-\d{7}', r) for r in referencias))
+        self.assertEqual([int(r[-7:]) for r in referencias], list(range(1, 301)))
+
+        transferencia = Movimiento.objects.create(producto=self.producto, tipo='TRANSFER', cantidad=1, origen=self.bodega, destino=self.apto)
+        self.assertTrue(transferencia.referencia.endswith('-0000301'))
+        self.assertTrue(transferencia.referencia.startswith('TRF-'))
+
+    def test_serie_desconocida(self):
+        with self.assertRaises(ValueError):
+            reservar('factura')
+        self.assertEqual(reservar('movimiento', 0), [])
@@ -11,6 +11,7 @@ urlpatterns = [
     path('productos/', views.ProductoListView.as_view(), name='producto_list'),
     path('productos/nuevo/', views.ProductoCreateView.as_view(), name='producto_create'),
     path('productos/editar/<int:pk>/', views.ProductoUpdateView.as_view(), name='producto_edit'),
+    path('api/productos/buscar/', views.producto_autocomplete, name='producto_autocomplete'),
 
     # Proveedores
     path('proveedores/', views.ProveedorListView.as_view(), name='proveedor_list'),
@@ -21,17 +22,25 @@ urlpatterns = [
     path('destinos/', views.DestinoListView.as_view(), name='destino_list'),
     path('destinos/nuevo/', views.DestinoCreateView.as_view(), name='destino_create'),
     path('destinos/editar/<int:pk>/', views.DestinoUpdateView.as_view(), name='destino_edit'),
+    path('api/destinos/buscar/', views.destino_autocomplete, name='destino_autocomplete'),
 
     # Movimientos
     path('movimientos/nuevo/', views.MovimientoCreateView.as_view(), name='movimiento_create'),
+    path('api/movimientos/lote/', views.movimientos_lote, name='movimientos_lote'),
     
     # Reportes
     path('reportes/movimientos/', views.reporte_movimientos, name='reporte_movimientos'),
     path('reportes/bodegas/', views.reporte_bodegas, name='reporte_bodegas'),
+    path('api/bodegas/<int:pk>/items/', views.bodega_items, name='bodega_items'),
     path('api/chat-ai/', views.chat_inventario, name='chat_inventario'),
+    path('api/chat-ai/stream/', views.chat_inventario_stream, name='chat_inventario_stream'),
+    path('api/chat-ai/stats/', views.chat_cache_stats, name='chat_cache_stats'),
+    path('api/chat-ai/reporte/', views.chat_reporte, name='chat_reporte'),
+    path('api/tareas/<int:pk>/', views.tarea_estado, name='tarea_estado'),
     path('reportes/financiero/', views.reporte_financiero, name='reporte_financiero'),
     path('shopping-list/', views.shopping_list_index, name='shopping_list'), # Lista de todas las órdenes
     path('shopping-list/crear/', views.generar_lista, name='generar_lista'), # Acción de crear
     path('shopping-list/<int:pk>/', views.shopping_list_detail, name='shopping_list_detail'), # Detalle individual
+    path('shopping-list/<int:pk>/calendario/', views.shopping_list_calendar, name='shopping_list_calendar'), # Evento en segundo plano
 
 ]
\ No newline at end of file
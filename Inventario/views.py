@@ -2,244 +2,179 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView, CreateView, UpdateView
+from django.db import transaction
 from django.db.models import Avg, Max, Min, Sum, F, Q, Count
+from django.core.paginator import Paginator
 import statistics 
 import urllib.parse # <--- AGREGA ESTO AL PRINCIPIO DEL ARCHIVO SI NO ESTÁ
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.core.exceptions import ValidationError
 from django.utils import timezone 
-from .models import Producto, Movimiento, Proveedor, Destino, Inventario, ListaCompra, ItemLista
+from .models import Producto, Movimiento, Proveedor, Destino, Inventario, ListaCompra, ItemLista, Tarea
 from django.views.generic import ListView, CreateView, UpdateView
 from .forms import ProductoForm, MovimientoForm, ProveedorForm, DestinoForm
 import csv
 import json
+import logging
+import time
+from datetime import date
 from django.conf import settings
-import uuid  # <--- ESTA ERA LA LIBRERÍA QUE FALTABA
-from datetime import timedelta
-from openai import OpenAI
-from django.http import JsonResponse, HttpResponse
-from django.views.decorators.csrf import csrf_exempt
-from .utils import create_google_calendar_event # Asegúrate de tener utils.py creado
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from .tareas import como_dict, encolar
+from .services import registrar_movimientos_en_lote, resolver_filas
+from .cortes import items_de_sitio_en
+from .referencias import formatear, reservar
+from .reports import (
+    kpis_dashboard, pagina_movimientos, total_aproximado, resumen_bodegas, items_de_sitio,
+    salidas_financieras, salidas_por_referencia, valor_bodegas, costos_por_unidad,
+    LISTAS_POR_PAGINA, listas_con_totales, items_de_lista, totales_lista,
+)
+from .exports import CHUNK_SIZE, filas_de, respuesta_csv
+from .ai_cache import respuestas_ia
+from .search import buscar_productos, pagina_autocompletar, pagina_destinos
+
+logger = logging.getLogger(__name__)
 
 # ==============================================================================
-# ELITE BRAIN: ARTIFICIAL INTELLIGENCE MODULE (ENGLISH VERSION)
+# ELITE BRAIN: CHAT ENDPOINTS
 # ==============================================================================
+# Async views: under ASGI (Elite_brand/asgi.py) a chat waiting on the LLM only holds
+# a coroutine, not a worker. The ORM work (context building) runs in a thread via
+# sync_to_async so it never blocks the event loop.
+# The service (and the OpenAI SDK) lives in ai_service.py and is imported on the
+# first chat, so workers boot with Django only.
 
-class EliteIntelligenceService:
+def _new_ai_service(user):
+    from .ai_service import EliteIntelligenceService
+    return EliteIntelligenceService(user)
+
+
+async def _start_chat(request):
     """
-    Advanced Business Intelligence Service.
-    Language: ENGLISH (Output) / MULTI-LANGUAGE (Input).
-    Capabilities: Financial Analysis, Operational Audit, Report Generation.
+    Validates the request and builds the AI context.
+    Returns (service, question, history, context, cache_key, cached_answer) or a JsonResponse;
+    on a cache hit the context is not built (context is None).
     """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
+    try:
+        pregunta_usuario = json.loads(request.body).get('pregunta', '').strip()
+    except (ValueError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+    if not pregunta_usuario:
+        return JsonResponse({'status': 'error', 'message': 'Empty query'})
 
-    def __init__(self, user):
-        self.user = user
-        self.today = timezone.now().date()
-        self.client = OpenAI(
-            api_key=settings.DEEPSEEK_API_KEY,
-            base_url=settings.DEEPSEEK_BASE_URL
-        )
+    # Session Memory
+    historial = await request.session.aget('elite_chat_history', [])
+    ai_service = await sync_to_async(_new_ai_service)(await request.auser())  # first call imports the SDK off the loop
+    cache_key = await sync_to_async(ai_service.response_cache_key)(pregunta_usuario, historial)
+    cached_answer = respuestas_ia.obtener(cache_key) if cache_key else None
+    system_context = None
+    if cached_answer is None:
+        system_context = await sync_to_async(ai_service.build_context)(pregunta_usuario, historial)
+    return ai_service, pregunta_usuario, historial, system_context, cache_key, cached_answer
 
-    def _get_financial_metrics(self):
-        """Generates deep financial analysis."""
-        total_assets = sum(p.valor_total for p in Producto.objects.all())
-        
-        start_month = self.today - timedelta(days=30)
-        expenses_30d = Movimiento.objects.filter(
-            tipo__in=['OUT', 'REPLACEMENT'],
-            fecha__gte=start_month
-        ).aggregate(total=Sum(F('cantidad') * F('producto__precio_venta')))['total'] or 0
-
-        # Historical Total Expenses
-        expenses_historical = Movimiento.objects.filter(
-            tipo__in=['OUT', 'REPLACEMENT']
-        ).aggregate(total=Sum(F('cantidad') * F('producto__precio_venta')))['total'] or 0
-
-        top_units_query = Movimiento.objects.filter(
-            tipo__in=['OUT', 'REPLACEMENT'], 
-            destino__isnull=False
-        ).values('destino__nombre', 'destino__tipo').annotate(
-            total_expense=Sum(F('cantidad') * F('producto__precio_venta'))
-        ).order_by('-total_expense')[:5]
-
-        top_units = [
-            f"- {u['destino__nombre']} ({u['destino__tipo']}): ${u['total_expense']:,.2f}" 
-            for u in top_units_query
-        ]
-
-        return {
-            "total_assets": total_assets,
-            "expenses_30d": expenses_30d,
-            "expenses_historical": expenses_historical,
-            "top_units_list": top_units
-        }
 
-    def _get_inventory_health(self):
-        """Inventory Health Diagnostics."""
-        critical = Producto.objects.filter(stock_total_global__lte=0)
-        low_stock = Producto.objects.filter(stock_total_global__lte=F('stock_minimo'), stock_total_global__gt=0)
-        
-        top_value = Producto.objects.annotate(
-            val=F('stock_total_global') * F('precio_venta')
-        ).order_by('-val')[:5]
-
-        return {
-            "critical_count": critical.count(),
-            "critical_names": [p.nombre for p in critical[:5]],
-            "low_stock_count": low_stock.count(),
-            "top_value": [f"{p.nombre}: ${p.valor_total:,.2f}" for p in top_value]
-        }
+async def _save_history(request, historial, pregunta_usuario, respuesta_ia):
+    historial.append({'role': 'user', 'content': pregunta_usuario})
+    historial.append({'role': 'ai', 'content': respuesta_ia})
+    await request.session.aset('elite_chat_history', historial[-6:])
 
-    def _get_operational_logs(self):
-        """Operational Audit Logs."""
-        movs_today = Movimiento.objects.filter(fecha=self.today).select_related('usuario', 'producto').order_by('-id')
-        details_today = []
-        for m in movs_today[:8]:
-            details_today.append(
-                f"[{m.fecha.strftime('%H:%M')}] {m.get_tipo_display()}: {m.cantidad}x {m.producto.nombre} "
-                f"(User: {m.usuario.username if m.usuario else 'System'})"
-            )
-        return {"total_today": movs_today.count(), "details": details_today}
-
-    def _detect_intent(self, query):
-        """
-        Heuristic Intent Detection.
-        Understands both English and Spanish keywords.
-        """
-        query = query.lower()
-        intents = []
-        
-        # Keywords (Mixed English/Spanish to understand user input)
-        kw_finance = ['dinero', 'costo', 'gasto', 'valor', 'precio', 'money', 'cost', 'expense', 'price', 'budget', 'financi']
-        kw_inventory = ['stock', 'cantidad', 'falta', 'sobra', 'producto', 'inventory', 'warehouse', 'bodega', 'item']
-        kw_ops = ['quien', 'cuando', 'movimiento', 'who', 'when', 'movement', 'log', 'user', 'usuario']
-
-        if any(k in query for k in kw_finance): intents.append('finance')
-        if any(k in query for k in kw_inventory): intents.append('inventory')
-        if any(k in query for k in kw_ops): intents.append('ops')
-        
-        if not intents: return ['finance', 'inventory', 'ops']
-        return intents
-
-    def build_context(self, user_query, chat_history):
-        """
-        Builds the System Prompt in English.
-        """
-        intents = self._detect_intent(user_query)
-        context_parts = []
-        
-        fin_data = self._get_financial_metrics()
-        inv_data = self._get_inventory_health()
-        ops_data = self._get_operational_logs()
-
-        # System Header
-        context_parts.append(
-            f"CURRENT DATE: {self.today.strftime('%Y-%m-%d')}\n"
-            f"USER: {self.user.username}\n"
-            "ROLE: You are 'Elite AI', a Senior Financial & Logistics Analyst. "
-            "Your language is ENGLISH. You can read/understand Spanish input, but you must ALWAYS REPLY IN ENGLISH. "
-            "Be professional, concise, and data-driven.\n"
-        )
 
-        # 1. Financial Data Injection
-        if 'finance' in intents:
-            context_parts.append(
-                "\n--- 💰 FINANCIAL REPORT ---\n"
-                f"* Total Assets Value (Inventory): ${fin_data['total_assets']:,.2f}\n"
-                f"* Historical Total Expenses: ${fin_data['expenses_historical']:,.2f}\n"
-                f"* Expenses (Last 30 Days): ${fin_data['expenses_30d']:,.2f}\n"
-                "* Top 5 Most Expensive Units (Cost Centers):\n" + "\n".join(fin_data['top_units_list'])
-            )
+@login_required
+async def chat_inventario(request):
+    """JSON endpoint (full answer in one response)."""
+    inicio = await _start_chat(request)
+    if isinstance(inicio, JsonResponse):
+        return inicio
+    ai_service, pregunta_usuario, historial, system_context, cache_key, respuesta_ia = inicio
+
+    if respuesta_ia is None:
+        started = time.perf_counter()
+        try:
+            respuesta_ia = ''.join([t async for t in ai_service.ask_deepseek_stream(system_context, pregunta_usuario)])
+        except Exception as e:
+            logger.exception("AI error in chat_inventario")
+            respuesta_ia = f"Critical AI Error: {str(e)}"
+        else:
+            if cache_key:
+                respuestas_ia.guardar(cache_key, respuesta_ia, time.perf_counter() - started)
+        cached = False
+    else:
+        cached = True
 
-        # 2. Inventory Data Injection
-        if 'inventory' in intents:
-            context_parts.append(
-                "\n--- 📦 INVENTORY HEALTH ---\n"
-                f"* Critical Items (Out of Stock): {inv_data['critical_count']} "
-                f"(e.g., {', '.join(inv_data['critical_names'])})\n"
-                f"* Low Stock Items: {inv_data['low_stock_count']}\n"
-                "* Top 5 High Value Items:\n" + "\n  ".join(inv_data['top_value'])
-            )
+    await _save_history(request, historial, pregunta_usuario, respuesta_ia)
+    return JsonResponse({'status': 'success', 'respuesta': respuesta_ia, 'cached': cached})
 
-        # 3. Operational Data Injection
-        if 'ops' in intents:
-            context_parts.append(
-                "\n--- ⚙️ OPERATIONAL LOGS ---\n"
-                f"* Movements Today: {ops_data['total_today']}\n"
-                "* Recent Logs (Today):\n" + "\n".join(ops_data['details'])
-            )
 
-        # 4. EXCEL GENERATION MANUAL (ENGLISH)
-        context_parts.append(
-            "\n=== EXCEL REPORT GENERATION MANUAL ===\n"
-            "If the user asks to download, generate, or export an Excel file (even in Spanish), generate a Markdown link using this structure:\n"
-            "Base URL: `/reportes/financiero/?export=excel_financiero`\n"
-            "Parameters:\n"
-            "1. `type=salidas_detalladas` -> For general logs, detailed movements.\n"
-            "2. `type=unidades` -> For costs by Unit, Apartment, or Site.\n"
-            "3. `type=por_referencia` -> For costs grouped by Operation Reference.\n"
-            "4. `start_date=YYYY-MM-DD` & `end_date=YYYY-MM-DD` -> Optional filters.\n\n"
-            "RESPONSE EXAMPLES:\n"
-            "- User: 'Quiero un excel de gastos por unidad'\n"
-            "  You: 'Here is the report requested: [Download Unit Cost Report](/reportes/financiero/?export=excel_financiero&type=unidades)'\n"
-        )
+def _sse(data, event=None):
+    prefijo = f"event: {event}\n" if event else ""
+    return f"{prefijo}data: {json.dumps(data)}\n\n"
 
-        # 5. Conversation Memory
-        if chat_history:
-            context_parts.append("\n--- 🧠 RECENT CHAT HISTORY ---")
-            for msg in chat_history[-2:]:
-                role = "User" if msg['role'] == 'user' else "Elite AI"
-                context_parts.append(f"{role}: {msg['content']}")
 
-        return "\n".join(context_parts)
+@login_required
+async def chat_inventario_stream(request):
+    """
+    Server-Sent Events endpoint: one `data: {"delta": ...}` event per token,
+    then `event: done` (or `event: error`). History is saved once the answer is complete.
+    A cached answer is sent as a single delta.
+    """
+    inicio = await _start_chat(request)
+    if isinstance(inicio, JsonResponse):
+        return inicio
+    ai_service, pregunta_usuario, historial, system_context, cache_key, cached_answer = inicio
+
+    async def eventos():
+        if cached_answer is not None:
+            respuesta_ia = cached_answer
+            yield _sse({'delta': cached_answer})
+        else:
+            partes = []
+            started = time.perf_counter()
+            try:
+                async for token in ai_service.ask_deepseek_stream(system_context, pregunta_usuario):
+                    partes.append(token)
+                    yield _sse({'delta': token})
+            except Exception as e:
+                logger.exception("AI error in chat_inventario_stream")
+                yield _sse({'message': f"Critical AI Error: {e}"}, event='error')
+                return
+            respuesta_ia = ''.join(partes)
+            if cache_key:
+                respuestas_ia.guardar(cache_key, respuesta_ia, time.perf_counter() - started)
+
+        # The response headers (and session cookie) are already sent: persist explicitly
+        await _save_history(request, historial, pregunta_usuario, respuesta_ia)
+        await request.session.asave()
+        yield _sse({'status': 'success', 'cached': cached_answer is not None}, event='done')
+
+    response = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: do not buffer the stream
+    return response
+
+@login_required
+def chat_cache_stats(request):
+    """Hit/miss counters of the AI response cache (this worker)."""
+    return JsonResponse({'status': 'success', **respuestas_ia.estadisticas()})
 
-    def ask_deepseek(self, system_context, user_question):
-        try:
-            response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": system_context},
-                    {"role": "user", "content": user_question},
-                ],
-                temperature=0.3,
-                stream=False
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            return f"Critical AI Error: {str(e)}"
 
-# --- API ENDPOINT ---
-@csrf_exempt
 @login_required
-def chat_inventario(request):
+def chat_reporte(request):
+    """Queues a full AI report (background job); the UI polls tarea_estado for the answer."""
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
-
     try:
-        data = json.loads(request.body)
-        pregunta_usuario = data.get('pregunta', '').strip()
-
-        if not pregunta_usuario:
-            return JsonResponse({'status': 'error', 'message': 'Empty query'})
-
-        # Session Memory
-        historial = request.session.get('elite_chat_history', [])
-        
-        # AI Processing
-        ai_service = EliteIntelligenceService(request.user)
-        system_context = ai_service.build_context(pregunta_usuario, historial)
-        respuesta_ia = ai_service.ask_deepseek(system_context, pregunta_usuario)
-
-        # Update History
-        historial.append({'role': 'user', 'content': pregunta_usuario})
-        historial.append({'role': 'ai', 'content': respuesta_ia})
-        request.session['elite_chat_history'] = historial[-6:]
-
-        return JsonResponse({'status': 'success', 'respuesta': respuesta_ia})
-
-    except Exception as e:
-        print(f"AI ERROR: {e}")
-        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+        pregunta_usuario = json.loads(request.body).get('pregunta', '').strip()
+    except (ValueError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+    if not pregunta_usuario:
+        return JsonResponse({'status': 'error', 'message': 'Empty query'})
+    tarea = encolar('ai_report', {'pregunta': pregunta_usuario}, usuario=request.user)
+    return JsonResponse({
+        'status': 'success', 'job_id': tarea.pk, 'poll_url': reverse('tarea_estado', args=[tarea.pk]),
+    }, status=202)
 
 # --- (MANTÉN TUS OTRAS VISTAS AQUÍ: dashboard, reportes, productos...) ---
 # --- NO BORRES LAS VISTAS EXISTENTES, SOLO REEMPLAZA LA CLASE Y LA FUNCIÓN DE CHAT ARRIBA ---
@@ -254,121 +189,46 @@ def dashboard(request):
     - Lista Resumen de Valor por Bodega (Solicitud Anthony).
     - Chatbot IA.
     """
-    # 1. DATOS GENERALES
-    productos = Producto.objects.all()
-    # Calculamos el valor total sumando la propiedad valor_total de cada producto
-    valor_inventario = sum(p.valor_total for p in productos)
-    
-    alertas = productos.filter(stock_total_global__lte=F('stock_minimo')).count()
-    productos_bajo_stock = productos.filter(stock_total_global__lte=F('stock_minimo'))[:5]
+    # 1. DATOS GENERALES (snapshot cacheado, se invalida al postear movimientos)
+    kpis = kpis_dashboard()
+    productos_alerta = Producto.objects.filter(stock_total_global__lte=F('stock_minimo'))
+    productos_bajo_stock = productos_alerta[:5]
     ultimos_movimientos = Movimiento.objects.select_related('producto', 'origen', 'destino', 'usuario').order_by('-fecha', '-id')[:10]
 
     # 2. LOGICA DE EXPORTACIÓN (EXCEL)
     if request.GET.get('export') == 'dashboard_excel':
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="Elite_Dashboard_Report.csv"'
-        writer = csv.writer(response)
-
-        writer.writerow(['--- GENERAL METRICS ---'])
-        writer.writerow(['Total Products', productos.count()])
-        writer.writerow(['Total Inventory Value ($)', valor_inventario])
-        writer.writerow(['Low Stock Alerts', alertas])
-        writer.writerow([])
-
-        writer.writerow(['--- CRITICAL STOCK ALERTS ---'])
-        writer.writerow(['Code', 'Product', 'Current Stock', 'Min Stock', 'Category'])
-        for p in productos.filter(stock_total_global__lte=F('stock_minimo')):
-            writer.writerow([p.codigo, p.nombre, p.stock_total_global, p.stock_minimo, p.categoria])
-            
-        return response
-
-    # 3. DATOS PARA GRÁFICA DE PASTEL/DONA (Categorías)
-    data_categorias = Producto.objects.values('categoria').annotate(total=Count('id')).order_by('-total')
-    labels_cat = [item['categoria'] for item in data_categorias]
-    data_cat = [item['total'] for item in data_categorias]
-
-    # 4. DATOS PARA LISTA RESUMEN (Valor por Bodega)
-    # En lugar de mandar arrays para Chart.js, mandamos una lista de diccionarios para la tabla HTML
-    destinos = Destino.objects.all()
-    bodegas_summary = []
-    
-    for d in destinos:
-        items = Inventario.objects.filter(ubicacion=d)
-        valor_sitio = sum(i.cantidad * i.producto.precio_venta for i in items)
-        
-        # Solo agregamos si hay algo relevante (valor o items)
-        if valor_sitio > 0 or items.exists():
-            bodegas_summary.append({
-                'name': d.nombre,
-                'type': d.tipo,
-                'total_items': items.count(),
-                'value': float(valor_sitio) # Float para evitar errores de serialización si fuera necesario
-            })
-            
-    # Ordenamos la lista: Bodegas con más valor primero
-    bodegas_summary.sort(key=lambda x: x['value'], reverse=True)
-
+        def filas():
+            yield ['--- GENERAL METRICS ---']
+            yield ['Total Products', kpis['total_productos']]
+            yield ['Total Inventory Value ($)', kpis['valor_inventario']]
+            yield ['Low Stock Alerts', kpis['alertas']]
+            yield []
+            yield ['--- CRITICAL STOCK ALERTS ---']
+            yield ['Code', 'Product', 'Current Stock', 'Min Stock', 'Category']
+            yield from filas_de(productos_alerta, 'codigo', 'nombre', 'stock_total_global', 'stock_minimo', 'categoria')
+
+        return respuesta_csv('Elite_Dashboard_Report.csv', filas())
+
+    # 3. DATOS PARA GRÁFICA DE PASTEL/DONA (Categorías) Y LISTA RESUMEN (Valor por Bodega)
+    # Ambos vienen agregados desde la BD (un GROUP BY cada uno), ya ordenados
     context = {
-        'total_productos': productos.count(),
-        'valor_inventario': valor_inventario,
-        'alertas_bajo_stock': alertas,
+        'total_productos': kpis['total_productos'],
+        'valor_inventario': kpis['valor_inventario'],
+        'alertas_bajo_stock': kpis['alertas'],
         'ultimos_movimientos': ultimos_movimientos,
         'productos_bajo_stock': productos_bajo_stock,
-        'movimientos_hoy': Movimiento.objects.filter(fecha=timezone.now().date()).count(),
+        'movimientos_hoy': kpis['movimientos_hoy'],
         
         # Datos JSON para la Gráfica de Dona (Izquierda)
-        'chart_cat_labels': json.dumps(labels_cat),
-        'chart_cat_data': json.dumps(data_cat),
+        'chart_cat_labels': json.dumps(kpis['chart_cat_labels']),
+        'chart_cat_data': json.dumps(kpis['chart_cat_data']),
         
         # Datos para la Lista Resumen (Derecha)
-        'bodegas_summary': bodegas_summary,
+        'bodegas_summary': kpis['bodegas_summary'],
     }
     return render(request, 'Inventario/dashboard.html', context)
 
 # --- Productos ---
-class ProductoListView(LoginRequiredMixin, ListView):
-    model = Producto
-    template_name = 'Inventario/producto_list.html'
-    context_object_name = 'productos'
-    paginate_by = 15
-
-    def get_queryset(self):
-        queryset = Producto.objects.prefetch_related('inventarios', 'inventarios__ubicacion').all().order_by('nombre')
-        query = self.request.GET.get('q')
-        if query:
-            queryset = queryset.filter(
-                Q(codigo__icontains=query) | 
-                Q(nombre__icontains=query) | 
-                Q(proveedor__nombre__icontains=query)
-            )
-        categoria = self.request.GET.get('categoria')
-        if categoria:
-            queryset = queryset.filter(categoria=categoria)
-        return queryset
-        
-    def get(self, request, *args, **kwargs):
-        if request.GET.get('export') == 'excel':
-            productos = self.get_queryset()
-            bodegas = Destino.objects.all().order_by('nombre')
-
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = 'attachment; filename="Global_Inventory_Report.csv"'
-            writer = csv.writer(response)
-
-            header = ['Code', 'Product Name', 'Category', 'Sale Price', 'Global Stock', 'Total Value']
-            for bodega in bodegas:
-                header.append(f"Stock: {bodega.nombre}")
-            writer.writerow(header)
-
-            for p in productos:
-                stock_por_bodega = {inv.ubicacion_id: inv.cantidad for inv in p.inventarios.all()}
-                row = [p.codigo, p.nombre, p.get_categoria_display(), p.precio_venta, p.stock_global, p.valor_total]
-                for bodega in bodegas:
-                    row.append(stock_por_bodega.get(bodega.id, 0))
-                writer.writerow(row)
-            return response
-        return super().get(request, *args, **kwargs)
-    
 class ProductoCreateView(LoginRequiredMixin, CreateView):
     model = Producto
     form_class = ProductoForm
@@ -448,6 +308,37 @@ class MovimientoCreateView(LoginRequiredMixin, CreateView):
             form.add_error(None, e)
             return self.form_invalid(form)
 
+# --- API: CARGA MASIVA DE MOVIMIENTOS ---
+@login_required
+def movimientos_lote(request):
+    """
+    Recibe {"movimientos": [{producto, tipo, cantidad, fecha, origen, destino, razon_ajuste}, ...]}.
+    Las filas válidas se registran en una sola transacción; las inválidas se reportan por número de fila.
+    Requiere el token CSRF (header X-CSRFToken) y Content-Type application/json.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
+    if request.content_type != 'application/json':
+        return JsonResponse({'status': 'error', 'message': 'Content-Type must be application/json'}, status=415)
+
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+
+    filas_crudas = data.get('movimientos') if isinstance(data, dict) else None
+    if not isinstance(filas_crudas, list) or not all(isinstance(f, dict) for f in filas_crudas):
+        return JsonResponse({'status': 'error', 'message': "'movimientos' must be a list of objects"}, status=400)
+
+    filas, errores = resolver_filas(filas_crudas)
+    resultado = registrar_movimientos_en_lote(filas, usuario=request.user)
+
+    return JsonResponse({
+        'status': 'success',
+        'creados': resultado['creados'],
+        'errores': sorted(errores + resultado['errores'], key=lambda e: e['fila']),
+    })
+
 # --- Reportes ---
 @login_required
 def reporte_movimientos(request):
@@ -467,38 +358,49 @@ def reporte_movimientos(request):
         movimientos = movimientos.filter(tipo=tipo)
 
     if request.GET.get('export') == 'excel':
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="Movement_Analysis.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'Date', 'Reference', 'Type', 'Category', 'Product Code', 'Product Name', 
-            'Quantity', 'Unit Cost ($)', 'Total Value ($)', 'Origin', 'Destination', 'User', 'Notes'
-        ])
-
-        for mov in movimientos:
-            origin_name = mov.origen.nombre if mov.origen else 'N/A'
-            dest_name = mov.destino.nombre if mov.destino else 'N/A'
-            costo = mov.producto.precio_costo if mov.producto.precio_costo else 0
-            
-            writer.writerow([
-                mov.fecha.strftime("%Y-%m-%d"),
-                mov.referencia,
-                mov.get_tipo_display(), 
-                mov.producto.categoria,
-                mov.producto.codigo,
-                mov.producto.nombre,
-                mov.cantidad,
-                costo,
-                costo * mov.cantidad,
-                origin_name,
-                dest_name,
-                mov.usuario.username if mov.usuario else 'System',
-                mov.razon_ajuste
-            ])
-        return response
-
-    return render(request, 'Inventario/reporte_movimientos.html', {'movimientos': movimientos})
+        tipos = dict(Movimiento.TIPO_MOVIMIENTO)
+
+        def filas():
+            yield [
+                'Date', 'Reference', 'Type', 'Category', 'Product Code', 'Product Name', 
+                'Quantity', 'Unit Cost ($)', 'Total Value ($)', 'Origin', 'Destination', 'User', 'Notes'
+            ]
+            for (fecha, referencia, tipo, categoria, codigo, nombre, cantidad, costo,
+                 origen, destino, usuario, notas) in filas_de(
+                movimientos, 'fecha', 'referencia', 'tipo', 'producto__categoria', 'producto__codigo',
+                'producto__nombre', 'cantidad', 'producto__precio_costo', 'origen__nombre', 'destino__nombre',
+                'usuario__username', 'razon_ajuste',
+            ):
+                costo = costo if costo else 0
+                yield [
+                    fecha.strftime("%Y-%m-%d"), referencia, tipos.get(tipo, tipo), categoria, codigo, nombre,
+                    cantidad, costo, costo * cantidad, origen or 'N/A', destino or 'N/A', usuario or 'System', notas
+                ]
+
+        return respuesta_csv('Movement_Analysis.csv', filas())
+
+    # Paginación keyset: los cursores viajan en la URL junto con los filtros
+    pagina, cursor_siguiente, cursor_anterior = pagina_movimientos(
+        movimientos, despues=request.GET.get('despues'), antes=request.GET.get('antes')
+    )
+    total, es_aproximado = total_aproximado(movimientos)
+
+    def url_pagina(clave, cursor):
+        if not cursor:
+            return None
+        params = request.GET.copy()
+        for c in ('despues', 'antes', 'export'):
+            params.pop(c, None)
+        params[clave] = cursor
+        return f"?{params.urlencode()}"
+
+    return render(request, 'Inventario/reporte_movimientos.html', {
+        'movimientos': pagina,
+        'url_siguiente': url_pagina('despues', cursor_siguiente),
+        'url_anterior': url_pagina('antes', cursor_anterior),
+        'total_movimientos': total,
+        'total_es_aproximado': es_aproximado,
+    })
 
 @login_required
 def reporte_bodegas(request):
@@ -509,58 +411,75 @@ def reporte_bodegas(request):
     """
     # 1. EXPORTACIÓN GENERAL
     if request.GET.get('export') == 'general_excel':
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="General_Inventory_All_Sites.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Warehouse/Site', 'Product Code', 'Product Name', 'Category', 'Quantity', 'Unit Price', 'Total Value'])
-        
-        items = Inventario.objects.filter(cantidad__gt=0).select_related('ubicacion', 'producto').order_by('ubicacion__nombre', 'producto__nombre')
-        for item in items:
-            writer.writerow([
-                item.ubicacion.nombre, item.producto.codigo, item.producto.nombre,
-                item.producto.categoria, item.cantidad, item.producto.precio_venta,
-                item.cantidad * item.producto.precio_venta
-            ])
-        return response
+        items = Inventario.objects.filter(cantidad__gt=0).order_by('ubicacion__nombre', 'producto__nombre')
+
+        def filas():
+            yield ['Warehouse/Site', 'Product Code', 'Product Name', 'Category', 'Quantity', 'Unit Price', 'Total Value']
+            for sitio, codigo, nombre, categoria, cantidad, precio in filas_de(
+                items, 'ubicacion__nombre', 'producto__codigo', 'producto__nombre', 'producto__categoria', 'cantidad', 'producto__precio_venta'
+            ):
+                yield [sitio, codigo, nombre, categoria, cantidad, precio, cantidad * precio]
+
+        return respuesta_csv('General_Inventory_All_Sites.csv', filas())
 
     # 2. EXPORTACIÓN INDIVIDUAL
     if request.GET.get('export') == 'excel' and request.GET.get('bodega_id'):
         bodega_id = request.GET.get('bodega_id')
         destino = get_object_or_404(Destino, pk=bodega_id)
         
-        items = Inventario.objects.filter(ubicacion=destino, cantidad__gt=0).select_related('producto')
-        
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="Inventory_{destino.nombre}.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Product Code', 'Product Name', 'Category', 'Quantity', 'Unit Price', 'Total Value'])
-        for item in items:
-            writer.writerow([
-                item.producto.codigo, item.producto.nombre, item.producto.categoria,
-                item.cantidad, item.producto.precio_venta, item.cantidad * item.producto.precio_venta
-            ])
-        return response
+        items = Inventario.objects.filter(ubicacion=destino, cantidad__gt=0)
+
+        def filas():
+            yield ['Product Code', 'Product Name', 'Category', 'Quantity', 'Unit Price', 'Total Value']
+            for codigo, nombre, categoria, cantidad, precio in filas_de(
+                items, 'producto__codigo', 'producto__nombre', 'producto__categoria', 'cantidad', 'producto__precio_venta'
+            ):
+                yield [codigo, nombre, categoria, cantidad, precio, cantidad * precio]
+
+        return respuesta_csv(f'Inventory_{destino.nombre}.csv', filas())
 
     # 3. VISTA HTML
-    destinos = Destino.objects.all()
-    inventario_completo = []
-    
-    for destino in destinos:
-        items = Inventario.objects.filter(ubicacion=destino, cantidad__gt=0).select_related('producto')
-        if items.exists():
-            inventario_completo.append({
-                'sitio': destino,
-                'items': items,
-                'total_items': sum(i.cantidad for i in items),
-                'valor_total': sum(i.cantidad * i.producto.precio_venta for i in items)
-            })
-            
+    # Solo los totales por sitio (un GROUP BY); las líneas de cada sitio se piden
+    # a bodega_items cuando el usuario lo expande.
+    inventario_completo = [
+        {
+            'sitio': {'id': fila['ubicacion_id'], 'nombre': fila['ubicacion__nombre'], 'direccion': fila['ubicacion__direccion']},
+            'lineas': fila['lineas'],
+            'total_items': fila['total_items'],
+            'valor_total': fila['valor_total'],
+        }
+        for fila in resumen_bodegas()
+    ]
+
     return render(request, 'Inventario/reporte_bodegas.html', {
         'inventario_completo': inventario_completo
     })
 
+@login_required
+def bodega_items(request, pk):
+    """
+    API liviana: líneas de stock de un sitio para el acordeón de reporte_bodegas.
+    Con ?fecha=AAAA-MM-DD retorna el stock que tenía al cierre de ese día (cortes.py).
+    """
+    destino = get_object_or_404(Destino, pk=pk)
+    fecha = request.GET.get('fecha')
+    if fecha:
+        try:
+            fecha = date.fromisoformat(fecha)
+        except ValueError:
+            return JsonResponse({'status': 'error', 'message': 'Invalid date (use YYYY-MM-DD)'}, status=400)
+    items = [
+        {
+            'codigo': i['producto__codigo'],
+            'nombre': i['producto__nombre'],
+            'categoria': i['producto__categoria'],
+            'cantidad': i['cantidad'],
+            'precio_venta': str(i['producto__precio_venta']),
+        }
+        for i in (items_de_sitio_en(destino.pk, fecha) if fecha else items_de_sitio(destino.pk))
+    ]
+    return JsonResponse({'status': 'success', 'sitio': destino.nombre, 'fecha': fecha and fecha.isoformat(), 'items': items})
+
 # --- REPORTE FINANCIERO (CUMPLIENDO REQUERIMIENTOS DE ANTHONY) ---
 @login_required
 def reporte_financiero(request):
@@ -576,68 +495,39 @@ def reporte_financiero(request):
     end_date = request.GET.get('end_date')
 
     # A. RESUMEN DE SALIDAS GENERAL (Todo lo que sea OUT o REPLACEMENT)
-    salidas = Movimiento.objects.filter(tipo__in=['OUT', 'REPLACEMENT']).select_related('producto', 'origen', 'destino', 'usuario').order_by('-fecha')
-    
-    if start_date and end_date:
-        salidas = salidas.filter(fecha__range=[start_date, end_date])
+    salidas = salidas_financieras(start_date, end_date)
 
     # B. TOTAL POR GENERACIÓN DE SALIDA (Agrupado por Referencia)
     # Ejemplo: La salida "OUT-251201" sumó $500 en total
-    salidas_por_ref = salidas.values('referencia', 'fecha', 'usuario__username', 'origen__nombre', 'destino__nombre').annotate(
-        total_items=Sum('cantidad'),
-        valor_total=Sum(F('cantidad') * F('producto__precio_venta')) # O precio_costo según prefieras
-    ).order_by('-fecha')
-
-    # C. TOTAL DE BODEGA (Valor actual del inventario por sitio)
-    bodegas = Destino.objects.filter(tipo__icontains='Bodega') # Asumiendo que usas 'Bodega' en el campo tipo
-    data_bodegas = []
-    for b in bodegas:
-        items = Inventario.objects.filter(ubicacion=b)
-        valor = sum(i.cantidad * i.producto.precio_venta for i in items)
-        data_bodegas.append({'nombre': b.nombre, 'items': items.count(), 'valor': valor})
-
-    # D. TOTAL POR UNIDAD (APARTAMENTOS)
-    # Asumiendo que las Unidades son Destinos que NO son bodegas (o tienen tipo 'Apartamento')
-    unidades = Destino.objects.exclude(tipo__icontains='Bodega') 
-    data_unidades = []
-    for u in unidades:
-        # Calculamos cuánto se le ha "Despachado" (Salidas hacia esa unidad)
-        # Nota: Buscamos movimientos donde el DESTINO sea esta unidad
-        movs_hacia_unidad = Movimiento.objects.filter(destino=u, tipo__in=['OUT', 'TRANSFER'])
-        
-        if start_date and end_date:
-            movs_hacia_unidad = movs_hacia_unidad.filter(fecha__range=[start_date, end_date])
-            
-        costo_acumulado = sum(m.cantidad * m.producto.precio_venta for m in movs_hacia_unidad)
-        
-        # Solo agregamos si tiene costos asociados
-        if costo_acumulado > 0:
-            data_unidades.append({'nombre': u.nombre, 'tipo': u.tipo, 'costo_total': costo_acumulado})
+    salidas_por_ref = salidas_por_referencia(salidas)
 
     # --- EXPORTACIÓN A EXCEL (LÓGICA AUTOMÁTICA) ---
     if request.GET.get('export') == 'excel_financiero':
         report_type = request.GET.get('type') # 'salidas', 'unidades', 'bodegas'
-        
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="Reporte_{report_type}.csv"'
-        writer = csv.writer(response)
 
-        if report_type == 'salidas_detalladas':
-            writer.writerow(['Fecha', 'Ref', 'Producto', 'Cant', 'Precio Unit', 'Total', 'Origen', 'Destino/Unidad'])
-            for s in salidas:
-                writer.writerow([s.fecha, s.referencia, s.producto.nombre, s.cantidad, s.producto.precio_venta, s.cantidad * s.producto.precio_venta, s.origen, s.destino])
+        def filas():
+            if report_type == 'salidas_detalladas':
+                yield ['Fecha', 'Ref', 'Producto', 'Cant', 'Precio Unit', 'Total', 'Origen', 'Destino/Unidad']
+                for fecha, referencia, producto, cantidad, precio, origen, destino in filas_de(
+                    salidas, 'fecha', 'referencia', 'producto__nombre', 'cantidad', 'producto__precio_venta', 'origen__nombre', 'destino__nombre'
+                ):
+                    yield [fecha, referencia, producto, cantidad, precio, cantidad * precio, origen, destino]
+
+            elif report_type == 'por_referencia':
+                yield ['Fecha', 'Referencia', 'Usuario', 'Origen', 'Destino', 'Items Totales', 'Valor Total ($)']
+                for s in salidas_por_ref.iterator(chunk_size=CHUNK_SIZE):
+                    yield [s['fecha'], s['referencia'], s['usuario__username'], s['origen__nombre'], s['destino__nombre'], s['total_items'], s['valor_total']]
 
-        elif report_type == 'por_referencia':
-            writer.writerow(['Fecha', 'Referencia', 'Usuario', 'Origen', 'Destino', 'Items Totales', 'Valor Total ($)'])
-            for s in salidas_por_ref:
-                writer.writerow([s['fecha'], s['referencia'], s['usuario__username'], s['origen__nombre'], s['destino__nombre'], s['total_items'], s['valor_total']])
+            elif report_type == 'unidades':
+                yield ['Nombre Unidad', 'Tipo', 'Costo Acumulado ($)']
+                for u in costos_por_unidad(start_date, end_date):
+                    yield [u['nombre'], u['tipo'], u['costo_total']]
 
-        elif report_type == 'unidades':
-            writer.writerow(['Nombre Unidad', 'Tipo', 'Costo Acumulado ($)'])
-            for u in data_unidades:
-                writer.writerow([u['nombre'], u['tipo'], u['costo_total']])
+        return respuesta_csv(f'Reporte_{report_type}.csv', filas())
 
-        return response
+    # C. TOTAL DE BODEGA y D. TOTAL POR UNIDAD (APARTAMENTOS): un GROUP BY cada uno
+    data_bodegas = valor_bodegas()
+    data_unidades = costos_por_unidad(start_date, end_date)
 
     context = {
         'salidas': salidas[:20], # Mostramos solo las ultimas 20 en pantalla
@@ -663,20 +553,16 @@ def shopping_list(request):
             return render(request, 'Inventario/shopping_list.html', {**context, 'error': 'No items to buy.'})
         
         # Generar ID de Lista
-        list_id = f"SHOP-{timezone.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:4].upper()}"
+        list_id = formatear("SHOP", reservar('lista_compra')[0])
         
         # Crear texto para el evento
         summary = f"🛒 Shopping List Reminder: {list_id}"
         description = f"Purchase required for {items_to_buy.count()} critical items.\n\nList ID: {list_id}\nGenerated by Elite Management System."
         
-        # Llamar a la API de Google
-        calendar_link = create_google_calendar_event(summary, description)
-        
-        if calendar_link:
-            context['success'] = f"Reminder created in Google Calendar! List ID: {list_id}"
-            context['calendar_link'] = calendar_link
-        else:
-            context['error'] = "Could not connect to Google Calendar. Check server logs/credentials."
+        # La llamada a Google la hace el worker (run_worker): el request responde al instante
+        tarea = encolar('calendar_event', {'summary': summary, 'description': description}, usuario=request.user)
+        context['success'] = f"Reminder queued for Google Calendar (job #{tarea.pk}). List ID: {list_id}"
+        context['job_url'] = reverse('tarea_estado', args=[tarea.pk])
 
     return render(request, 'Inventario/shopping_list.html', context)
 
@@ -692,29 +578,50 @@ def generar_lista(request):
             # Handle empty selection
             return redirect('producto_list')
 
-        # Create the List Header
-        nueva_lista = ListaCompra.objects.create(
-            usuario=request.user,
-            estado='PENDING'
+        # Header + items in one transaction: one INSERT for the list, one bulk INSERT for all items
+        productos = Producto.objects.filter(id__in=[i for i in selected_ids if i.isdigit()]).only(
+            'id', 'stock_minimo', 'stock_total_global'
         )
-
-        # Create Items
-        productos = Producto.objects.filter(id__in=selected_ids)
-        for p in productos:
-            # Calculate suggested quantity (Min Stock - Current Stock, or just 1)
-            deficit = p.stock_minimo - p.stock_total_global
-            qty = deficit if deficit > 0 else 1
-            
-            ItemLista.objects.create(
-                lista=nueva_lista,
-                producto=p,
-                cantidad_sugerida=qty
+        with transaction.atomic():
+            nueva_lista = ListaCompra.objects.create(
+                usuario=request.user,
+                estado='PENDING'
             )
+            # Suggested quantity: Min Stock - Current Stock, or just 1
+            ItemLista.objects.bulk_create([
+                ItemLista(
+                    lista=nueva_lista,
+                    producto=p,
+                    cantidad_sugerida=max(p.stock_minimo - p.stock_total_global, 1)
+                )
+                for p in productos
+            ], batch_size=500)
         
         return redirect('shopping_list_detail', pk=nueva_lista.id)
     
     return redirect('producto_list')
 
+def _entero(valor, defecto=None):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return defecto
+
+
+@login_required
+def producto_autocomplete(request):
+    """Autocompletado de productos para los Select2 (ajax): ?q=texto&page=n."""
+    pagina = _entero(request.GET.get('page'), 1)
+    return JsonResponse(pagina_autocompletar(Producto.objects.all(), request.GET.get('q', ''), pagina))
+
+
+@login_required
+def destino_autocomplete(request):
+    """Autocompletado de sitios: ?q=texto&page=n[&producto=id → solo sitios con stock de ese producto]."""
+    pagina = _entero(request.GET.get('page'), 1)
+    producto_id = _entero(request.GET.get('producto'))
+    return JsonResponse(pagina_destinos(Destino.objects.all(), request.GET.get('q', ''), pagina, producto_id))
+
 # EN views.py
 
 class ProductoListView(LoginRequiredMixin, ListView):  # <--- ESTA LINEA ES LA CLAVE
@@ -724,17 +631,13 @@ class ProductoListView(LoginRequiredMixin, ListView):  # <--- ESTA LINEA ES LA C
     paginate_by = 15
 
     def get_queryset(self):
-        # Optimiza la consulta trayendo inventarios y ubicaciones de una vez
-        queryset = Producto.objects.prefetch_related('inventarios', 'inventarios__ubicacion').all().order_by('nombre')
+        # Optimiza la consulta trayendo proveedor, inventarios y ubicaciones de una vez
+        queryset = Producto.objects.select_related('proveedor').prefetch_related('inventarios', 'inventarios__ubicacion').order_by('nombre')
         
-        # 1. Filtro de Búsqueda
+        # 1. Filtro de Búsqueda (índice de texto, resultados por relevancia)
         query = self.request.GET.get('q')
         if query:
-            queryset = queryset.filter(
-                Q(codigo__icontains=query) | 
-                Q(nombre__icontains=query) | 
-                Q(proveedor__nombre__icontains=query)
-            )
+            queryset = buscar_productos(queryset, query)
         
         # 2. Filtro de Categoría
         categoria = self.request.GET.get('categoria')
@@ -759,28 +662,40 @@ class ProductoListView(LoginRequiredMixin, ListView):  # <--- ESTA LINEA ES LA C
         return queryset
         
     def get(self, request, *args, **kwargs):
-        # Lógica de exportación a Excel
+        # Lógica de exportación a Excel (streaming por bloques de productos)
         if request.GET.get('export') == 'excel':
             productos = self.get_queryset()
-            bodegas = Destino.objects.all().order_by('nombre')
-
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = 'attachment; filename="Global_Inventory_Report.csv"'
-            writer = csv.writer(response)
-
-            header = ['Code', 'Product Name', 'Category', 'Sale Price', 'Global Stock', 'Total Value']
-            for bodega in bodegas:
-                header.append(f"Stock: {bodega.nombre}")
-            writer.writerow(header)
-
-            for p in productos:
-                stock_por_bodega = {inv.ubicacion_id: inv.cantidad for inv in p.inventarios.all()}
-                row = [p.codigo, p.nombre, p.get_categoria_display(), p.precio_venta, p.stock_global, p.valor_total]
-                for bodega in bodegas:
-                    row.append(stock_por_bodega.get(bodega.id, 0))
-                writer.writerow(row)
-            return response
+            bodegas = list(Destino.objects.order_by('nombre').values_list('id', 'nombre'))
+            categorias = dict(Producto.CATEGORIAS)
+
+            def filas():
+                yield ['Code', 'Product Name', 'Category', 'Sale Price', 'Global Stock', 'Total Value'] + [
+                    f"Stock: {nombre}" for _, nombre in bodegas
+                ]
+                bloque = []
+                for fila in filas_de(productos, 'id', 'codigo', 'nombre', 'categoria', 'precio_venta', 'stock_total_global'):
+                    bloque.append(fila)
+                    if len(bloque) == CHUNK_SIZE:
+                        yield from self._filas_export(bloque, bodegas, categorias)
+                        bloque = []
+                yield from self._filas_export(bloque, bodegas, categorias)
+
+            return respuesta_csv('Global_Inventory_Report.csv', filas())
         return super().get(request, *args, **kwargs)
+
+    @staticmethod
+    def _filas_export(bloque, bodegas, categorias):
+        """Una consulta de Inventario por bloque de productos, no por producto."""
+        stock = {}
+        for producto_id, ubicacion_id, cantidad in Inventario.objects.filter(
+            producto_id__in=[fila[0] for fila in bloque]
+        ).values_list('producto_id', 'ubicacion_id', 'cantidad'):
+            stock[producto_id, ubicacion_id] = cantidad
+
+        for producto_id, codigo, nombre, categoria, precio_venta, stock_global in bloque:
+            row = [codigo, nombre, categorias.get(categoria, categoria), precio_venta, stock_global, stock_global * precio_venta]
+            row.extend(stock.get((producto_id, bodega_id), 0) for bodega_id, _ in bodegas)
+            yield row
     
     
 # --- EN views.py (Agrega esto al final) ---
@@ -788,23 +703,31 @@ class ProductoListView(LoginRequiredMixin, ListView):  # <--- ESTA LINEA ES LA C
 @login_required
 def shopping_list_index(request):
     """Muestra el historial de listas guardadas"""
-    # Trae todas las listas ordenadas por fecha
-    listas = ListaCompra.objects.all().order_by('-fecha_creacion')
-    return render(request, 'Inventario/shopping_list_index.html', {'listas': listas})
+    # Paginado; cada lista trae su cantidad de ítems y costo estimado en la misma consulta
+    page_obj = Paginator(listas_con_totales(), LISTAS_POR_PAGINA).get_page(request.GET.get('page'))
+    return render(request, 'Inventario/shopping_list_index.html', {
+        'listas': page_obj,
+        'page_obj': page_obj,
+        'is_paginated': page_obj.has_other_pages(),
+    })
 
-@login_required
-def shopping_list_detail(request, pk):
-    lista = get_object_or_404(ListaCompra, pk=pk)
-    items = lista.items.select_related('producto').all()
-    
-    # 1. Construir el Título y la Descripción del evento
+def _evento_lista(lista, items):
+    """Título y descripción del evento de calendario de una lista."""
     summary = f"🛒 Pending Purchases List #{lista.id_lista}"
     
     desc_lines = [f"List ID: {lista.id_lista}", "Items needed:"]
     for item in items:
         desc_lines.append(f"- {item.producto.nombre} (Qty: {item.cantidad_sugerida})")
     
-    description = "\n".join(desc_lines)
+    return summary, "\n".join(desc_lines)
+
+@login_required
+def shopping_list_detail(request, pk):
+    lista = get_object_or_404(ListaCompra, pk=pk)
+    items = items_de_lista(lista)
+    
+    # 1. Construir el Título y la Descripción del evento
+    summary, description = _evento_lista(lista, items)
 
     # 2. Codificar para URL (Convierte espacios en %20, etc.)
     params = {
@@ -821,7 +744,26 @@ def shopping_list_detail(request, pk):
     context = {
         'lista': lista,
         'items': items,
+        'totales': totales_lista(lista),
         'calendar_link': calendar_link # <--- Pasamos el enlace directo a la plantilla
     }
 
-    return render(request, 'Inventario/shopping_list_detail.html', context)
\ No newline at end of file
+    return render(request, 'Inventario/shopping_list_detail.html', context)
+
+@login_required
+def shopping_list_calendar(request, pk):
+    """Encola el evento de Google Calendar de la lista; la UI sigue el estado en tarea_estado."""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
+    lista = get_object_or_404(ListaCompra, pk=pk)
+    summary, description = _evento_lista(lista, lista.items.select_related('producto').order_by('producto__nombre'))
+    tarea = encolar('calendar_event', {'summary': summary, 'description': description}, usuario=request.user)
+    return JsonResponse({
+        'status': 'success', 'job_id': tarea.pk, 'poll_url': reverse('tarea_estado', args=[tarea.pk]),
+    }, status=202)
+
+@login_required
+def tarea_estado(request, pk):
+    """Estado de una tarea en segundo plano del usuario (para polling desde la UI)."""
+    tarea = get_object_or_404(Tarea, pk=pk, usuario=request.user)
+    return JsonResponse({'status': 'success', 'job': como_dict(tarea)})